@@ -0,0 +1,118 @@
+
+def iter_colliding_pairs(tree1, tree2):
+    """ Generate the pairs of faces (face1, face2), one from each
+    AABBTree, whose boxes overlap, in the same order as
+    AABBTree.collides_with_tree.
+
+    Both trees are descended together with an explicit stack, so no
+    partial result lists are built on the way up.
+    """
+    stack = [(tree1._tree, tree2._tree)]
+    pop = stack.pop
+    push = stack.append
+    while len(stack) != 0:
+        node1, node2 = pop()
+        min1 = node1.min_pt
+        max1 = node1.max_pt
+        min2 = node2.min_pt
+        max2 = node2.max_pt
+        if (min1[0] > max2[0] or max1[0] < min2[0] or
+            min1[1] > max2[1] or max1[1] < min2[1] or
+            min1[2] > max2[2] or max1[2] < min2[2]):
+            continue
+        # Internal nodes always have both children
+        if node1.left_node is None:
+            if node2.left_node is None:
+                yield node1.leaf, node2.leaf
+            else:
+                push((node1, node2.right_node))
+                push((node1, node2.left_node))
+        elif node2.left_node is None:
+            push((node1.right_node, node2))
+            push((node1.left_node, node2))
+        else:
+            push((node1.right_node, node2.right_node))
+            push((node1.right_node, node2.left_node))
+            push((node1.left_node, node2.right_node))
+            push((node1.left_node, node2.left_node))
+
+class AABBPairCollector (object):
+    """ Collect the colliding face pairs of two AABBTrees into a pair of
+    preallocated buffers, which are kept and reused by later calls.
+
+    The traversal is the one of iter_colliding_pairs, written out again
+    here so each pair costs two buffer stores rather than a generator
+    round trip.
+    """
+
+    def __init__(self, capacity=4096):
+        self._faces1 = [None] * capacity
+        self._faces2 = [None] * capacity
+        self.num_pairs = 0
+
+    def collect(self, tree1, tree2):
+        """ Fill the buffers with the colliding pairs of tree1 and tree2.
+        Returns the number of pairs.
+        """
+        faces1 = self._faces1
+        faces2 = self._faces2
+        capacity = len(faces1)
+        num_pairs = 0
+
+        stack = [(tree1._tree, tree2._tree)]
+        pop = stack.pop
+        push = stack.append
+        while len(stack) != 0:
+            node1, node2 = pop()
+            min1 = node1.min_pt
+            max1 = node1.max_pt
+            min2 = node2.min_pt
+            max2 = node2.max_pt
+            if (min1[0] > max2[0] or max1[0] < min2[0] or
+                min1[1] > max2[1] or max1[1] < min2[1] or
+                min1[2] > max2[2] or max1[2] < min2[2]):
+                continue
+            if node1.left_node is None:
+                if node2.left_node is None:
+                    if num_pairs == capacity:
+                        faces1.extend([None] * capacity)
+                        faces2.extend([None] * capacity)
+                        capacity *= 2
+                    faces1[num_pairs] = node1.leaf
+                    faces2[num_pairs] = node2.leaf
+                    num_pairs += 1
+                else:
+                    push((node1, node2.right_node))
+                    push((node1, node2.left_node))
+            elif node2.left_node is None:
+                push((node1.right_node, node2))
+                push((node1.left_node, node2))
+            else:
+                push((node1.right_node, node2.right_node))
+                push((node1.right_node, node2.left_node))
+                push((node1.left_node, node2.right_node))
+                push((node1.left_node, node2.left_node))
+
+        self.num_pairs = num_pairs
+        return num_pairs
+
+    def pairs(self):
+        """ Return the collected pairs as a list of (face1, face2).
+        """
+        return list(zip(self._faces1[:self.num_pairs],
+                        self._faces2[:self.num_pairs]))
+
+    def rows(self, arrays1, arrays2):
+        """ Return the collected pairs as two arrays of face rows of the
+        QEMeshArrays arrays1 and arrays2, for batched triangle tests.
+        """
+        return (arrays1.face_rows(self._faces1[:self.num_pairs]),
+                arrays2.face_rows(self._faces2[:self.num_pairs]))
+
+    def clear(self):
+        """ Drop the references to the collected faces, keeping the
+        buffers' size.
+        """
+        self._faces1[:self.num_pairs] = [None] * self.num_pairs
+        self._faces2[:self.num_pairs] = [None] * self.num_pairs
+        self.num_pairs = 0
@@ -0,0 +1,110 @@
+from .quad_edge_mesh.aabb_tree import AABBTree, AABBNode
+from .flat_bvh import FlatBVH
+
+class AABBRefitter (object):
+    """ Refit only the parts of an AABBTree whose faces moved.
+
+    The tree is flattened once, breadth first, into bvh: a FlatBVH of the
+    same structure (one face per leaf) holding the boxes in node-indexed
+    arrays. Refitting a set of faces recomputes their leaves and carries
+    the change up one tree level at a time with NumPy, so its cost follows
+    the number of moved faces rather than the size of the mesh.
+
+    Queries should go to bvh, which stands in for the tree in the
+    Intersector. The boxes of the tree's own AABBNodes are only brought
+    up to date by update_tree.
+    """
+
+    def __init__(self, tree, arrays):
+        """ tree is an AABBTree built over the faces of the QEMeshArrays
+        arrays.
+        """
+        self.tree = tree
+        self.arrays = arrays
+        # Numbered breadth first, with the children of each level's nodes
+        # in pairs, which is the order FlatBVH numbers its nodes in
+        self._nodes = [tree._tree]
+        children = []
+        leaf_faces = []
+        leaf_nodes = []
+        for node_idx, node in enumerate(self._nodes):
+            if node.is_leaf():
+                children.append((-1, -1))
+                leaf_faces.append(node.leaf)
+                leaf_nodes.append(node_idx)
+            else:
+                children.append((len(self._nodes), len(self._nodes) + 1))
+                self._nodes.append(node.left_node)
+                self._nodes.append(node.right_node)
+        starts = [0] * len(self._nodes)
+        counts = [0] * len(self._nodes)
+        for leaf_idx, node_idx in enumerate(leaf_nodes):
+            starts[node_idx] = leaf_idx
+            counts[node_idx] = 1
+        self.bvh = FlatBVH(arrays, children, starts, counts,
+                           arrays.face_rows(leaf_faces))
+
+    @property
+    def num_nodes(self):
+        return len(self._nodes)
+
+    def refit_verts(self, vert_rows):
+        """ Refit the faces touching the vertices vert_rows.
+        Returns the number of nodes refitted.
+        """
+        if len(vert_rows) == 0:
+            return 0
+        return self.refit_faces(self.arrays.faces_of_verts(vert_rows))
+
+    def refit_faces(self, face_rows):
+        """ Recompute the boxes of the faces face_rows' leaves and of
+        every ancestor of those leaves. Returns the number of nodes
+        refitted.
+        """
+        return self.bvh.refit_faces(face_rows)
+
+    def update_tree(self):
+        """ Copy the refitted boxes into the tree's AABBNodes, eg. before
+        the tree is patched.
+        """
+        for node, node_min, node_max in zip(self._nodes,
+                                            self.bvh.node_min.tolist(),
+                                            self.bvh.node_max.tolist()):
+            node.min_pt = node_min
+            node.max_pt = node_max
+
+def aabb_tree_from_rows(node_children, node_faces, faces, face_min,
+                        face_max):
+    """ Return the AABBTree of the given structure: node_children holds
+    the (left, right) child rows of every node, node_faces the face row
+    of every leaf and -1 for the other nodes. The root is row 0 and
+    children come after their parents. faces are the faces by row, and
+    face_min, face_max their (nfaces, 3) bounds.
+    """
+    children = node_children.tolist()
+    node_faces = node_faces.tolist()
+    face_min = face_min.tolist()
+    face_max = face_max.tolist()
+    nodes = [AABBNode.__new__(AABBNode) for face in node_faces]
+    for node, (left, right), face in zip(nodes, children, node_faces):
+        if face == -1:
+            node.left_node = nodes[left]
+            node.right_node = nodes[right]
+        else:
+            node.left_node = None
+            node.right_node = None
+            node.leaf = faces[face]
+            node.min_pt = face_min[face]
+            node.max_pt = face_max[face]
+    for node, face in zip(reversed(nodes), reversed(node_faces)):
+        if face == -1:
+            left = node.left_node
+            right = node.right_node
+            node.min_pt = [min(left.min_pt[i], right.min_pt[i])
+                           for i in range(0, 3)]
+            node.max_pt = [max(left.max_pt[i], right.max_pt[i])
+                           for i in range(0, 3)]
+
+    tree = AABBTree.__new__(AABBTree)
+    tree._tree = nodes[0]
+    return tree
@@ -1,132 +1,219 @@
 import sys
 import copy
+import gc
 
-import bpy
+import numpy as np
 
-from multiprocessing import Pool
-from threading import Thread
+import bpy
 
 from .quad_edge_mesh.quad_edge_mesh import QEMesh, QEVertex, QEFace, QEEdge
+from .mesh_arrays import QEMeshArrays
+from .qe_views import FaceViewMap
+from .edge_interval_index import EdgeIntervalIndex
+from .polylines import Polylines
 
 class BlenderQEMeshBuilder(object):
     """ Construct a BlenderQEMesh from a Blender Object.
+
+    The triangles are read from the tessface buffer in bulk. Unique edges,
+    their left/right faces and the tl/bl/tr/br links are derived with
+    sort-based array operations, and the QE objects are only allocated
+    once everything is known.
     """
     @classmethod
-    def construct_from_blender_object(cls, blender_object):
-        """ Construct a BlenderQEMesh from a blender object
+    def construct_from_blender_object(cls, blender_object, views=False,
+                                      cache=None, local_space=False):
+        """ Construct a BlenderQEMesh from a blender object.
+        If views is True the mesh is backed by arrays only, see
+        construct_from_arrays.
+
+        cache is an optional MeshCache. The connectivity is read from it
+        if it holds this mesh's topology, and stored in it otherwise.
+
+        If local_space is True the vertices are kept in the object's
+        local space, see BlenderQEMesh.local_space.
         """
         #if type(blender_object) is not bpy.blender.something
+        data = blender_object.data
 
         # Call this twice or else Blender will hard crash!
         # as of version 2.68
-        blender_object.data.calc_tessface()
-        blender_object.data.calc_tessface()
+        data.calc_tessface()
+        data.calc_tessface()
 
-        bqem = BlenderQEMesh(blender_object)
+        co = np.empty(len(data.vertices) * 3, dtype=np.float32)
+        data.vertices.foreach_get('co', co)
+        matrix = np.array(blender_object.matrix_world)
+        vert_pos = co.reshape(-1, 3).astype(np.float64)
+        if not local_space:
+            vert_pos = vert_pos.dot(matrix[:3, :3].T) + matrix[:3, 3]
 
-        vidx_counter = 0
-        for vert in blender_object.data.vertices:
-            bqev = BlenderQEVertex(bqem, vidx_counter, vert.index)
-            bqev.update_pos()
-            bqem.add_vertex(bqev)
-            vidx_counter = vidx_counter + 1
-
-        # class variables for keeping current index number.
-        # This really feels like a hack...
-        cls.eidx_counter = 0
-        cls.fidx_counter = 0
-
-        # Tessfaces may be either tris or quads. We only want tris
-        for face in blender_object.data.tessfaces:
-            qef = cls._create_blender_triangle(bqem, [face.vertices[0],
-                                                      face.vertices[1],
-                                                      face.vertices[2]])
-            bqem.add_face(qef)
-            if len(face.vertices) > 3:
-                qef = cls._create_blender_triangle(bqem, [face.vertices[0],
-                                                          face.vertices[2],
-                                                          face.vertices[3]])
-                bqem.add_face(qef)
+        raw = np.empty(len(data.tessfaces) * 4, dtype=np.int32)
+        data.tessfaces.foreach_get('vertices_raw', raw)
+
+        tris = cls._triangulate(raw.reshape(-1, 4))
 
+        bqem = BlenderQEMesh(blender_object)
+        bqem.local_space = local_space
+        bqem.matrix_world = matrix
+        if cache is None:
+            cls.construct_from_triangles(bqem, vert_pos, tris, views)
+            return bqem
+
+        bqem.topology_key = cache.topology_key(len(vert_pos), tris)
+        arrays = cache.load_arrays(bqem.topology_key, vert_pos, tris)
+        if arrays is None:
+            arrays = QEMeshArrays.from_triangles(vert_pos, tris)
+            cache.save_arrays(bqem.topology_key, arrays)
+        cls.construct_from_arrays(bqem, arrays, views)
         return bqem
 
     @classmethod
-    def _create_blender_triangle(cls, bqem, indices):
-        qef = QEFace(bqem, cls.fidx_counter)
-        cls.fidx_counter = cls.fidx_counter + 1
-
-        nvs = len(indices)
-        for ptidx in range(0, nvs):
-            vidx = indices[ptidx]
-            if ptidx+1 is nvs:
-                vidx_1 = indices[0]
-            else:
-                vidx_1 = indices[ptidx+1]
-            qef.verts.append(bqem.get_vertex(vidx))
-
-            qee = bqem.get_edge_by_verts(vidx, vidx_1)
-            if qee is None:
-                qee = QEEdge(bqem, cls.eidx_counter)
-                cls.eidx_counter = cls.eidx_counter + 1
-                qee.b_vert = bqem.get_vertex(vidx)
-                qee.t_vert = bqem.get_vertex(vidx_1)
-                qee.l_face = qef
-                try:
-                    bqem.add_edge(qee)
-                except ValueError:
-                    print("vidx: %d, vidx_1: %d" % (vidx, vidx_1))
-                    print("qee.b_vert: %d, qee.t_vert: %d" % (qee.b_vert.index, qee.t_vert.index))
-                    raise ValueError("still nope")
-            else:
-                if qee.r_face is not None:
-                    raise ValueError("This edge already has two faces.")
-                qee.r_face = qef
-
-            qef.edges.append(qee)
-
-        for face_eidx in range(0, len(qef.edges)):
-            # Update the rest of the edges internal pointers 
-            qee = qef.edges[face_eidx]
-
-            if qee.r_face is None:
-                if face_eidx+1 is len(qef.edges):
-                    qee.tl_edge = qef.edges[0]
-                    qee.bl_edge = qef.edges[0]
-                else:
-                    qee.tl_edge = qef.edges[face_eidx+1]
-                    qee.bl_edge = qef.edges[face_eidx+1]
-            else:
-                # else this is the right face
-                if face_eidx+1 is len(qef.edges):
-                    qee.br_edge  = qef.edges[0]
-                else:
-                    qee.br_edge  = qef.edges[face_eidx+1]
-                if face_eidx == 0:
-                    qee.tr_edge = qef.edges[-1]
-                else:
-                    qee.tr_edge = qef.edges[face_eidx-1]
-                    
-        if len(qef.edges) is not len(qef.verts):
-            raise ValueError("This seems strange...")
-
-        return qef
-
-def update_one_vertex_no_matrix(vert):
-    vert.update_pos_no_matrix()
-
-def update_vertex_list_no_matrix(verts, blobj):
-    for vert in verts:
-        vert.update_pos_no_matrix_blobj(blobj)
+    def _triangulate(cls, tessfaces):
+        """ Split the (n, 4) vertices_raw array of tessfaces into
+        triangles. Tessfaces may be either tris or quads (the 4th index of
+        a tri is 0, which Blender never puts last in a quad). A quad
+        becomes the triangles (0, 1, 2) and (0, 2, 3), in face order.
+        """
+        is_quad = tessfaces[:, 3] != 0
+        tris = np.empty((len(tessfaces), 2, 3), dtype=np.int64)
+        tris[:, 0] = tessfaces[:, [0, 1, 2]]
+        tris[:, 1] = tessfaces[:, [0, 2, 3]]
+        keep = np.column_stack((np.ones(len(tessfaces), dtype=bool),
+                                is_quad))
+        return tris[keep]
+
+    @classmethod
+    def construct_from_triangles(cls, bqem, vert_pos, tris, views=False):
+        """ Fill bqem with one vertex per row of vert_pos and one face per
+        row of the (n, 3) vertex index array tris.
+        The connectivity is derived by QEMeshArrays.from_triangles.
+
+        If views is True, no QE objects are allocated and bqem is backed
+        by its arrays alone, see BlenderQEMesh.use_views.
+        """
+        cls.construct_from_arrays(
+            bqem, QEMeshArrays.from_triangles(vert_pos, tris), views)
+
+    @classmethod
+    def construct_from_arrays(cls, bqem, arrays, views=False):
+        """ Fill bqem from arrays built by QEMeshArrays.from_triangles.
+        See construct_from_triangles.
+        """
+        if views:
+            bqem.use_views(arrays)
+        else:
+            # Allocate the QE objects. The collector would otherwise
+            # rescan the growing object graph over and over.
+            gc_was_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                cls._allocate(bqem, arrays)
+            finally:
+                if gc_was_enabled:
+                    gc.enable()
+        bqem.arrays = arrays
+        bqem.edge_index = EdgeIntervalIndex(arrays)
+
+    @classmethod
+    def _allocate(cls, bqem, arrays):
+        """ Create and link the QE objects of arrays, add them to bqem and
+        make them the arrays' verts, edges and faces.
+        """
+        verts = []
+        for vidx, pos in enumerate(arrays.vert_pos.tolist()):
+            bqev = BlenderQEVertex(bqem, vidx, vidx)
+            bqev.pos[0] = pos[0]
+            bqev.pos[1] = pos[1]
+            bqev.pos[2] = pos[2]
+            bqem.add_vertex(bqev)
+            verts.append(bqev)
+        faces = [QEFace(bqem, fidx)
+                 for fidx in range(0, len(arrays.face_verts))]
+        edges = [QEEdge(bqem, eidx)
+                 for eidx in range(0, len(arrays.edge_verts))]
+
+        for qee, (b_vert, t_vert), (l_face, r_face), links in zip(
+                edges, arrays.edge_verts.tolist(),
+                arrays.edge_faces.tolist(), arrays.edge_links.tolist()):
+            qee.b_vert = verts[b_vert]
+            qee.t_vert = verts[t_vert]
+            qee.l_face = faces[l_face]
+            qee.tl_edge = edges[links[0]]
+            qee.bl_edge = edges[links[1]]
+            if r_face != -1:
+                qee.r_face = faces[r_face]
+                qee.tr_edge = edges[links[2]]
+                qee.br_edge = edges[links[3]]
+            bqem.add_edge(qee)
+
+        for qef, face_verts, face_edges in zip(faces,
+                                               arrays.face_verts.tolist(),
+                                               arrays.face_edges.tolist()):
+            qef.verts.extend([verts[vidx] for vidx in face_verts])
+            qef.edges.extend([edges[eidx] for eidx in face_edges])
+            bqem.add_face(qef)
+
+        arrays.verts = verts
+        arrays.edges = edges
+        arrays.faces = faces
 
 class BlenderQEMesh(QEMesh):
     """ A QEMesh that also stores some Blender specific info.
     """
+    # Vertices moving less than this along every axis are not updated
+    EPSILON = 1e-8
+
     def __init__(self, blender_object):
         super(BlenderQEMesh, self).__init__()
         self.blender_name = blender_object.name
         # self.is_rigid = True
         # By default, assume local to world matrix != identity
         self.mesh_matrix_not_identity = True
+        # Flat copy of the geometry and per-axis edge index,
+        # both set by BlenderQEMeshBuilder
+        self.arrays = None
+        self.edge_index = None
+        # Positions read by the last update_vertex_positions, by
+        # Blender vertex index
+        self.blender_co = None
+        self._updated_verts = []
+        # Blender vertex index of each row of self.arrays
+        self._array_bl_indices = None
+        self.uses_views = False
+        # Key of this mesh's topology in the MeshCache, if one was used
+        self.topology_key = None
+        # If True, vertex positions are in the object's local space and
+        # world planes are moved into it (see plane_in_local_space)
+        # instead, so moving the object leaves the geometry untouched.
+        self.local_space = False
+        # The object's matrix_world as a 4x4 array, as of the last
+        # update_matrix_world
+        self.matrix_world = None
+        # Set when the object moved but its geometry did not
+        self.is_moved = False
+
+    def use_views(self, arrays):
+        """ Back this mesh by arrays alone: faces and vertices are views
+        over the arrays (see qe_views) rather than QE objects.
+        arrays must have been built by QEMeshArrays.from_triangles.
+        """
+        arrays.use_views()
+        self.faces = FaceViewMap(arrays)
+        self._array_bl_indices = np.arange(len(arrays.vert_pos))
+        self.uses_views = True
+
+    def get_vertex(self, vidx):
+        if self.uses_views:
+            return self.arrays.verts[vidx]
+        return super(BlenderQEMesh, self).get_vertex(vidx)
+
+    def update_bounding_boxes(self):
+        """ Update the face bounding boxes. Faces that are views always
+        follow the vertex positions, so there is nothing to do for them.
+        """
+        if not self.uses_views:
+            super(BlenderQEMesh, self).update_bounding_boxes()
 
     def get_blender_object(self):
         return bpy.data.objects[self.blender_name]
@@ -138,51 +225,93 @@ class BlenderQEMesh(QEMesh):
         return self.get_blender_object().is_updated
 
     def update_vertex_positions(self):
-        self.blobj = self.get_blender_object().data.vertices
-        if self.mesh_matrix_not_identity:
-            for vert in self._vertices:
-                vert.update_pos()
+        """ Pull the vertex positions from Blender.
+
+        All coordinates are read with one foreach_get call and moved to
+        world space with one matrix multiply. Vertices that moved more
+        than EPSILON since the last call are the dirty vertices: only
+        those QEVertex objects are updated, and their rows are marked
+        dirty in the arrays.
+
+        Returns the rows (in self.arrays) of the dirty vertices.
+        """
+        blender_object = self.get_blender_object()
+        vertices = blender_object.data.vertices
+        co = np.empty(len(vertices) * 3, dtype=np.float32)
+        vertices.foreach_get('co', co)
+        co = co.reshape(-1, 3).astype(np.float64)
+        if self.mesh_matrix_not_identity and not self.local_space:
+            matrix = np.array(blender_object.matrix_world)
+            co = co.dot(matrix[:3, :3].T) + matrix[:3, 3]
+
+        if self.blender_co is None or len(self.blender_co) != len(co):
+            changed = np.ones(len(co), dtype=bool)
         else:
-            for vert in self._vertices:
-                vert.update_pos_no_matrix()
-                
-        # if self.is_rigid:
-        #     for vert in self._vertices:
-        #         vert.update_pos()
-        # else:
-        #     for vert in self._vertices:
-        #         # vert.update_pos_no_matrix()
-        #         vert.update_pos()
-
-    def update_vertex_positions_mt(self):
-        num_procs = 16
-        pool = Pool(processes = num_procs)
-        self.blobj = self.get_blender_object().data.vertices
-        
-        pool.imap(update_one_vertex_no_matrix, self._vertices, len(self._vertices)//8)
-        pool.close()
-        pool.join()
-
-    def update_vertex_positions_mt2(self):
-        num_procs = 8
-        threads = []
-        num_verts = len(self._vertices)
-        slice_size = num_verts//num_procs
-        blobj = self.get_blender_object()
-        
-        for i in range(num_procs):
-            if (i+1) == num_procs:
-                threads.append(Thread(target=update_vertex_list_no_matrix,
-                                      args=(self._vertices[i*slice_size:], blobj.data.vertices)))
-            else:
-                threads.append(Thread(target=update_vertex_list_no_matrix,
-                                  args=(self._vertices[i*slice_size:(i+1)*slice_size],blobj.data.vertices)))
-
-        for t in threads:
-            t.start()
-        for t in threads:
-            t.join()
-                                  
+            changed = np.any(np.abs(co - self.blender_co) >= self.EPSILON,
+                             axis=1)
+        self.blender_co = co
+
+        if not self.uses_views:
+            self._update_qe_vertices(co, changed)
+
+        if self.arrays is None:
+            return np.zeros(0, dtype=np.int64)
+        if self._array_bl_indices is None:
+            self._array_bl_indices = np.array(
+                [vert.blender_vindex for vert in self.arrays.verts],
+                dtype=np.int64)
+        self.arrays.vert_pos[:] = co[self._array_bl_indices]
+        dirty_rows = np.flatnonzero(changed[self._array_bl_indices])
+        self.arrays.mark_dirty(dirty_rows)
+        if self.edge_index is not None and len(dirty_rows) != 0:
+            self.edge_index.update()
+        return dirty_rows
+
+    def update_matrix_world(self):
+        """ Read the object's matrix_world. Returns True if it changed.
+        """
+        matrix = np.array(self.get_matrix_world())
+        if (self.matrix_world is not None and
+            np.array_equal(matrix, self.matrix_world)):
+            return False
+        self.matrix_world = matrix
+        return True
+
+    def plane_in_local_space(self, plane):
+        """ Return the world space Plane plane in this mesh's local space.
+        """
+        return plane.to_local(self.matrix_world)
+
+    def polylines_to_world(self, polylines, plane=None):
+        """ Return a copy of local space polylines moved to world space.
+        If the world space Plane they were cut with is given and is
+        orthogonal to an axis, that coordinate of every point is set to
+        the plane's, so points lie exactly on it.
+        """
+        matrix = self.matrix_world
+        coords = (polylines.coords.astype(np.float64).dot(matrix[:3, :3].T) +
+                  matrix[:3, 3])
+        if plane is not None and plane.axis is not None:
+            coords[:, plane.axis] = plane.point[plane.axis]
+        return Polylines(coords, polylines.starts, polylines.counts,
+                         polylines.closed)
+
+    def _update_qe_vertices(self, co, changed):
+        """ Keep the QEVertex objects in step, touching only those that
+        changed now or were flagged by the previous update.
+        """
+        for vert in self._updated_verts:
+            vert.is_updated = False
+        self._updated_verts = []
+        bl_indices = np.flatnonzero(changed)
+        for bl_index, pos in zip(bl_indices.tolist(),
+                                 co[bl_indices].tolist()):
+            vert = self.get_vertex(bl_index)
+            vert.pos[0] = pos[0]
+            vert.pos[1] = pos[1]
+            vert.pos[2] = pos[2]
+            vert.is_updated = True
+            self._updated_verts.append(vert)
 
 class BlenderQEVertex(QEVertex):
     """ A QEVertex that links to Blender vertices.
@@ -192,53 +321,29 @@ class BlenderQEVertex(QEVertex):
         self.blender_vindex = blender_vert_index
         self.blender_pos = None
         self.is_updated = True
-        self.EPSILON = 1e-8
 
     def get_pos(self):
         bl_pos = self.mesh.get_blender_object().data.vertices[self.blender_vindex]
         
+        if self.mesh.local_space:
+            return bl_pos.co.copy()
         bl_world_pos = self.mesh.get_matrix_world() * bl_pos.co
 
         return bl_world_pos
 
-    def update_pos_no_matrix(self):
-        #bl_pos = self.mesh.get_blender_object().data.vertices[self.blender_vindex]
-        bl_pos = self.mesh.blobj[self.blender_vindex]
-
-        if (abs(self.pos[0] - bl_pos.co[0]) < self.EPSILON and
-            abs(self.pos[1] - bl_pos.co[1]) < self.EPSILON and
-            abs(self.pos[2] - bl_pos.co[2]) < self.EPSILON):
-            self.is_updated = False
-        else:
-            self.is_updated = True
-        #self.is_updated = True
-        self.pos[0] = bl_pos.co[0]
-        self.pos[1] = bl_pos.co[1]
-        self.pos[2] = bl_pos.co[2]
-        
-    def update_pos_no_matrix_blobj(self, blobj):
-        bl_pos = blobj[self.blender_vindex]
-
-        if (abs(self.pos[0] - bl_pos.co[0]) < self.EPSILON and
-            abs(self.pos[1] - bl_pos.co[1]) < self.EPSILON and
-            abs(self.pos[2] - bl_pos.co[2]) < self.EPSILON):
-            self.is_updated = False
-        else:
-            self.is_updated = True
-        #self.is_updated = True
-        self.pos[0] = bl_pos.co[0]
-        self.pos[1] = bl_pos.co[1]
-        self.pos[2] = bl_pos.co[2]
-        
     def update_pos(self):
         """ Update the position of this Blender vertex.
-        Does not check if mesh has been updated. Will multiply by matrix_world.
+        Does not check if mesh has been updated. Will multiply by matrix_world
+        unless the mesh is in local space.
         """
         bl_pos = self.mesh.get_blender_object().data.vertices[self.blender_vindex]
 
         self.is_updated = True
 
-        bl_world_pos = self.mesh.get_matrix_world() * bl_pos.co
+        if self.mesh.local_space:
+            bl_world_pos = bl_pos.co
+        else:
+            bl_world_pos = self.mesh.get_matrix_world() * bl_pos.co
         self.pos[0] = bl_world_pos[0]
         self.pos[1] = bl_world_pos[1]
         self.pos[2] = bl_world_pos[2]
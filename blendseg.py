@@ -4,14 +4,29 @@ import gc
 
 from time import time
 
+import numpy as np
+
 import bpy
 from bpy_extras import image_utils
 from mathutils import Vector
 
 from .slice_plane import SlicePlane
 from .intersector import Intersector
+from .plane_sweep import PlaneSweep
+from .crossing_cache import CrossingCache
+from .bounded_lru import BoundedLRU
+from .polylines import Polylines, PolylineStack
+from .plane import Plane
+from .contour_loop import ContourLoop
+from .contour_overlay import ContourOverlay
+from .change_detector import VertexChangeDetector
 from .blender_quad_edge_mesh import BlenderQEMeshBuilder
 from .quad_edge_mesh.aabb_tree import AABBTree
+from .aabb_refit import AABBRefitter
+from .mesh_cache import MeshCache
+from .topology_patch import TopologyWatcher, match_faces, patch_tree
+from .flat_bvh import FlatBVH
+from .bvh_rebuilder import BVHRebuilder, AABBRebuilder
 
 class BlendSeg (object):
     """ Compute and render the intersections of a mesh.
@@ -29,6 +44,36 @@ class BlendSeg (object):
     slices, and store them as textures. Three planes are created
     corresponding to the 3 principal directions. DICOM is not supported.
     """
+    # How plane intersections are computed:
+    #   'TREE'   - walk the faces returned by the AABB tree
+    #   'ARRAYS' - test every edge in one vectorized pass
+    #   'INDEX'  - query the crossing edges from the per-axis edge index
+    #   'SWEEP'  - keep each plane's crossing edges between updates and
+    #              only revisit the edges the plane moved past
+    slicing_engine = 'SWEEP'
+    # Back the quad-edge meshes by arrays and __slots__ views instead of
+    # one Python object per vertex, edge and face
+    use_array_views = True
+    # Keep built connectivity and tree structure in a MeshCache next to
+    # the .blend file, so reopening a case skips rebuilding them
+    use_mesh_cache = True
+    # The mesh's bounding volume hierarchy:
+    #   'AABB' - an AABBTree, cached in the MeshCache, refitted around
+    #            the moved vertices (in the arrays of an AABBRefitter)
+    #            and patched on topology changes
+    #   'FLAT' - a FlatBVH built with the Morton-code builder, fully
+    #            refitted in a few vectorized steps per update and rebuilt
+    #            on topology changes. It is not cached.
+    mesh_tree_type = 'AABB'
+    # An AABBTree is rebuilt instead of patched on a topology change when
+    # fewer than this fraction of the new faces could be matched to old
+    # ones, eg. after remeshing
+    min_patch_match = 0.5
+    # With mesh_matrix_not_identity the mesh is kept in its local space
+    # and each plane is moved into it instead, so moving, rotating or
+    # scaling the mesh object only re-reads its matrix. Such planes are
+    # generally oblique to the local axes, so they are cut with the
+    # mesh tree whatever the slicing_engine.
 
     def __init__(self,
                  mesh_name,
@@ -41,7 +86,10 @@ class BlendSeg (object):
                  image_origin,
                  image_orientation,
                  image_spacing,
-                 show_timing_msgs):
+                 show_timing_msgs,
+                 snap_to_slices=False,
+                 contour_memo_points=1000000,
+                 contour_display='MESH'):
         #pass
         self.axi_files = sorted(glob.glob (image_dir + axi_prefix + image_ext))
         self.sag_files = sorted(glob.glob (image_dir + sag_prefix + image_ext))
@@ -50,12 +98,50 @@ class BlendSeg (object):
         self.blender_mesh_name = mesh_name
         self.mesh_matrix_not_identity = mesh_matrix_not_identity
         self.show_timing_msgs = show_timing_msgs
+        # 'MESH' writes the contours into loop objects, 'OVERLAY' draws
+        # them in the viewport without touching the scene
+        self.contour_display = contour_display
+        self.contour_overlay = ContourOverlay()
+        if self.contour_display == 'OVERLAY':
+            self.contour_overlay.register()
+            # Hidden once here, as the loop objects path hides it after
+            # every update
+            try:
+                bpy.context.scene.objects[mesh_name].hide = True
+            except KeyError:
+                print("Couldn't find mesh " + mesh_name + "!")
+        # Latest contours of each plane, by loop name
+        self.current_polylines = {}
 
         print("Initializing BlendSeg")
         self.load_img_stacks()
         self.create_planes(image_origin, image_spacing, image_orientation)
+        self.axi_plane.snap_to_slices = snap_to_slices
+        self.sag_plane.snap_to_slices = snap_to_slices
+        self.cor_plane.snap_to_slices = snap_to_slices
         self.mesh_qem = None
         self.mesh_tree = None
+        # Rebuilds the mesh tree in the background once refitting has
+        # degraded it
+        if self.mesh_tree_type == 'FLAT':
+            self.mesh_tree_rebuilder = BVHRebuilder()
+        else:
+            self.mesh_tree_rebuilder = AABBRebuilder()
+        self.mesh_cache = None
+        # Sculpt strokes do not set is_updated, so watch the vertices
+        self.change_detector = VertexChangeDetector()
+        # One PlaneSweep per orientation, created on first use
+        self.plane_sweeps = {}
+        # Kept for the whole session so plane crossings carry over
+        # between updates
+        self.intersector = Intersector(CrossingCache())
+        # Contours of visited slices, keyed by
+        # (orientation, slice index, mesh version). Only used with
+        # snap_to_slices, and capped by the total number of contour points.
+        self.contour_memo = BoundedLRU(
+            contour_memo_points,
+            lambda entry: entry[1].num_points)
+        self.contour_memo_version = None
         self.is_updating = False
         self.register_callback()
         
@@ -87,6 +173,7 @@ class BlendSeg (object):
         from Blender.
         """
         self.unregister_callback()
+        self.contour_overlay.unregister()
         self.delete_planes()
         self.delete_meshes()
 
@@ -117,12 +204,11 @@ class BlendSeg (object):
         self.sag_plane.remove_and_cleanup()
 
     def delete_meshes(self):
-        """ Delete all QEM storage (for mesh and 3 planes).
+        """ Delete the mesh's QEM storage.
         """
+        self.intersector.crossing_cache.clear()
+        self.contour_memo.clear()
         del self.mesh_qem
-        del self.sp_qem
-        del self.ap_qem
-        del self.cp_qem
 
     def scene_update_callback(self, scene):
         """ Check if the mesh has been sculpted/modified.
@@ -134,9 +220,24 @@ class BlendSeg (object):
             return
         
         if mesh.is_updated:
-            if self.show_timing_msgs:
-                print(self.mesh_qem.blender_name + " was updated!!")
-            self.mesh_qem.is_updated = True
+            if self.mesh_qem.local_space and not mesh.is_updated_data:
+                # Only the object's transform changed, the local space
+                # geometry is the same
+                if self.show_timing_msgs:
+                    print(self.mesh_qem.blender_name + " was moved!!")
+                self.mesh_qem.is_moved = True
+            else:
+                if self.show_timing_msgs:
+                    print(self.mesh_qem.blender_name + " was updated!!")
+                self.mesh_qem.is_updated = True
+        elif mesh.mode == 'SCULPT':
+            changed = self.change_detector.check(mesh.data)
+            if len(changed) != 0:
+                if self.show_timing_msgs:
+                    print(self.mesh_qem.blender_name +
+                          " was sculpted (%d vertex chunks changed)" %
+                          len(changed))
+                self.mesh_qem.is_updated = True
             
     def scene_update_contour_callback(self, scene):
         """ Update the intersection contours in a callback.
@@ -148,7 +249,8 @@ class BlendSeg (object):
         if (not self.sag_plane.is_updated and
             not self.axi_plane.is_updated and
             not self.cor_plane.is_updated and
-            not self.mesh_qem.is_updated):
+            not self.mesh_qem.is_updated and
+            not self.mesh_qem.is_moved):
             return
         
         try:
@@ -184,6 +286,7 @@ class BlendSeg (object):
         self.cor_plane.is_updated = False
         self.axi_plane.is_updated = False
         self.mesh_qem.is_updated = False
+        self.mesh_qem.is_moved = False
 
     def load_img_stacks(self):
         axi_files = self.axi_files
@@ -239,23 +342,18 @@ class BlendSeg (object):
             'CORONAL', image_origin, plane_centre,
             self.cor_imgs, image_spacing, image_orientation)
         
-        # Create a new object to hold the contours
-        if (bpy.ops.object.mode_set.poll()):
-            bpy.ops.object.mode_set(mode='OBJECT')
-        bpy.ops.object.add(type='MESH')
-        loop = bpy.context.object
-        loop.name = self.axi_plane.loop_name
-        
-        bpy.ops.object.add(type='MESH')
-        loop = bpy.context.object
-        loop.name = self.sag_plane.loop_name
-        
-        bpy.ops.object.add(type='MESH')
-        loop = bpy.context.object
-        loop.name = self.cor_plane.loop_name
+        # Create the objects holding the contours. They are kept for the
+        # whole session and overwritten on every update.
+        self.contour_loops = {}
+        for sl_plane in (self.axi_plane, self.sag_plane, self.cor_plane):
+            contour_loop = ContourLoop(sl_plane.loop_name)
+            if self.contour_display == 'MESH':
+                contour_loop.get_object(bpy.context.scene).hide = True
+            self.contour_loops[sl_plane.loop_name] = contour_loop
 
     def update_all_intersections (self, mesh):
-        mesh.hide = False
+        if self.contour_display == 'MESH':
+            mesh.hide = False
         """ Attempt to find our planes """
         try:
             sp = bpy.data.objects[self.sag_plane.plane_name]
@@ -265,16 +363,22 @@ class BlendSeg (object):
             print("Warning! Can't find all planes by name...")
             return
 
-        # Generate CMesh objects for planes, mesh
+        # Generate the CMesh object for the mesh. The planes are only
+        # needed as Planes, see SlicePlane.get_plane
         if self.mesh_qem is None:
             if self.show_timing_msgs:
                 print("Generating Quad-Edge Meshes")
                 start = time()
-            self.sp_qem = BlenderQEMeshBuilder.construct_from_blender_object(sp)
-            self.ap_qem = BlenderQEMeshBuilder.construct_from_blender_object(ap)
-            self.cp_qem = BlenderQEMeshBuilder.construct_from_blender_object(cp)
-            self.mesh_qem = BlenderQEMeshBuilder.construct_from_blender_object(mesh)
+            views = self.use_array_views
+            if self.use_mesh_cache:
+                self.mesh_cache = MeshCache(MeshCache.default_directory())
+            else:
+                self.mesh_cache = None
+            self.mesh_qem = BlenderQEMeshBuilder.construct_from_blender_object(
+                mesh, views, self.mesh_cache,
+                local_space=self.mesh_matrix_not_identity)
             self.mesh_qem.mesh_matrix_not_identity = self.mesh_matrix_not_identity
+            self.topology_watcher = TopologyWatcher(mesh.data)
             if self.show_timing_msgs:
                 seconds = time() - start
                 print("Took %1.5f seconds" % seconds)
@@ -284,22 +388,12 @@ class BlendSeg (object):
             if self.show_timing_msgs:
                 print("Generating AABB Trees")
                 start = time()
-            self.sp_tree = AABBTree(self.sp_qem)
-            self.ap_tree = AABBTree(self.ap_qem)
-            self.cp_tree = AABBTree(self.cp_qem)
-            self.mesh_tree = AABBTree(self.mesh_qem)
+            self.mesh_tree = self._build_mesh_tree()
 
             # First time initialization
-            self.sp_qem.update_bounding_boxes()
-            self.ap_qem.update_bounding_boxes()
-            self.cp_qem.update_bounding_boxes()
             self.mesh_qem.update_bounding_boxes()
-
-            self.sp_tree.update_bbs()
-            self.ap_tree.update_bbs()
-            self.cp_tree.update_bbs()
             self.mesh_tree.update_bbs()
-            #self.mesh_tree.update_bbs_mt()
+            self._create_mesh_refitter()
             
             if self.show_timing_msgs:
                 seconds = time() - start
@@ -308,52 +402,72 @@ class BlendSeg (object):
         if self.show_timing_msgs:
             print("  Refreshing vertex positions")
         start = time()
-        self.sp_qem.update_vertex_positions()
-        self.ap_qem.update_vertex_positions()
-        self.cp_qem.update_vertex_positions()
         if self.mesh_qem.is_updated:
             if self.show_timing_msgs:
                 print("updating mesh_qem!")
-            self.mesh_qem.update_vertex_positions()
-        #self.mesh_qem.update_vertex_positions_mt()
+            if self.topology_watcher.has_changed(mesh.data):
+                self._patch_mesh_topology(mesh)
+            dirty_rows = self.mesh_qem.update_vertex_positions()
+            for sweep in self.plane_sweeps.values():
+                sweep.update()
+        mesh_changed = self.mesh_qem.is_updated or self.mesh_qem.is_moved
+        if self.mesh_qem.local_space and mesh_changed:
+            self.mesh_qem.update_matrix_world()
         if self.show_timing_msgs:
             seconds = time() - start
             print("  Took %1.5f seconds" % (seconds))
 
-        if self.show_timing_msgs:
-            print("  Refreshing bounding box positions")
-            start = time()
-        self.sp_qem.update_bounding_boxes()
-        self.ap_qem.update_bounding_boxes()
-        self.cp_qem.update_bounding_boxes()
-        if self.mesh_qem.is_updated:
-            self.mesh_qem.update_bounding_boxes()
-        if self.show_timing_msgs:
-            seconds = time() - start
-            print("  Took %1.5f seconds" % (seconds))
-        
         if self.show_timing_msgs:
             print("  Refreshing aabb trees to see how fast...")
             start = time()
-        self.sp_tree.update_bbs()
-        self.ap_tree.update_bbs()
-        self.cp_tree.update_bbs()
-        if self.mesh_qem.is_updated:
-            #self.mesh_tree.update_bbs()
-            self.mesh_tree.update_bbs_mt()
+        if self.mesh_qem.is_updated and len(dirty_rows) != 0:
+            if self.mesh_refitter is None:
+                self.mesh_tree.refit()
+                # Rebuilds in the background once refitting has made the
+                # tree too costly
+                degradation = self.mesh_tree_rebuilder.check(self.mesh_tree)
+                if self.show_timing_msgs:
+                    print("  Refitted all %d mesh tree nodes, cost %1.2f "
+                          "times that of the built tree"
+                          % (len(self.mesh_tree), degradation))
+            else:
+                # Only the faces around the moved vertices need new boxes
+                num_refitted = self.mesh_refitter.refit_verts(dirty_rows)
+                degradation = self.mesh_tree_rebuilder.check(
+                    self.mesh_refitter, self.mesh_cache,
+                    self.mesh_qem.topology_key)
+                if self.show_timing_msgs:
+                    print("  Refitted %d of %d mesh tree nodes "
+                          "(%d vertices moved), cost %1.2f times that of "
+                          "the built tree"
+                          % (num_refitted, self.mesh_refitter.num_nodes,
+                             len(dirty_rows), degradation))
+        if self.mesh_refitter is None:
+            rebuilt_tree = self.mesh_tree_rebuilder.swap(self.mesh_tree)
+            if rebuilt_tree is not self.mesh_tree:
+                self.mesh_tree = rebuilt_tree
+                if self.show_timing_msgs:
+                    print("  Swapped in the rebuilt mesh tree")
+        else:
+            refitter = self.mesh_tree_rebuilder.swap(self.mesh_refitter)
+            if refitter is not self.mesh_refitter:
+                self.mesh_refitter = refitter
+                self.mesh_tree = refitter.tree
+                if self.show_timing_msgs:
+                    print("  Swapped in the rebuilt mesh tree")
         if self.show_timing_msgs:
             seconds = time() - start
             print("  Took %1.5f seconds" % (seconds))
 
         gc.disable()
-        if not sp.hide and (self.sag_plane.is_updated or self.mesh_qem.is_updated):
+        if not sp.hide and (self.sag_plane.is_updated or mesh_changed):
             if self.show_timing_msgs:
                 print("  Computing sagittal intersection...")
                 start = time()
             loop1 = self.compute_intersection_qem(bpy.context.scene,
                                                   self.sag_plane,
-                                                  self.sp_qem, self.mesh_qem,
-                                                  self.sp_tree, self.mesh_tree,
+                                                  self.mesh_qem,
+                                                  self._get_query_tree(),
                                                   self.sag_plane.loop_name)
             if self.show_timing_msgs:
                 seconds = time() - start
@@ -364,14 +478,14 @@ class BlendSeg (object):
             except KeyError:
                 loop1 = None
 
-        if not ap.hide and (self.axi_plane.is_updated or self.mesh_qem.is_updated):
+        if not ap.hide and (self.axi_plane.is_updated or mesh_changed):
             if self.show_timing_msgs:
                 print("  Computing axial intersection...")
                 start = time()
             loop2 = self.compute_intersection_qem(bpy.context.scene,
                                                   self.axi_plane,
-                                                  self.ap_qem, self.mesh_qem,
-                                                  self.ap_tree, self.mesh_tree,
+                                                  self.mesh_qem,
+                                                  self._get_query_tree(),
                                                   self.axi_plane.loop_name)
             if self.show_timing_msgs:
                 seconds = time() - start
@@ -382,14 +496,14 @@ class BlendSeg (object):
             except KeyError:
                 loop2 = None
 
-        if not cp.hide and (self.cor_plane.is_updated or self.mesh_qem.is_updated):
+        if not cp.hide and (self.cor_plane.is_updated or mesh_changed):
             if self.show_timing_msgs:
                 print("  Computing coronal intersection...")
                 start = time()
             loop3 = self.compute_intersection_qem(bpy.context.scene,
                                                   self.cor_plane,
-                                                  self.cp_qem, self.mesh_qem,
-                                                  self.cp_tree, self.mesh_tree,
+                                                  self.mesh_qem,
+                                                  self._get_query_tree(),
                                                   self.cor_plane.loop_name)
             if self.show_timing_msgs:
                 seconds = time() - start
@@ -402,6 +516,11 @@ class BlendSeg (object):
 
 
         gc.enable()
+
+        if self.contour_display == 'OVERLAY':
+            # Nothing was added to the scene, leave the selection, the
+            # sculpt mode and the mesh's visibility alone
+            return
         
         # These need to be hidden/shown after the all computations
         if not sp.hide and loop1:
@@ -416,94 +535,267 @@ class BlendSeg (object):
 
         bpy.context.scene.objects.active = mesh
         mesh.select = True
-        bpy.ops.object.mode_set(mode='SCULPT')
+        if mesh.mode != 'SCULPT':
+            bpy.ops.object.mode_set(mode='SCULPT')
         
         mesh.hide = True
         
+    def _patch_mesh_topology (self, mesh):
+        """ Rebuild mesh_qem after the topology of mesh changed (eg. with
+        dynamic topology sculpting), and patch the mesh tree rather than
+        building it again: subtrees whose faces all survived are kept.
+        If too few faces survived (see min_patch_match) it is rebuilt.
+        The tree's boxes are refitted with the next vertex update.
+
+        The mesh cache is left alone here. Every stroke of dynamic
+        topology sculpting would otherwise write a new entry, and push the
+        entries of other meshes out of the cache.
+        """
+        if self.show_timing_msgs:
+            print("  Topology changed, patching mesh")
+            start = time()
+        old_qem = self.mesh_qem
+        self.mesh_qem = BlenderQEMeshBuilder.construct_from_blender_object(
+            mesh, self.use_array_views, None,
+            local_space=old_qem.local_space)
+        self.mesh_qem.mesh_matrix_not_identity = \
+            old_qem.mesh_matrix_not_identity
+        self.mesh_qem.is_updated = True
+        self.mesh_qem.update_bounding_boxes()
+
+        num_faces = len(self.mesh_qem.arrays.faces)
+        if self.mesh_tree_type == 'FLAT':
+            # The flat layout can't keep subtrees, but the vectorized
+            # build takes about as long as patching
+            face_match = None
+            matched = 0.0
+        else:
+            face_match = match_faces(old_qem.arrays, self.mesh_qem.arrays)
+            matched = np.count_nonzero(face_match != -1) / float(
+                max(num_faces, 1))
+        if face_match is None or matched < self.min_patch_match:
+            # Mostly new faces (eg. after remeshing) make a poor patched
+            # tree
+            self.mesh_tree = self._build_mesh_tree()
+            num_kept = 0
+            num_new = num_faces
+        else:
+            # Join the kept subtrees by their current boxes
+            self.mesh_refitter.update_tree()
+            num_kept, num_new = patch_tree(self.mesh_tree, old_qem.arrays,
+                                           self.mesh_qem.arrays, face_match)
+        self._create_mesh_refitter()
+
+        # Everything keyed by the old rows or versions is stale
+        self.plane_sweeps = {}
+        self.intersector.crossing_cache.clear()
+        self.contour_memo.clear()
+        self.contour_memo_version = None
+        if self.show_timing_msgs:
+            seconds = time() - start
+            print("  Kept %d subtrees, added %d faces, matched %.1f%%" %
+                  (num_kept, num_new, 100.0 * matched))
+            print("  Took %1.5f seconds" % seconds)
+
+    def _build_mesh_tree (self):
+        """ Return the mesh's tree, of the type set by mesh_tree_type.
+        """
+        if self.mesh_tree_type == 'FLAT':
+            # Leaves of 16 faces refit about twice as fast as leaves of
+            # 4, and plane queries are no slower
+            return FlatBVH.build(self.mesh_qem.arrays, leaf_size=16,
+                                 builder='LBVH')
+        return self._build_tree(self.mesh_qem)
+
+    def _get_query_tree (self):
+        """ Return the tree to cut the mesh with: a FlatBVH mesh tree
+        itself, or the FlatBVH an AABBTree's refitter keeps its boxes in.
+        """
+        if self.mesh_refitter is None:
+            return self.mesh_tree
+        return self.mesh_refitter.bvh
+
+    def _create_mesh_refitter (self):
+        """ A FlatBVH is refitted whole, an AABBTree through an
+        AABBRefitter.
+        """
+        if self.mesh_tree_type == 'FLAT':
+            self.mesh_refitter = None
+        else:
+            self.mesh_refitter = AABBRefitter(self.mesh_tree,
+                                              self.mesh_qem.arrays)
+
+    def _build_tree (self, qem):
+        """ Return an AABBTree over qem, loading its structure from the
+        mesh cache if possible.
+        """
+        if self.mesh_cache is None or qem.topology_key is None:
+            return AABBTree(qem)
+        tree = self.mesh_cache.load_tree(qem.topology_key, qem.arrays)
+        if tree is None:
+            tree = AABBTree(qem)
+            self.mesh_cache.save_tree(qem.topology_key, tree, qem.arrays)
+        return tree
+
     def compute_intersection_qem (self, scene,
                                   sl_plane,
-                                  plane, mesh,
-                                  plane_tree, mesh_tree,
+                                  mesh,
+                                  mesh_tree,
                                   loop_name):
-        """ Compute intersection of plane and mesh and return a
+        """ Compute intersection of sl_plane and mesh and return a
         contour representing their intersection.
-        """
-        # Try to remove old loop before anything else
-        try:
-            loop = scene.objects[loop_name]
-        except KeyError:
-            pass
-            #print("Couldn't find old loop! Continuing")
-        else:
-            scene.objects.unlink(loop)
-            bpy.data.objects.remove(loop)
 
+        With the 'OVERLAY' contour display the contours are handed to the
+        viewport overlay and None is returned.
+        """
         if self.show_timing_msgs:
             print("  Searching for ix_points")
             start = time()
-        ixer = Intersector()
-        # ix_contours = ixer.compute_intersection_contour(mesh, plane,
-        #                                                 mesh_tree, plane_tree)
-        ix_contours = ixer.compute_intersection_with_plane(mesh,
-                                                           mesh_tree,
-                                                           sl_plane)
+        polylines = self._get_memoized_contours(sl_plane, mesh, mesh_tree)
         if self.show_timing_msgs:
             seconds = time() - start
             print("  Took %1.5f seconds" % seconds)
+            cache = self.intersector.crossing_cache
+            print("  Crossing cache: %d hits (%d refreshed), %d misses" %
+                  (cache.hits, cache.refreshes, cache.misses))
+            print("  Contour memo: %d hits, %d misses, %d points stored" %
+                  (self.contour_memo.hits, self.contour_memo.misses,
+                   self.contour_memo.size))
 
         if self.show_timing_msgs:
             print("  Creating blender contour")
             start = time()
-        loop = self._create_blender_contour(ix_contours, loop_name)
+        self.current_polylines[loop_name] = polylines
+        if self.contour_display == 'OVERLAY':
+            self.contour_overlay.set_polylines(loop_name, polylines)
+            loop = None
+        else:
+            loop = self.contour_loops[loop_name].write(scene, polylines)
         if self.show_timing_msgs:
             seconds = time() - start
             print("  Took %1.5f seconds" % seconds)
         
         return loop
 
-    def _create_blender_contour (self, contours, loop_name):
-        """ Create a blender object representing one or more contours.
-
-        loop_name - name of the new blender object
-        contour - A list of IntersectionPoints representing the contour
+    def export_contour_objects (self, scene):
+        """ Write the current contours of each plane into mesh objects
+        named after the plane's loop, with an "_export" suffix.
+        Returns the list of objects written.
         """
-        if len(contours) == 0:
-            return None
-        
-        # Create a new object to hold the contours
-        if bpy.ops.object.mode_set.poll():
-            bpy.ops.object.mode_set(mode='OBJECT')
-        bpy.ops.object.add(type='MESH')
-        loop = bpy.context.object
-        loop.name = loop_name
-        
-        for contour in contours:
-            vert_start_idx = len(loop.data.vertices)
-            edge_start_idx = len(loop.data.edges)
-            if contour[0] == contour[-1]:
-                # closed loop
-                is_closed = True
-                num_ixps = len(contour) - 1
-                loop.data.edges.add(len(contour) - 1)
-            else:
-                # open loop
-                is_closed = False
-                num_ixps = len(contour)
-                loop.data.edges.add(len(contour) - 1)
-                
-            loop.data.vertices.add(num_ixps)
-
-            for idx in range(0, num_ixps):
-                vert = loop.data.vertices[vert_start_idx + idx]
-                vert.co = tuple(contour[idx].point)
-
-            for idx in range(0, num_ixps - 1):
-                edge = loop.data.edges[edge_start_idx + idx]
-                edge.vertices = (vert_start_idx + idx, vert_start_idx + idx + 1)
-
-            if is_closed:
-                edge = loop.data.edges[-1]
-                edge.vertices = (vert_start_idx + num_ixps - 1, vert_start_idx)
+        loops = []
+        for loop_name in sorted(self.current_polylines):
+            export = ContourLoop(loop_name + "_export")
+            loops.append(export.write(scene,
+                                      self.current_polylines[loop_name]))
+        return loops
+
+    def compute_slice_stack (self, orientation):
+        """ Return a PolylineStack holding the mesh's contours on every
+        image slice of the plane with the given orientation
+        ('AXIAL', 'SAGITTAL' or 'CORONAL').
+
+        All slices are computed in one sweep along the axis, without
+        creating any Blender objects.
+        """
+        if self.mesh_qem is None:
+            raise ValueError("BlendSeg has not computed its meshes yet!")
+        sl_plane = {'AXIAL': self.axi_plane,
+                    'SAGITTAL': self.sag_plane,
+                    'CORONAL': self.cor_plane}[orientation]
+        axis = sl_plane.orientation.__index__()
+        positions = [sl_plane.get_slice_location(idx)
+                     for idx in range(0, len(sl_plane.img_names))]
+
+        stack = PolylineStack(axis)
+        if self.mesh_qem.local_space:
+            self.mesh_qem.update_matrix_world()
+            for idx, position in enumerate(positions):
+                stack.append(idx, position, self._slice_in_local_space(
+                    self.mesh_qem, self._get_query_tree(),
+                    Plane.orthogonal(axis, position)))
+            return stack
+        for idx, polylines in self.intersector.sweep_slices(
+                self.mesh_qem.arrays, axis, positions):
+            stack.append(idx, positions[idx], polylines)
+        return stack
+
+    def _get_memoized_contours (self, sl_plane, mesh, mesh_tree):
+        """ Return the contours of mesh on sl_plane as Polylines, from the
+        contour memo if this slice was already visited with an unchanged mesh.
+
+        The memo is only used when the plane snaps to slice centres, so
+        that every visit of a slice cuts the mesh at the same position.
+        Free positions hardly ever repeat exactly, and a contour is only
+        right at its own position, so they are always computed.
+        """
+        if not sl_plane.snap_to_slices:
+            return self._compute_polylines(sl_plane, mesh, mesh_tree)
+
+        if self.contour_memo_version != mesh.arrays.version:
+            # Contours of older mesh versions can never be used again
+            self.contour_memo.clear()
+            self.contour_memo_version = mesh.arrays.version
+
+        matrix_key = None
+        if mesh.local_space:
+            # The same slice cuts another contour once the object moved
+            matrix_key = mesh.matrix_world.tobytes()
+        key = (sl_plane.orientation.__index__(),
+               sl_plane.get_slice_index(sl_plane.get_location()),
+               mesh.arrays.version)
+        entry = self.contour_memo.get(key)
+        if entry is not None and entry[0] == matrix_key:
+            return entry[1]
+
+        polylines = self._compute_polylines(sl_plane, mesh, mesh_tree)
+        self.contour_memo.put(key, (matrix_key, polylines))
+        return polylines
+
+    def _compute_polylines (self, sl_plane, mesh, mesh_tree):
+        """ Return the contours of mesh on sl_plane as Polylines.
+        """
+        if mesh.local_space:
+            return self._slice_in_local_space(mesh, mesh_tree,
+                                              sl_plane.get_plane())
+        return Polylines.from_contours(
+            self._compute_contours(sl_plane, mesh, mesh_tree))
+
+    def _slice_in_local_space (self, mesh, mesh_tree, plane):
+        """ Cut the local space mesh with the world space Plane plane, and
+        return the contours in world space as Polylines.
+        """
+        polylines = self.intersector.compute_intersection_with_analytic_plane(
+            mesh.arrays, mesh.plane_in_local_space(plane), mesh_tree)
+        return mesh.polylines_to_world(polylines, plane)
 
-        return loop
+    def _compute_contours (self, sl_plane, mesh, mesh_tree):
+        """ Compute the contours of mesh on sl_plane with the selected
+        slicing_engine.
+        """
+        ixer = self.intersector
+        # ix_contours = ixer.compute_intersection_contour(mesh, plane,
+        #                                                 mesh_tree, plane_tree)
+        if self.slicing_engine == 'SWEEP':
+            return ixer.compute_intersection_with_plane_sweep(
+                self._get_plane_sweep(mesh, sl_plane), sl_plane)
+        elif self.slicing_engine == 'INDEX':
+            return ixer.compute_intersection_with_plane(
+                mesh, mesh.edge_index, sl_plane)
+        elif self.slicing_engine == 'ARRAYS':
+            return ixer.compute_intersection_with_plane_arrays(
+                mesh.arrays, sl_plane)
+        else:
+            return ixer.compute_intersection_with_plane(mesh,
+                                                        mesh_tree,
+                                                        sl_plane)
 
+    def _get_plane_sweep (self, mesh, sl_plane):
+        """ Return the PlaneSweep of mesh along sl_plane's orientation,
+        creating it if necessary.
+        """
+        orientation = sl_plane.orientation.__index__()
+        if orientation not in self.plane_sweeps:
+            self.plane_sweeps[orientation] = PlaneSweep(mesh.arrays,
+                                                        orientation,
+                                                        mesh.edge_index)
+        return self.plane_sweeps[orientation]
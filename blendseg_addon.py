@@ -54,6 +54,10 @@ class BlendSegPanel (bpy.types.Panel):
                              "Start BlendSeg")
         layout.operator(BlendSegCleanupOperator.bl_idname,
                              "Stop BlendSeg")
+        layout.operator(BlendSegExportStackOperator.bl_idname,
+                             "Export contour stack")
+        layout.operator(BlendSegExportContoursOperator.bl_idname,
+                             "Export contours as meshes")
         if BlendSegOperator.blendseg_instance is not None:
             return
         try:
@@ -69,6 +73,10 @@ class BlendSegPanel (bpy.types.Panel):
             layout.prop(context.object, 'blendseg_cor_prefix')
             layout.prop(context.object, 'blendseg_image_ext')
             layout.prop(context.object, 'blendseg_image_spacing')
+            layout.prop(context.object, 'blendseg_snap_to_slices')
+            layout.prop(context.object, 'blendseg_contour_memo_points')
+            layout.prop(context.object, 'blendseg_contour_display',
+                        expand=True)
             layout.prop(context.object, 'blendseg_show_timing_msgs')
         except TypeError:
             pass
@@ -118,7 +126,10 @@ class BlendSegOperator (bpy.types.Operator):
             ob.blendseg_image_origin,
             image_orientation,
             ob.blendseg_image_spacing,
-            ob.blendseg_show_timing_msgs)
+            ob.blendseg_show_timing_msgs,
+            ob.blendseg_snap_to_slices,
+            ob.blendseg_contour_memo_points,
+            ob.blendseg_contour_display)
         mesh = bpy.data.objects[ob.name]
 
         self.blendseg_instance.is_updating = True
@@ -174,13 +185,66 @@ class BlendSegCleanupOperator (bpy.types.Operator):
         return BlendSegOperator.blendseg_instance != None
 
 
+class BlendSegExportStackOperator (bpy.types.Operator):
+    """ Compute the contours on every image slice along one axis
+    and save them to a .npz file.
+    """
+    bl_idname = "object.blendseg_export_stack"
+    bl_label = "Export BlendSeg contour stack"
+
+    orientation = bpy.props.EnumProperty(
+        name="Orientation",
+        items=[("AXIAL", "Axial", ""),
+               ("SAGITTAL", "Sagittal", ""),
+               ("CORONAL", "Coronal", "")])
+    filepath = bpy.props.StringProperty(subtype="FILE_PATH")
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        start = time()
+        stack = BlendSegOperator.blendseg_instance.compute_slice_stack(
+            self.orientation)
+        stack.save(self.filepath)
+        seconds = time() - start
+        print("Exported %d slices (%d points) in %1.5f seconds." %
+              (len(stack), stack.num_points, seconds))
+        return {'FINISHED'}
+
+    @classmethod
+    def poll(cls, context):
+        """ Only run if BlendSeg instance has been instantiated.
+        """
+        return BlendSegOperator.blendseg_instance != None
+
+class BlendSegExportContoursOperator (bpy.types.Operator):
+    """ Write the current contours of all planes into mesh objects.
+    """
+    bl_idname = "object.blendseg_export_contours"
+    bl_label = "Export BlendSeg contours as meshes"
+
+    def execute(self, context):
+        loops = BlendSegOperator.blendseg_instance.export_contour_objects(
+            context.scene)
+        print("Exported %d contour objects." % len(loops))
+        return {'FINISHED'}
+
+    @classmethod
+    def poll(cls, context):
+        """ Only run if BlendSeg instance has been instantiated.
+        """
+        return BlendSegOperator.blendseg_instance != None
+
+
 def create_rna_data():
     """ Create some RNA data so blendseg can
     use a GUI. This is really fucking stupid but I don't know
     a better way to do it yet.
     """
     bpy.types.Object.blendseg_matrix_not_identity = bpy.props.BoolProperty(
-        name="Use World Coordinates (slow)",
+        name="Use World Coordinates",
         default=False)
     bpy.types.Object.blendseg_image_LR = bpy.props.EnumProperty(
         name="L/R",
@@ -224,6 +288,21 @@ def create_rna_data():
         precision=6,
         #default=tuple([1.875,1.875,1.875]))
         default=tuple([0.468,0.468,-0.5]))
+    bpy.types.Object.blendseg_snap_to_slices = bpy.props.BoolProperty(
+        name="Snap planes to slice centres",
+        description="Snap the planes to slice centres, and remember the "
+                    "contours of visited slices",
+        default=False)
+    bpy.types.Object.blendseg_contour_memo_points = bpy.props.IntProperty(
+        name="Contour memory (points)",
+        description="Contour points remembered for snapped planes",
+        min=0,
+        default=1000000)
+    bpy.types.Object.blendseg_contour_display = bpy.props.EnumProperty(
+        name="Contour display",
+        items=[("MESH", "Mesh", "Write contours into loop objects"),
+               ("OVERLAY", "Overlay",
+                "Draw contours in the viewport without scene objects")])
     bpy.types.Object.blendseg_show_timing_msgs = bpy.props.BoolProperty(
         name="print timing (debug)",
         default=False)
@@ -232,11 +311,15 @@ def register_operators():
     """Register Blendseg Operator with blender"""
     bpy.utils.register_class(BlendSegOperator)
     bpy.utils.register_class(BlendSegCleanupOperator)
+    bpy.utils.register_class(BlendSegExportStackOperator)
+    bpy.utils.register_class(BlendSegExportContoursOperator)
     # bpy.utils.register_class(BlendSegPrefs)
 
 def unregister_operators():
     bpy.utils.unregister_class(BlendSegOperator)
     bpy.utils.unregister_class(BlendSegCleanupOperator)
+    bpy.utils.unregister_class(BlendSegExportStackOperator)
+    bpy.utils.unregister_class(BlendSegExportContoursOperator)
     # bpy.utils.unregister_class(BlendSegPrefs)
 
 def register_panel():
@@ -0,0 +1,66 @@
+from collections import OrderedDict
+
+class BoundedLRU (object):
+    """ A key/value store with a bounded total size.
+
+    size_of(value) gives the size of each stored value (eg. in bytes). Once
+    the summed size exceeds max_size, the least recently used entries are
+    evicted. Lookups are counted in hits and misses.
+    """
+
+    def __init__(self, max_size, size_of):
+        self.max_size = max_size
+        self._size_of = size_of
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """ Return the value stored for key, or None if there is none.
+        Marks key as most recently used.
+        """
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """ Store value for key, evicting old entries if needed.
+        Values larger than max_size are not stored.
+        """
+        self.discard(key)
+        size = self._size_of(value)
+        if size > self.max_size:
+            return
+        self._entries[key] = value
+        self._sizes[key] = size
+        self.size += size
+        while self.size > self.max_size:
+            old_key, old_value = self._entries.popitem(last=False)
+            self.size -= self._sizes.pop(old_key)
+            self.evictions += 1
+
+    def discard(self, key):
+        """ Remove key if it is stored.
+        """
+        if key in self._entries:
+            del self._entries[key]
+            self.size -= self._sizes.pop(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._sizes.clear()
+        self.size = 0
@@ -0,0 +1,53 @@
+from time import time
+
+import numpy as np
+
+from .bvh_builders import BUILDERS
+from .flat_bvh import FlatBVH
+from .blender_quad_edge_mesh import BlenderQEMeshBuilder
+
+def benchmark_builders(arrays, leaf_size=4, num_planes=64, builders=None):
+    """ Build a FlatBVH over arrays with each builder and query it with
+    num_planes orthogonal planes spread evenly through the mesh along
+    each axis. Prints and returns a list of
+    (builder, build seconds, nodes, nodes visited per plane query,
+    seconds per plane query).
+    """
+    if builders is None:
+        builders = sorted(BUILDERS)
+    face_min, face_max = arrays.face_bounds()
+    lo = face_min.min(axis=0)
+    hi = face_max.max(axis=0)
+    queries = [(axis, position) for axis in range(0, 3)
+               for position in np.linspace(lo[axis], hi[axis],
+                                           num_planes + 2)[1:-1]]
+
+    results = []
+    print("%-8s %10s %8s %14s %12s" % ("builder", "build (s)", "nodes",
+                                      "visits/query", "query (ms)"))
+    for builder in builders:
+        start = time()
+        bvh = FlatBVH.build(arrays, leaf_size, builder)
+        build_time = time() - start
+
+        bvh.nodes_visited = 0
+        start = time()
+        for orientation, position in queries:
+            bvh.crossing_plane_rows(orientation, position)
+        query_time = (time() - start) / len(queries)
+        visits = bvh.nodes_visited / float(len(queries))
+
+        print("%-8s %10.3f %8d %14.1f %12.3f" % (builder, build_time,
+                                                 len(bvh), visits,
+                                                 query_time * 1000))
+        results.append((builder, build_time, len(bvh), visits, query_time))
+    return results
+
+def benchmark_object(blender_object, leaf_size=4, num_planes=64):
+    """ Run benchmark_builders on a Blender mesh object, eg.
+    benchmark_object(bpy.context.active_object) in the Python console.
+    """
+    bqem = BlenderQEMeshBuilder.construct_from_blender_object(
+        blender_object, True)
+    print("%s: %d faces" % (blender_object.name, len(bqem.arrays.faces)))
+    return benchmark_builders(bqem.arrays, leaf_size, num_planes)
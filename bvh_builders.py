@@ -0,0 +1,245 @@
+""" Builders for FlatBVH.
+
+Each builder takes the (nfaces, 3) face bounds face_min, face_max and the
+maximum number of faces per leaf, and returns the tuple
+(node_children, node_starts, node_counts, face_order) that FlatBVH is
+constructed from, with the root at node 0 and children after their
+parents.
+"""
+
+import numpy as np
+
+def median_split(face_min, face_max, leaf_size):
+    """ Split at the median face centre along the axis the centres spread
+    most. Simple and balanced, but blind to how much the halves overlap.
+    """
+    centres = (face_min + face_max) / 2.0
+    face_order = np.arange(len(centres), dtype=np.int64)
+
+    children = []
+    starts = []
+    counts = []
+    stack = [(-1, 0, 0, len(face_order))]
+    while len(stack) != 0:
+        parent, side, lo, hi = stack.pop()
+        node = len(children)
+        if parent != -1:
+            children[parent][side] = node
+        children.append([-1, -1])
+        starts.append(lo)
+        if hi - lo <= leaf_size:
+            counts.append(hi - lo)
+            continue
+        counts.append(0)
+        node_centres = centres[face_order[lo:hi]]
+        axis = np.argmax(node_centres.max(axis=0) - node_centres.min(axis=0))
+        half = (hi - lo) // 2
+        split = np.argpartition(node_centres[:, axis], half)
+        face_order[lo:hi] = face_order[lo:hi][split]
+        stack.append((node, 1, lo + half, hi))
+        stack.append((node, 0, lo, lo + half))
+    return children, starts, counts, face_order
+
+def morton_lbvh(face_min, face_max, leaf_size):
+    """ Linear BVH: sort the faces along a Morton (Z-order) curve through
+    their centres and split every range where the highest bit of the
+    Morton code changes (Karras, "Maximizing Parallelism in the
+    Construction of BVHs, Octrees, and k-d Trees", 2012).
+
+    All nodes are built at once with array operations, so this is the
+    fastest builder, at the cost of somewhat looser boxes.
+    """
+    num_faces = len(face_min)
+    if num_faces <= leaf_size:
+        return [[-1, -1]], [0], [num_faces], np.arange(num_faces)
+
+    centres = (face_min + face_max) / 2.0
+    lo = centres.min(axis=0)
+    extent = np.maximum(centres.max(axis=0) - lo, 1e-30)
+    cells = np.minimum((centres - lo) / extent * 1024, 1023).astype(np.uint64)
+    codes = (_spread_bits(cells[:, 0]) << np.uint64(2) |
+             _spread_bits(cells[:, 1]) << np.uint64(1) |
+             _spread_bits(cells[:, 2]))
+    face_order = np.argsort(codes, kind='mergesort')
+    # Appending the position makes every key unique
+    keys = codes[face_order] << np.uint64(32) | np.arange(
+        num_faces, dtype=np.uint64)
+
+    def delta(i, j):
+        """ Length of the common prefix of keys i and j, -1 if j is out
+        of range. """
+        valid = (j >= 0) & (j < num_faces)
+        j = np.where(valid, j, 0)
+        return np.where(valid, 64 - _bit_length(keys[i] ^ keys[j]), -1)
+
+    # Internal node i covers a range of leaves starting or ending at i
+    i = np.arange(num_faces - 1)
+    direction = np.where(delta(i, i + 1) > delta(i, i - 1), 1, -1)
+    delta_min = delta(i, i - direction)
+    length_max = np.full(len(i), 2, dtype=np.int64)
+    grow = delta(i, i + length_max * direction) > delta_min
+    while np.any(grow):
+        length_max[grow] *= 2
+        grow = delta(i, i + length_max * direction) > delta_min
+    length = np.zeros(len(i), dtype=np.int64)
+    step = length_max // 2
+    while np.any(step >= 1):
+        take = (step >= 1) & (delta(i, i + (length + step) * direction) >
+                              delta_min)
+        length[take] += step[take]
+        step //= 2
+    j = i + length * direction
+
+    # Find where the common prefix of the range gets longer
+    delta_node = delta(i, j)
+    split = np.zeros(len(i), dtype=np.int64)
+    active = np.ones(len(i), dtype=bool)
+    divisor = 2
+    while np.any(active):
+        step = (length + divisor - 1) // divisor
+        take = active & (delta(i, i + (split + step) * direction) >
+                         delta_node)
+        split[take] += step[take]
+        active &= step > 1
+        divisor *= 2
+    gamma = i + split * direction + np.minimum(direction, 0)
+
+    # Number all nodes together: internal nodes first, then the
+    # num_faces single-face leaves
+    range_lo = np.concatenate((np.minimum(i, j), np.arange(num_faces)))
+    range_hi = np.concatenate((np.maximum(i, j), np.arange(num_faces)))
+    all_children = np.full((len(range_lo), 2), -1, dtype=np.int64)
+    all_children[i, 0] = np.where(range_lo[i] == gamma,
+                                  num_faces - 1 + gamma, gamma)
+    all_children[i, 1] = np.where(range_hi[i] == gamma + 1,
+                                  num_faces + gamma, gamma + 1)
+
+    # Renumber breadth first from the root, stopping at ranges small
+    # enough to be leaves
+    size = range_hi - range_lo + 1
+    levels = []
+    frontier = np.zeros(1, dtype=np.int64)
+    while len(frontier) != 0:
+        levels.append(frontier)
+        frontier = all_children[frontier[size[frontier] > leaf_size]].ravel()
+    order = np.concatenate(levels)
+    new_index = np.full(len(range_lo), -1, dtype=np.int64)
+    new_index[order] = np.arange(len(order))
+
+    is_leaf = size[order] <= leaf_size
+    children = np.full((len(order), 2), -1, dtype=np.int64)
+    children[~is_leaf] = new_index[all_children[order[~is_leaf]]]
+    counts = np.where(is_leaf, size[order], 0)
+    return children, range_lo[order], counts, face_order
+
+def binned_sah(face_min, face_max, leaf_size, num_bins=16):
+    """ Split where the surface area heuristic is lowest, estimated by
+    dropping the face centres into num_bins bins along each axis. Slowest
+    to build, but gives the fewest node visits per query.
+    """
+    centres = (face_min + face_max) / 2.0
+    face_order = np.arange(len(centres), dtype=np.int64)
+
+    children = []
+    starts = []
+    counts = []
+    stack = [(-1, 0, 0, len(face_order))]
+    while len(stack) != 0:
+        parent, side, lo, hi = stack.pop()
+        node = len(children)
+        if parent != -1:
+            children[parent][side] = node
+        children.append([-1, -1])
+        starts.append(lo)
+        if hi - lo <= leaf_size:
+            counts.append(hi - lo)
+            continue
+        counts.append(0)
+
+        faces = face_order[lo:hi]
+        left = _best_sah_split(centres[faces], face_min[faces],
+                               face_max[faces], num_bins)
+        num_left = np.count_nonzero(left)
+        if num_left == 0 or num_left == len(faces):
+            # All centres in one bin, fall back to the median
+            num_left = len(faces) // 2
+            node_centres = centres[faces]
+            axis = np.argmax(node_centres.max(axis=0) -
+                             node_centres.min(axis=0))
+            faces = faces[np.argpartition(node_centres[:, axis], num_left)]
+        else:
+            faces = np.concatenate((faces[left], faces[~left]))
+        face_order[lo:hi] = faces
+        stack.append((node, 1, lo + num_left, hi))
+        stack.append((node, 0, lo, lo + num_left))
+    return children, starts, counts, face_order
+
+def _best_sah_split(centres, face_min, face_max, num_bins):
+    """ Return a mask of the faces left of the best binned SAH split.
+    All three axes are binned together, in one pass over the faces.
+    """
+    num_faces = len(centres)
+    lo = centres.min(axis=0)
+    extent = centres.max(axis=0) - lo
+    scale = num_bins / np.where(extent > 0, extent, np.inf)
+    bins = np.minimum(((centres - lo) * scale).astype(np.int64),
+                      num_bins - 1)
+
+    # Group the faces by (axis, bin)
+    keys = (bins + np.arange(3) * num_bins).T.ravel()
+    order = np.argsort(keys, kind='mergesort')
+    bin_counts = np.bincount(keys, minlength=3 * num_bins)
+    used = np.flatnonzero(bin_counts)
+    starts = np.cumsum(bin_counts)[used] - bin_counts[used]
+    faces = order % num_faces
+    bin_min = np.full((3 * num_bins, 3), np.inf)
+    bin_max = np.full((3 * num_bins, 3), -np.inf)
+    bin_min[used] = np.minimum.reduceat(face_min[faces], starts)
+    bin_max[used] = np.maximum.reduceat(face_max[faces], starts)
+    bin_min = bin_min.reshape(3, num_bins, 3)
+    bin_max = bin_max.reshape(3, num_bins, 3)
+    bin_counts = bin_counts.reshape(3, num_bins)
+
+    # Split k along an axis puts bins 0..k on the left
+    left_area = _area(np.minimum.accumulate(bin_min, axis=1)[:, :-1],
+                      np.maximum.accumulate(bin_max, axis=1)[:, :-1])
+    right_area = _area(
+        np.minimum.accumulate(bin_min[:, ::-1], axis=1)[:, ::-1][:, 1:],
+        np.maximum.accumulate(bin_max[:, ::-1], axis=1)[:, ::-1][:, 1:])
+    left_count = np.cumsum(bin_counts, axis=1)[:, :-1]
+    right_count = num_faces - left_count
+    with np.errstate(invalid='ignore'):
+        cost = np.where((left_count == 0) | (right_count == 0), np.inf,
+                        left_count * left_area + right_count * right_area)
+    best = np.argmin(cost)
+    if not np.isfinite(cost.flat[best]):
+        return np.zeros(num_faces, dtype=bool)
+    axis, k = divmod(best, num_bins - 1)
+    return bins[:, axis] <= k
+
+def _area(box_min, box_max):
+    """ Half the surface area of each box. """
+    d = box_max - box_min
+    return (d[..., 0] * d[..., 1] + d[..., 1] * d[..., 2] +
+            d[..., 2] * d[..., 0])
+
+def _spread_bits(x):
+    """ Spread the low 10 bits of each x so there are two zero bits
+    between each of them. """
+    x = x & np.uint64(0x3ff)
+    x = (x | x << np.uint64(16)) & np.uint64(0x30000ff)
+    x = (x | x << np.uint64(8)) & np.uint64(0x300f00f)
+    x = (x | x << np.uint64(4)) & np.uint64(0x30c30c3)
+    x = (x | x << np.uint64(2)) & np.uint64(0x9249249)
+    return x
+
+def _bit_length(x):
+    """ Number of significant bits of each uint64 in x. """
+    high = (x >> np.uint64(32)).astype(np.float64)
+    low = (x & np.uint64(0xffffffff)).astype(np.float64)
+    # frexp is exact for values below 2**53
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+BUILDERS = {'MEDIAN': median_split,
+            'LBVH': morton_lbvh,
+            'SAH': binned_sah}
@@ -0,0 +1,131 @@
+import threading
+import traceback
+
+import numpy as np
+
+from .bvh_builders import BUILDERS
+from .flat_bvh import FlatBVH
+from .aabb_refit import AABBRefitter, aabb_tree_from_rows
+
+class BVHRebuilder (object):
+    """ Rebuild a FlatBVH in a background thread once refitting has made it
+    too much costlier (see FlatBVH.degradation) than when it was built.
+
+    The rebuild works on a copy of the vertex positions. The interactive
+    code keeps querying the refitted tree and calls swap() on every
+    update. swap() returns the rebuilt tree once it is ready, refitted
+    to the current positions. Replacing the tree is a single reference
+    assignment on the caller's side.
+    """
+
+    def __init__(self, threshold=1.5, leaf_size=16, builder='LBVH'):
+        if builder not in BUILDERS:
+            raise ValueError("builder must be one of %s"
+                             % ", ".join(sorted(BUILDERS)))
+        self.threshold = threshold
+        self.leaf_size = leaf_size
+        self.builder = builder
+        self._lock = threading.Lock()
+        self._thread = None
+        self._result = None
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def check(self, bvh):
+        """ Start rebuilding bvh if it degraded past the threshold and no
+        rebuild is running. Returns bvh's degradation.
+        """
+        degradation = bvh.degradation()
+        if degradation > self.threshold and self._thread is None:
+            self._thread = threading.Thread(
+                target=self._rebuild,
+                args=(bvh.arrays, bvh.arrays.vert_pos.copy()))
+            self._thread.daemon = True
+            self._thread.start()
+        return degradation
+
+    def swap(self, bvh):
+        """ Return the rebuilt tree if one is ready for bvh's mesh,
+        otherwise bvh itself.
+        """
+        with self._lock:
+            result = self._result
+            self._result = None
+        if result is None:
+            return bvh
+        self._thread = None
+        if result is False or result.arrays is not bvh.arrays:
+            # Failed, or the mesh was replaced in the meantime
+            return bvh
+        # Positions may have moved since the copy was taken
+        self._finish(result)
+        return result
+
+    def _rebuild(self, arrays, vert_pos):
+        try:
+            corners = vert_pos[arrays.face_verts]
+            result = self._build(arrays, corners.min(axis=1),
+                                 corners.max(axis=1))
+        except Exception:
+            traceback.print_exc()
+            result = False
+        with self._lock:
+            self._result = result
+
+    def _build(self, arrays, face_min, face_max):
+        """ Build the new tree over the faces of arrays, with the face
+        bounds face_min, face_max. Runs in the background thread.
+        """
+        children, starts, counts, face_order = BUILDERS[self.builder](
+            face_min, face_max, self.leaf_size)
+        return FlatBVH(arrays, children, starts, counts, face_order)
+
+    def _finish(self, result):
+        """ Bring a rebuilt tree up to the current positions. """
+        result.refit()
+        result.reset_quality()
+
+class AABBRebuilder (BVHRebuilder):
+    """ Rebuild an AABBTree in a background thread once refitting through
+    its AABBRefitter has made it too much costlier than when it was built.
+
+    check() and swap() take an AABBRefitter, and swap() returns a new
+    AABBRefitter over the rebuilt tree. The vectorized builder builds the
+    tree with one face per leaf, and it is turned into AABBNodes and
+    flattened into its refitter in the thread too. If a MeshCache and key
+    are given to check(), the rebuilt structure is also stored there, so
+    the next session loads it instead of the degraded one.
+    """
+
+    def __init__(self, threshold=1.5, builder='LBVH'):
+        BVHRebuilder.__init__(self, threshold, 1, builder)
+        self._cache = None
+        self._key = None
+
+    def check(self, refitter, cache=None, key=None):
+        """ Start rebuilding refitter's tree if it degraded past the
+        threshold and no rebuild is running. Returns its degradation.
+        """
+        if self._thread is None:
+            self._cache = cache
+            self._key = key
+        return BVHRebuilder.check(self, refitter.bvh)
+
+    def _build(self, arrays, face_min, face_max):
+        children, starts, counts, face_order = [
+            np.asarray(rows, dtype=np.int64)
+            for rows in BUILDERS[self.builder](face_min, face_max, 1)]
+        if np.any(counts > 1):
+            raise ValueError("Couldn't split the faces into single leaves")
+        node_faces = np.where(counts == 1, face_order[starts], -1)
+        tree = aabb_tree_from_rows(children, node_faces, arrays.faces,
+                                   face_min, face_max)
+        if self._cache is not None and self._key is not None:
+            self._cache.save_tree_rows(self._key, children, node_faces)
+        return AABBRefitter(tree, arrays)
+
+    def _finish(self, result):
+        result.bvh.refit()
+        result.bvh.reset_quality()
@@ -0,0 +1,64 @@
+import zlib
+
+import numpy as np
+
+class VertexChangeDetector (object):
+    """ Detect changes to a Blender mesh's vertex coordinates.
+
+    Sculpting does not set is_updated on the object, so instead the
+    coordinate buffer is read into a reused array on every check and
+    split into chunks of chunk_size vertices. Each chunk is summarised by
+    a CRC of its raw bytes, which unlike a sum also changes when values
+    are swapped or edits cancel out, and the chunks whose CRC differs
+    from the previous check are reported as changed.
+    """
+
+    def __init__(self, chunk_size=4096):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        self.chunk_size = chunk_size
+        self.reset()
+
+    def reset(self):
+        """ Forget the previous checksums, the next check sets a new
+        baseline.
+        """
+        self._buffer = None
+        self._checksums = None
+
+    def check(self, blender_mesh):
+        """ Compare blender_mesh's vertex coordinates with the previous
+        call. Returns the sorted indices of the chunks that changed, see
+        chunk_verts. The first call only records a baseline and reports
+        no changes. If the number of vertices changed (eg. with dynamic
+        topology sculpting), every chunk is reported.
+        """
+        vertices = blender_mesh.vertices
+        num_verts = len(vertices)
+        resized = False
+        if self._buffer is None or len(self._buffer) != num_verts * 3:
+            resized = self._buffer is not None
+            self._buffer = np.empty(num_verts * 3, dtype=np.float32)
+
+        vertices.foreach_get('co', self._buffer)
+        # The last chunk may be partial, but is never empty
+        chunk_floats = self.chunk_size * 3
+        starts = range(0, len(self._buffer), chunk_floats)
+        checksums = np.array(
+            [zlib.crc32(self._buffer[start:start + chunk_floats])
+             for start in starts], dtype=np.uint32)
+
+        previous = self._checksums
+        self._checksums = checksums
+        if previous is None:
+            return np.zeros(0, dtype=np.int64)
+        if resized:
+            return np.arange(len(checksums), dtype=np.int64)
+        return np.flatnonzero(checksums != previous)
+
+    def chunk_verts(self, chunk):
+        """ Return the (start, stop) range of vertex indices in chunk.
+        """
+        start = chunk * self.chunk_size
+        stop = min(start + self.chunk_size, len(self._buffer) // 3)
+        return start, stop
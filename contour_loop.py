@@ -0,0 +1,75 @@
+import numpy as np
+
+import bpy
+
+class ContourLoop (object):
+    """ A persistent Blender object displaying the contours of one plane.
+
+    The object is created once and its mesh data is overwritten in place on
+    every update. The mesh always holds exactly the contours' points and
+    edges: it grows in place with add(), and is only replaced by a new
+    mesh when it has to shrink, as Blender cannot remove mesh elements
+    outside of edit mode. No bpy.ops operators are called, so updating
+    does not depend on the current mode or active object.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def get_object(self, scene):
+        """ Return the loop object, creating and linking it to scene if
+        necessary.
+        """
+        try:
+            return scene.objects[self.name]
+        except KeyError:
+            pass
+
+        try:
+            loop = bpy.data.objects[self.name]
+        except KeyError:
+            mesh = bpy.data.meshes.new(self.name)
+            loop = bpy.data.objects.new(self.name, mesh)
+        scene.objects.link(loop)
+        return loop
+
+    def write(self, scene, polylines):
+        """ Overwrite the loop's mesh with polylines and return the loop
+        object. The object is hidden if there are no contours.
+        """
+        loop = self.get_object(scene)
+        edges = polylines.edge_indices()
+        mesh = loop.data
+        if (len(mesh.vertices) > polylines.num_points or
+            len(mesh.edges) > len(edges)):
+            mesh = self._replace_mesh(loop, polylines.num_points, len(edges))
+        else:
+            if len(mesh.vertices) < polylines.num_points:
+                mesh.vertices.add(polylines.num_points - len(mesh.vertices))
+            if len(mesh.edges) < len(edges):
+                mesh.edges.add(len(edges) - len(mesh.edges))
+        if polylines.num_points == 0:
+            loop.hide = True
+            return loop
+
+        mesh.vertices.foreach_set(
+            'co', np.ascontiguousarray(polylines.coords,
+                                       dtype=np.float32).ravel())
+        mesh.edges.foreach_set(
+            'vertices', np.ascontiguousarray(edges, dtype=np.int32).ravel())
+        mesh.update()
+        loop.hide = False
+        return loop
+
+    def _replace_mesh(self, loop, num_verts, num_edges):
+        """ Replace the loop's mesh with a new one of num_verts vertices
+        and num_edges edges.
+        """
+        old_mesh = loop.data
+        mesh = bpy.data.meshes.new(self.name)
+        mesh.vertices.add(num_verts)
+        mesh.edges.add(num_edges)
+        loop.data = mesh
+        if old_mesh.users == 0:
+            bpy.data.meshes.remove(old_mesh)
+        return mesh
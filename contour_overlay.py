@@ -0,0 +1,85 @@
+import bpy
+import bgl
+
+class ContourOverlay (object):
+    """ Draw contours in the 3D viewport straight from Polylines,
+    without creating any Blender objects.
+
+    The points of each contour set are copied once into a float bgl.Buffer.
+    A POST_VIEW draw handler points generic vertex attribute 0 (which
+    specifies the vertex position) at that buffer and draws every polyline
+    as a line strip (or loop, if closed) with glDrawArrays, so a redraw
+    costs a few calls per polyline rather than one per point. Updating
+    the contours only swaps the stored buffers and tags the 3D views for
+    redraw, so neither the scene nor the current mode are touched.
+    """
+
+    def __init__(self, color=(1.0, 0.8, 0.0, 1.0), line_width=2.0):
+        self.color = color
+        self.line_width = line_width
+        # name -> (bgl.Buffer of the points, list of (mode, start, count))
+        self._lines = {}
+        self._handle = None
+
+    def register(self):
+        """ Add the draw handler to the 3D viewport.
+        """
+        if self._handle is None:
+            self._handle = bpy.types.SpaceView3D.draw_handler_add(
+                self.draw_callback, (), 'WINDOW', 'POST_VIEW')
+
+    def unregister(self):
+        """ Remove the draw handler and forget all contours.
+        """
+        if self._handle is not None:
+            bpy.types.SpaceView3D.draw_handler_remove(self._handle, 'WINDOW')
+            self._handle = None
+        self._lines.clear()
+        self.tag_redraw()
+
+    def set_polylines(self, name, polylines):
+        """ Replace the contours drawn under name with polylines.
+        """
+        if polylines.num_points == 0:
+            self.hide(name)
+            return
+        points = bgl.Buffer(bgl.GL_FLOAT, polylines.num_points * 3,
+                            polylines.coords.ravel().tolist())
+        strips = [(bgl.GL_LINE_LOOP if is_closed else bgl.GL_LINE_STRIP,
+                   start, count)
+                  for start, count, is_closed in zip(
+                      polylines.starts.tolist(), polylines.counts.tolist(),
+                      polylines.closed.tolist())]
+        self._lines[name] = (points, strips)
+        self.tag_redraw()
+
+    def hide(self, name):
+        """ Stop drawing the contours stored under name.
+        """
+        if self._lines.pop(name, None) is not None:
+            self.tag_redraw()
+
+    def tag_redraw(self):
+        screen = bpy.context.screen
+        if screen is None:
+            return
+        for area in screen.areas:
+            if area.type == 'VIEW_3D':
+                area.tag_redraw()
+
+    def draw_callback(self):
+        bgl.glEnable(bgl.GL_BLEND)
+        bgl.glLineWidth(self.line_width)
+        bgl.glColor4f(*self.color)
+        bgl.glEnableVertexAttribArray(0)
+        for points, strips in self._lines.values():
+            bgl.glVertexAttribPointer(0, 3, bgl.GL_FLOAT, bgl.GL_FALSE, 0,
+                                      points)
+            for mode, start, count in strips:
+                bgl.glDrawArrays(mode, start, count)
+        bgl.glDisableVertexAttribArray(0)
+
+        # Restore defaults
+        bgl.glLineWidth(1)
+        bgl.glDisable(bgl.GL_BLEND)
+        bgl.glColor4f(0.0, 0.0, 0.0, 1.0)
@@ -0,0 +1,82 @@
+import numpy as np
+
+from .bounded_lru import BoundedLRU
+
+class CrossingCache (object):
+    """ Remember which edges cross a plane, and where, per
+    (mesh, axis, slice index), across Intersector calls.
+
+    Entries record the mesh version (see QEMeshArrays.mark_dirty) they were
+    computed at. When the mesh has changed since, only the edges next to
+    vertices changed in the meantime are tested again; the rest of the
+    entry is kept. Memory is bounded by max_bytes, evicting the least
+    recently used slice positions first.
+    """
+
+    def __init__(self, max_bytes=64*1024*1024):
+        self._entries = BoundedLRU(max_bytes, lambda entry: entry.nbytes)
+        self.hits = 0
+        self.misses = 0
+        # Hits that needed some edges recomputed
+        self.refreshes = 0
+
+    def get(self, arrays, orientation, slice_index, position):
+        """ Return (edge_rows, points) for the edges of arrays crossing the
+        orthogonal plane at position, or None if they are not cached.
+        """
+        key = (id(arrays), orientation, slice_index)
+        entry = self._entries.get(key)
+        if (entry is None or entry.arrays is not arrays or
+            entry.position != position):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if entry.version != arrays.version:
+            self._refresh(entry)
+            # Store again, as the entry's size may have changed
+            self._entries.put(key, entry)
+            self.refreshes += 1
+
+        return entry.edge_rows, entry.points
+
+    def put(self, arrays, orientation, slice_index, position,
+            edge_rows, points):
+        """ Cache the edges of arrays crossing the orthogonal plane at
+        position, and their crossing points.
+        """
+        key = (id(arrays), orientation, slice_index)
+        self._entries.put(key, _CrossingEntry(arrays, orientation, position,
+                                              edge_rows, points))
+
+    def clear(self):
+        self._entries.clear()
+
+    def _refresh(self, entry):
+        """ Recompute the crossings of edges touching vertices that changed
+        since entry was computed.
+        """
+        arrays = entry.arrays
+        dirty_edges = arrays.edges_of_verts(
+            arrays.dirty_verts_since(entry.version))
+        keep = ~np.isin(entry.edge_rows, dirty_edges)
+        new_edges = arrays.crossing_edges(entry.orientation, entry.position,
+                                          dirty_edges)
+        new_points = arrays.crossing_points(new_edges, entry.orientation,
+                                            entry.position)
+        entry.edge_rows = np.concatenate((entry.edge_rows[keep], new_edges))
+        entry.points = np.concatenate((entry.points[keep], new_points))
+        entry.version = arrays.version
+
+class _CrossingEntry (object):
+    def __init__(self, arrays, orientation, position, edge_rows, points):
+        self.arrays = arrays
+        self.orientation = orientation
+        self.position = position
+        self.edge_rows = edge_rows
+        self.points = points
+        self.version = arrays.version
+
+    @property
+    def nbytes(self):
+        return self.edge_rows.nbytes + self.points.nbytes
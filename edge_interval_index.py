@@ -0,0 +1,162 @@
+import numpy as np
+
+from .mesh_arrays import QEMeshArrays
+
+class EdgeIntervalIndex (object):
+    """ Per-axis index of the extents of every edge of a QEMeshArrays.
+
+    A SlicePlane only ever moves along one principal axis, so instead of a
+    general 3D hierarchy, each axis gets a centred interval tree over the
+    [min, max] extent of every edge along that axis. A query for a plane
+    position returns exactly the edges crossing the plane in
+    O(log n + k) time.
+
+    The index must be told with update() whenever vertex positions
+    change. The trees are not rebuilt right away: while sculpting, every
+    update is followed by a single query per plane, which a vectorized
+    pass over the edges answers much faster. An axis' tree is only
+    rebuilt once it is queried again before the next update, eg. when a
+    plane is dragged.
+    """
+
+    def __init__(self, arrays):
+        if not isinstance(arrays, QEMeshArrays):
+            raise TypeError("arrays must be of type QEMeshArrays!")
+        self.arrays = arrays
+        self.update()
+
+    def update(self):
+        """ Drop the interval trees, they are rebuilt from the current
+        vertex positions when needed.
+        """
+        self._trees = [None, None, None]
+        # Whether each axis was queried since the last update
+        self._queried = [False, False, False]
+
+    def crossing_edges(self, orientation, position):
+        """ Return the rows of the edges crossing the orthogonal plane at
+        position along axis orientation. Uses the same crossing rule as
+        QEMeshArrays.crossing_edges.
+        """
+        tree = self._trees[orientation]
+        if tree is None:
+            if not self._queried[orientation]:
+                self._queried[orientation] = True
+                return self.arrays.crossing_edges(orientation, position)
+            coords = self.arrays.vert_pos[self.arrays.edge_verts, orientation]
+            tree = _CentredIntervalTree(coords.min(axis=1),
+                                        coords.max(axis=1))
+            self._trees[orientation] = tree
+        return tree.stab(position)
+
+class _CentredIntervalTree (object):
+    """ A centred interval tree over half-open intervals (lo, hi],
+    flattened into arrays.
+
+    Each node stores the intervals containing its centre twice: sorted by
+    ascending lo and by descending hi. Intervals entirely below the centre
+    go to the left child, those entirely above to the right. Small sets are
+    stored as buckets that are scanned directly.
+    """
+    BUCKET_SIZE = 16
+
+    def __init__(self, lo, hi):
+        # Empty intervals (edges lying in a plane) can never be crossed.
+        ids = np.flatnonzero(lo < hi)
+
+        centres = []
+        lefts = []
+        rights = []
+        starts = []
+        counts = []
+        lo_blocks = []
+        lo_id_blocks = []
+        hi_blocks = []
+        hi_id_blocks = []
+        start = 0
+
+        # (ids, parent node, is_right_child)
+        stack = [(ids, -1, False)]
+        while len(stack) != 0:
+            node_ids, parent, is_right = stack.pop()
+            node = len(centres)
+            if parent != -1:
+                if is_right:
+                    rights[parent] = node
+                else:
+                    lefts[parent] = node
+
+            node_lo = lo[node_ids]
+            node_hi = hi[node_ids]
+            if len(node_ids) <= self.BUCKET_SIZE:
+                centre = np.nan
+                here = np.arange(len(node_ids))
+            else:
+                mids = (node_lo + node_hi) / 2
+                centre = np.partition(mids, len(mids)//2)[len(mids)//2]
+                below = node_hi < centre
+                above = node_lo >= centre
+                here = np.flatnonzero(~(below | above))
+
+            centres.append(centre)
+            lefts.append(-1)
+            rights.append(-1)
+            starts.append(start)
+            counts.append(len(here))
+            start += len(here)
+
+            here_lo = node_lo[here]
+            here_hi = node_hi[here]
+            order = np.argsort(here_lo, kind='mergesort')
+            lo_blocks.append(here_lo[order])
+            lo_id_blocks.append(node_ids[here][order])
+            if not np.isnan(centre):
+                order = np.argsort(-here_hi, kind='mergesort')
+            # else a bucket keeps both copies in the same order
+            hi_blocks.append(-here_hi[order])
+            hi_id_blocks.append(node_ids[here][order])
+
+            if not np.isnan(centre):
+                if below.any():
+                    stack.append((node_ids[below], node, False))
+                if above.any():
+                    stack.append((node_ids[above], node, True))
+
+        self.node_centre = np.array(centres)
+        self.node_left = np.array(lefts, dtype=np.int32)
+        self.node_right = np.array(rights, dtype=np.int32)
+        self.node_start = np.array(starts, dtype=np.int64)
+        self.node_count = np.array(counts, dtype=np.int64)
+        self.by_lo = np.concatenate(lo_blocks)
+        self.by_lo_ids = np.concatenate(lo_id_blocks)
+        # Store -hi so both lists are searched in ascending order
+        self.by_neg_hi = np.concatenate(hi_blocks)
+        self.by_neg_hi_ids = np.concatenate(hi_id_blocks)
+
+    def stab(self, position):
+        """ Return the ids of all intervals with lo < position <= hi.
+        """
+        found = []
+        node = 0 if len(self.node_centre) != 0 else -1
+        while node != -1:
+            start = self.node_start[node]
+            end = start + self.node_count[node]
+            centre = self.node_centre[node]
+            if np.isnan(centre):
+                inside = ((self.by_lo[start:end] < position) &
+                          (self.by_neg_hi[start:end] <= -position))
+                found.append(self.by_lo_ids[start:end][inside])
+                break
+            if position < centre:
+                num = np.searchsorted(self.by_lo[start:end], position, 'left')
+                found.append(self.by_lo_ids[start:start+num])
+                node = self.node_left[node]
+            else:
+                num = np.searchsorted(self.by_neg_hi[start:end], -position,
+                                      'right')
+                found.append(self.by_neg_hi_ids[start:start+num])
+                node = self.node_right[node]
+
+        if len(found) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(found)
@@ -0,0 +1,435 @@
+import numpy as np
+
+from .bvh_builders import BUILDERS
+
+class FlatBVH (object):
+    """ A bounding volume hierarchy over the faces of a QEMeshArrays,
+    stored in flat arrays instead of a tree of AABBNode objects.
+
+    node_min, node_max - (nnodes, 3) node bounding boxes
+    node_children      - (nnodes, 2) left and right child nodes, -1 for
+                         leaves
+    node_starts        - (nnodes,) start of each leaf's faces in face_order
+    node_counts        - (nnodes,) number of faces of each leaf, 0 for
+                         internal nodes
+    face_order         - face rows, grouped by leaf
+
+    Nodes are numbered breadth first from the root, node 0.
+    Queries walk the tree breadth first with an explicit frontier of
+    nodes, testing the boxes of a whole frontier in one vectorized step.
+    It can stand in for an AABBTree in the Intersector.
+    """
+
+    def __init__(self, arrays, node_children, node_starts, node_counts,
+                 face_order):
+        self.arrays = arrays
+        self.node_children = np.asarray(node_children,
+                                        dtype=np.int64).reshape(-1, 2)
+        self.node_starts = np.asarray(node_starts, dtype=np.int64)
+        self.node_counts = np.asarray(node_counts, dtype=np.int64)
+        self.face_order = np.asarray(face_order, dtype=np.int64)
+        self.node_min = np.zeros((len(self.node_counts), 3))
+        self.node_max = np.zeros((len(self.node_counts), 3))
+        # Nodes whose boxes were tested by queries, for benchmarking
+        self.nodes_visited = 0
+        self._number_breadth_first()
+        self._prepare_refit()
+        self.refit()
+        self.reset_quality()
+
+    def _number_breadth_first(self):
+        """ Renumber the nodes level by level from the root, so that each
+        tree level is a range of nodes and the children of a level's
+        internal nodes are, in pairs and in the same order, the next
+        level.
+        """
+        levels = []
+        level = np.zeros(1, dtype=np.int64)
+        while len(level) != 0:
+            levels.append(level)
+            level = self.node_children[level[~self.is_leaf(level)]].ravel()
+        order = np.concatenate(levels)
+        new_index = np.empty(len(order), dtype=np.int64)
+        new_index[order] = np.arange(len(order))
+
+        children = self.node_children[order]
+        internal = children[:, 0] != -1
+        children[internal] = new_index[children[internal]]
+        self.node_children = children
+        self.node_starts = self.node_starts[order]
+        self.node_counts = self.node_counts[order]
+
+    def _prepare_refit(self):
+        """ Work out once what refit needs: the vertices of each leaf's
+        faces, and the internal nodes of each tree level with the range
+        of their children.
+        """
+        is_leaf = self.is_leaf(slice(None))
+        self._leaves = np.flatnonzero(is_leaf)
+        self._leaf_verts = None
+        if len(self.face_order) != 0:
+            # (leaves, 3 * faces per leaf) vertices, padded with the
+            # leaf's first vertex
+            counts = self.node_counts[self._leaves] * 3
+            leaf_verts = self.arrays.face_verts[
+                self.leaf_faces(self._leaves)].ravel()
+            verts = np.repeat(leaf_verts[np.cumsum(counts) - counts,
+                                         np.newaxis],
+                              counts.max(), axis=1)
+            verts[np.repeat(np.arange(len(counts)), counts),
+                  _expand_ranges(np.zeros(len(counts), dtype=np.int64),
+                                 counts)] = leaf_verts
+
+            # Keep each vertex once per leaf
+            verts.sort(axis=1)
+            is_new = np.ones(verts.shape, dtype=bool)
+            is_new[:, 1:] = verts[:, 1:] != verts[:, :-1]
+            columns = np.cumsum(is_new, axis=1) - 1
+            unique = np.repeat(verts[:, :1], columns[:, -1].max() + 1,
+                               axis=1)
+            unique[np.nonzero(is_new)[0], columns[is_new]] = verts[is_new]
+            self._leaf_verts = np.ascontiguousarray(unique.T, dtype=np.intp)
+
+        self._levels = []
+        start = 0
+        stop = 1
+        while stop != start:
+            nodes = start + np.flatnonzero(~is_leaf[start:stop])
+            self._levels.append((nodes, stop, stop + 2 * len(nodes)))
+            start, stop = stop, stop + 2 * len(nodes)
+
+        # For refit_faces: the leaf of every face, the parent of every
+        # node and the first node of every level, followed by the
+        # number of nodes
+        self._face_leaves = np.full(len(self.arrays.face_verts), -1,
+                                    dtype=np.int64)
+        self._face_leaves[self.leaf_faces(self._leaves)] = np.repeat(
+            self._leaves, self.node_counts[self._leaves])
+        self._parents = np.full(len(self), -1, dtype=np.int64)
+        internal = np.flatnonzero(~is_leaf)
+        self._parents[self.node_children[internal].ravel()] = np.repeat(
+            internal, 2)
+        self._level_starts = np.array(
+            [0] + [start for nodes, start, stop in self._levels],
+            dtype=np.int64)
+
+    @classmethod
+    def build(cls, arrays, leaf_size=4, builder='MEDIAN'):
+        """ Build a BVH over all faces of arrays with at most leaf_size
+        faces per leaf. builder is one of bvh_builders.BUILDERS:
+        'MEDIAN', 'LBVH' (fastest to build) or 'SAH' (fastest to query).
+        """
+        if builder not in BUILDERS:
+            raise ValueError("builder must be one of %s"
+                             % ", ".join(sorted(BUILDERS)))
+        face_min, face_max = arrays.face_bounds()
+        children, starts, counts, face_order = BUILDERS[builder](
+            face_min, face_max, leaf_size)
+        return cls(arrays, children, starts, counts, face_order)
+
+    @classmethod
+    def from_aabb_tree(cls, tree, arrays):
+        """ Flatten an AABBTree over the faces of arrays, keeping its
+        structure (one face per leaf).
+        """
+        children = []
+        leaf_faces = []
+        leaf_nodes = []
+        stack = [(tree._tree, -1, 0)]
+        while len(stack) != 0:
+            node, parent, side = stack.pop()
+            node_idx = len(children)
+            if parent != -1:
+                children[parent][side] = node_idx
+            children.append([-1, -1])
+            if node.is_leaf():
+                leaf_faces.append(node.leaf)
+                leaf_nodes.append(node_idx)
+            else:
+                stack.append((node.right_node, node_idx, 1))
+                stack.append((node.left_node, node_idx, 0))
+        starts = np.zeros(len(children), dtype=np.int64)
+        counts = np.zeros(len(children), dtype=np.int64)
+        starts[leaf_nodes] = np.arange(len(leaf_nodes))
+        counts[leaf_nodes] = 1
+        return cls(arrays, children, starts, counts,
+                   arrays.face_rows(leaf_faces))
+
+    def __len__(self):
+        return len(self.node_counts)
+
+    def is_leaf(self, nodes):
+        return self.node_children[nodes, 0] == -1
+
+    def refit(self):
+        """ Recompute every box from the current vertex positions.
+
+        The leaf boxes are taken straight from the vertices of their
+        faces, then the internal nodes are reduced one tree level at a
+        time, deepest first, each level in one vectorized step.
+        """
+        if self._leaf_verts is not None:
+            # Gathering float32 coordinates touches half the memory. The
+            # boxes are widened by one float32 step, so they still hold
+            # their faces.
+            coords = np.ascontiguousarray(self.arrays.vert_pos.T,
+                                          dtype=np.float32)
+            num_leaves = len(self._leaves)
+            leaf_min = np.empty((3, num_leaves), dtype=np.float32)
+            leaf_max = np.empty((3, num_leaves), dtype=np.float32)
+            vert_coords = np.empty(num_leaves, dtype=np.float32)
+            for axis in range(0, 3):
+                lo = leaf_min[axis]
+                hi = leaf_max[axis]
+                np.take(coords[axis], self._leaf_verts[0], out=lo)
+                hi[:] = lo
+                for verts in self._leaf_verts[1:]:
+                    np.take(coords[axis], verts, out=vert_coords)
+                    np.minimum(lo, vert_coords, out=lo)
+                    np.maximum(hi, vert_coords, out=hi)
+            self.node_min[self._leaves] = np.nextafter(leaf_min, -np.inf).T
+            self.node_max[self._leaves] = np.nextafter(leaf_max, np.inf).T
+
+        node_min = self.node_min
+        node_max = self.node_max
+        for nodes, start, stop in reversed(self._levels):
+            node_min[nodes] = np.minimum(node_min[start:stop:2],
+                                         node_min[start + 1:stop:2])
+            node_max[nodes] = np.maximum(node_max[start:stop:2],
+                                         node_max[start + 1:stop:2])
+
+    def refit_faces(self, face_rows):
+        """ Recompute the boxes of the leaves holding the faces face_rows,
+        and of their ancestors, from the current vertex positions.
+        Returns the number of nodes refitted.
+
+        The changed nodes are carried up one tree level at a time, each
+        level in one vectorized step, so the cost follows the number of
+        moved faces rather than the size of the mesh.
+        """
+        if len(face_rows) == 0:
+            return 0
+        leaves = np.unique(self._face_leaves[face_rows])
+        counts = self.node_counts[leaves]
+        corners = self.arrays.vert_pos[
+            self.arrays.face_verts[self.leaf_faces(leaves)]]
+        firsts = np.cumsum(counts) - counts
+        self.node_min[leaves] = np.minimum.reduceat(corners.min(axis=1),
+                                                    firsts, axis=0)
+        self.node_max[leaves] = np.maximum.reduceat(corners.max(axis=1),
+                                                    firsts, axis=0)
+
+        # Leaves are sorted, and level i is the range of nodes
+        # _level_starts[i] .. _level_starts[i + 1]
+        leaf_bounds = np.searchsorted(leaves, self._level_starts)
+        num_refitted = len(leaves)
+        changed = np.zeros(0, dtype=np.int64)
+        for level in range(len(self._level_starts) - 2, 0, -1):
+            changed = np.concatenate(
+                (changed,
+                 leaves[leaf_bounds[level]:leaf_bounds[level + 1]]))
+            if len(changed) == 0:
+                continue
+            nodes = np.unique(self._parents[changed])
+            children = self.node_children[nodes]
+            self.node_min[nodes] = np.minimum(self.node_min[children[:, 0]],
+                                              self.node_min[children[:, 1]])
+            self.node_max[nodes] = np.maximum(self.node_max[children[:, 0]],
+                                              self.node_max[children[:, 1]])
+            num_refitted += len(nodes)
+            changed = nodes
+        return num_refitted
+
+    def cost(self):
+        """ Return the summed surface area of all node boxes relative to
+        the root's: the expected number of nodes a random query visits.
+        Refitting after the vertices moved makes sibling boxes overlap
+        more, and this grows.
+        """
+        root_area = _half_area(self.node_min[:1], self.node_max[:1])[0]
+        if root_area <= 0:
+            return 1.0
+        return _half_area(self.node_min, self.node_max).sum() / root_area
+
+    def reset_quality(self):
+        """ Take the current cost as the baseline for degradation.
+        """
+        self.built_cost = self.cost()
+
+    def degradation(self):
+        """ Return how many times costlier the tree is than its baseline
+        (after it was built).
+        """
+        return self.cost() / self.built_cost
+
+    def update_bbs(self):
+        """ Same as refit, for AABBTree compatibility.
+        """
+        self.refit()
+
+    def leaf_faces(self, leaves):
+        """ Return the face rows of all faces in the given leaves.
+        """
+        return self.face_order[_expand_ranges(self.node_starts[leaves],
+                                              self.node_counts[leaves])]
+
+    def crossing_plane_rows(self, orientation, position):
+        """ Return the rows of the faces whose boxes touch the orthogonal
+        plane at position along axis orientation.
+        """
+        frontier = np.zeros(1, dtype=np.int64)
+        leaves = []
+        while len(frontier) != 0:
+            self.nodes_visited += len(frontier)
+            frontier = frontier[
+                (self.node_min[frontier, orientation] <= position) &
+                (self.node_max[frontier, orientation] >= position)]
+            is_leaf = self.is_leaf(frontier)
+            leaves.append(frontier[is_leaf])
+            frontier = self.node_children[frontier[~is_leaf]].ravel()
+        rows = self.leaf_faces(np.concatenate(leaves))
+        face_min, face_max = self.arrays.face_bounds()
+        return rows[(face_min[rows, orientation] <= position) &
+                    (face_max[rows, orientation] >= position)]
+
+    def crossing_oblique_plane_rows(self, normal, offset):
+        """ Return the rows of the faces whose boxes touch the plane of
+        points x with dot(normal, x) == offset.
+        """
+        normal = np.asarray(normal, dtype=np.float64)
+        frontier = np.zeros(1, dtype=np.int64)
+        leaves = []
+        while len(frontier) != 0:
+            self.nodes_visited += len(frontier)
+            frontier = frontier[_boxes_touch_plane(self.node_min[frontier],
+                                                   self.node_max[frontier],
+                                                   normal, offset)]
+            is_leaf = self.is_leaf(frontier)
+            leaves.append(frontier[is_leaf])
+            frontier = self.node_children[frontier[~is_leaf]].ravel()
+        rows = self.leaf_faces(np.concatenate(leaves))
+        face_min, face_max = self.arrays.face_bounds()
+        return rows[_boxes_touch_plane(face_min[rows], face_max[rows],
+                                       normal, offset)]
+
+    def collides_with_orthogonal_plane(self, orientation, position):
+        """ Return the faces whose boxes touch the orthogonal plane at
+        position along axis orientation, as AABBTree does.
+        """
+        faces = self.arrays.faces
+        return [faces[row] for row in
+                self.crossing_plane_rows(orientation, position).tolist()]
+
+    def collides_with(self, other_face):
+        """ Return whether the box of other_face touches any face box.
+        """
+        pt_min = np.asarray(other_face.min)
+        pt_max = np.asarray(other_face.max)
+        frontier = np.zeros(1, dtype=np.int64)
+        while len(frontier) != 0:
+            self.nodes_visited += len(frontier)
+            frontier = frontier[
+                np.all((self.node_min[frontier] <= pt_max) &
+                       (self.node_max[frontier] >= pt_min), axis=1)]
+            is_leaf = self.is_leaf(frontier)
+            if np.any(is_leaf):
+                return True
+            frontier = self.node_children[frontier].ravel()
+        return False
+
+    def collide_rows(self, other):
+        """ Return two arrays (rows, other_rows) of the face rows of the
+        pairs of faces, one from each BVH, whose boxes overlap.
+        """
+        pairs_a = np.zeros(1, dtype=np.int64)
+        pairs_b = np.zeros(1, dtype=np.int64)
+        leaf_a = []
+        leaf_b = []
+        while len(pairs_a) != 0:
+            self.nodes_visited += len(pairs_a)
+            overlap = np.all((self.node_min[pairs_a] <=
+                              other.node_max[pairs_b]) &
+                             (self.node_max[pairs_a] >=
+                              other.node_min[pairs_b]), axis=1)
+            pairs_a = pairs_a[overlap]
+            pairs_b = pairs_b[overlap]
+            a_leaf = self.is_leaf(pairs_a)
+            b_leaf = other.is_leaf(pairs_b)
+            done = a_leaf & b_leaf
+            leaf_a.append(pairs_a[done])
+            leaf_b.append(pairs_b[done])
+
+            # Descend into the internal side, or both if both are
+            split_a = ~a_leaf & b_leaf
+            split_b = a_leaf & ~b_leaf
+            split_both = ~a_leaf & ~b_leaf
+            both_a = self.node_children[pairs_a[split_both]]
+            both_b = other.node_children[pairs_b[split_both]]
+            pairs_a = np.concatenate((
+                self.node_children[pairs_a[split_a]].ravel(),
+                np.repeat(pairs_a[split_b], 2),
+                np.repeat(both_a, 2, axis=1).ravel()))
+            pairs_b = np.concatenate((
+                np.repeat(pairs_b[split_a], 2),
+                other.node_children[pairs_b[split_b]].ravel(),
+                np.tile(both_b, (1, 2)).ravel()))
+
+        leaf_a = np.concatenate(leaf_a)
+        leaf_b = np.concatenate(leaf_b)
+        # Every face of one leaf against every face of the other
+        counts_a = self.node_counts[leaf_a]
+        counts_b = other.node_counts[leaf_b]
+        num_pairs = counts_a * counts_b
+        pair = np.repeat(np.arange(len(leaf_a)), num_pairs)
+        k = np.arange(num_pairs.sum()) - np.repeat(
+            np.cumsum(num_pairs) - num_pairs, num_pairs)
+        rows = self.face_order[self.node_starts[leaf_a][pair] +
+                               k // counts_b[pair]]
+        other_rows = other.face_order[other.node_starts[leaf_b][pair] +
+                                      k % counts_b[pair]]
+
+        face_min, face_max = self.arrays.face_bounds()
+        other_min, other_max = other.arrays.face_bounds()
+        overlap = np.all((face_min[rows] <= other_max[other_rows]) &
+                         (face_max[rows] >= other_min[other_rows]), axis=1)
+        return rows[overlap], other_rows[overlap]
+
+    def collides_with_tree(self, other):
+        """ Return a list of pairs of faces whose boxes overlap, as
+        AABBTree does.
+        """
+        if not isinstance(other, FlatBVH):
+            raise TypeError("Can only collide with other FlatBVH's")
+        rows, other_rows = self.collide_rows(other)
+        faces = self.arrays.faces
+        other_faces = other.arrays.faces
+        return [(faces[row], other_faces[other_row])
+                for row, other_row in zip(rows.tolist(),
+                                          other_rows.tolist())]
+
+def _boxes_touch_plane(box_min, box_max, normal, offset):
+    """ Whether each box touches the plane dot(normal, x) == offset, ie.
+    its centre is no further from the plane than its extent along normal.
+    """
+    box_min = box_min.astype(np.float64)
+    box_max = box_max.astype(np.float64)
+    abs_normal = np.abs(normal)
+    distance = np.abs((box_min + box_max).dot(normal) - 2 * offset)
+    extent = (box_max - box_min).dot(abs_normal)
+    # Allow for rounding, so that boxes with a corner on the plane
+    # are kept
+    slack = 1e-9 * ((np.abs(box_min) + np.abs(box_max)).dot(abs_normal) +
+                    2 * abs(offset))
+    return distance <= extent + slack
+
+def _half_area(box_min, box_max):
+    """ Half the surface area of each box. """
+    d = box_max - box_min
+    return d[:, 0] * d[:, 1] + d[:, 1] * d[:, 2] + d[:, 2] * d[:, 0]
+
+def _expand_ranges(starts, counts):
+    """ Return the concatenation of the ranges
+    starts[i] .. starts[i] + counts[i].
+    """
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return offsets + np.arange(counts.sum())
@@ -1,6 +1,8 @@
 from copy import deepcopy
 from time import time
 
+import numpy as np
+
 # mathutils is a blender package... This should maybe be moved
 from mathutils.geometry import intersect_ray_tri
 from mathutils.geometry import intersect_line_plane
@@ -10,12 +12,27 @@ from .quad_edge_mesh.quad_edge_mesh import QEMesh
 from .quad_edge_mesh.aabb_tree import AABBTree
 
 from .slice_plane import SlicePlane
+from .mesh_arrays import QEMeshArrays
+from .edge_interval_index import EdgeIntervalIndex
+from .flat_bvh import FlatBVH
+from .aabb_pairs import AABBPairCollector, iter_colliding_pairs
+from .plane_sweep import PlaneSweep
+from .triangle_intersection import intersect_segments_triangles
+from .polylines import Polylines
+from .plane import Plane
 
 class Intersector (object):
     show_timing_msgs = False
+    # Number of (edge, face) pairs tested at once in batched mode
+    batch_size = 65536
     
-    def __init__(self):
+    def __init__(self, crossing_cache=None):
+        """ crossing_cache is an optional CrossingCache, which lets plane
+        crossings carry over between calls.
+        """
         self._saved_results = {}
+        self.crossing_cache = crossing_cache
+        self._pair_collector = AABBPairCollector()
 
     def clear_saved_results(self):
         self._saved_results = {}
@@ -23,16 +40,24 @@ class Intersector (object):
     def compute_intersection_with_plane(self, mesh, tree, plane):
         """ Compute the intersection with a plane.
         Hopefully this optimization will speed things up dramatically.
-        mesh is a QEMesh, tree is an AABBTree
+        mesh is a QEMesh, tree is an AABBTree, a FlatBVH or an
+        EdgeIntervalIndex
         plane is a slice_plane
         """
         if not isinstance(mesh, QEMesh):
             raise TypeError("mesh must be of type QEMesh!")
-        if not isinstance(tree, AABBTree):
-            raise TypeError("tree must be of type AABBTree!")
+        if not isinstance(tree, (AABBTree, FlatBVH, EdgeIntervalIndex)):
+            raise TypeError("tree must be of type AABBTree, FlatBVH or "
+                            "EdgeIntervalIndex!")
         if not isinstance(plane, SlicePlane):
             raise TypeError("plane must be of type SlicePlane!")
 
+        if isinstance(tree, EdgeIntervalIndex):
+            return self._compute_intersection_with_plane_index(tree, plane)
+
+        # Results are only valid for the plane they were computed with
+        self.clear_saved_results()
+
         if Intersector.show_timing_msgs:
             print("    AABB Tree checking (with plane)")
             start = time()
@@ -66,10 +91,251 @@ class Intersector (object):
         
         return ix_contours
     
+    def compute_intersection_with_plane_arrays(self, arrays, plane):
+        """ Compute the intersection with a plane using the vectorized engine.
+        arrays is a QEMeshArrays, plane is a slice_plane.
+
+        Instead of visiting faces one by one, every edge is tested against
+        the plane and interpolated in one batched pass over the arrays.
+        Returns the same contour structure as compute_intersection_with_plane.
+        """
+        if not isinstance(arrays, QEMeshArrays):
+            raise TypeError("arrays must be of type QEMeshArrays!")
+        if not isinstance(plane, SlicePlane):
+            raise TypeError("plane must be of type SlicePlane!")
+
+        self.clear_saved_results()
+
+        if Intersector.show_timing_msgs:
+            print("    Vectorized search for intersection (with plane)")
+            start = time()
+        orientation = plane.orientation.__index__()
+        pos_vec = plane.get_location()
+        position = pos_vec[plane.orientation]
+        edge_rows, points = self._get_plane_crossings(
+            arrays, plane, orientation, position,
+            lambda: arrays.crossing_edges(orientation, position))
+        ix_points = self._create_plane_intersection_points(arrays,
+                                                           edge_rows,
+                                                           points)
+        if Intersector.show_timing_msgs:
+            seconds = time() - start
+            print("    Took %1.5f seconds" % seconds)
+
+        if Intersector.show_timing_msgs:
+            print("    Constructing contour")
+            start = time()
+        ix_contours = self._create_intersection_contours(ix_points)
+        if Intersector.show_timing_msgs:
+            seconds = time() - start
+            print("    Took %1.5f seconds" % seconds)
+
+        return ix_contours
+
+    def _compute_intersection_with_plane_index(self, index, plane):
+        """ Compute the intersection with a plane, querying the crossing
+        edges directly from an EdgeIntervalIndex.
+        """
+        self.clear_saved_results()
+
+        if Intersector.show_timing_msgs:
+            print("    Edge index query (with plane)")
+            start = time()
+        orientation = plane.orientation.__index__()
+        pos_vec = plane.get_location()
+        position = pos_vec[plane.orientation]
+        edge_rows, points = self._get_plane_crossings(
+            index.arrays, plane, orientation, position,
+            lambda: index.crossing_edges(orientation, position))
+        ix_points = self._create_plane_intersection_points(index.arrays,
+                                                           edge_rows,
+                                                           points)
+        if Intersector.show_timing_msgs:
+            seconds = time() - start
+            print("    Took %1.5f seconds" % seconds)
+
+        if Intersector.show_timing_msgs:
+            print("    Constructing contour")
+            start = time()
+        ix_contours = self._create_intersection_contours(ix_points)
+        if Intersector.show_timing_msgs:
+            seconds = time() - start
+            print("    Took %1.5f seconds" % seconds)
+
+        return ix_contours
+
+    def compute_intersection_with_plane_sweep(self, sweep, plane):
+        """ Compute the intersection with a plane by moving a PlaneSweep
+        to the plane's position. sweep is a PlaneSweep along the plane's
+        orientation, plane is a slice_plane.
+
+        Only edges between the old and new plane positions are revisited,
+        and only the contours they touch are stitched again.
+        Returns the same contour structure as compute_intersection_with_plane.
+        """
+        if not isinstance(sweep, PlaneSweep):
+            raise TypeError("sweep must be of type PlaneSweep!")
+        if not isinstance(plane, SlicePlane):
+            raise TypeError("plane must be of type SlicePlane!")
+        orientation = plane.orientation.__index__()
+        if sweep.orientation != orientation:
+            raise ValueError("sweep and plane orientations differ!")
+
+        if Intersector.show_timing_msgs:
+            print("    Sweeping to plane")
+            start = time()
+        pos_vec = plane.get_location()
+        position = pos_vec[plane.orientation]
+        initial_edges = None
+        if sweep.position is None and self.crossing_cache is not None:
+            cached = self.crossing_cache.get(sweep.arrays, orientation,
+                                             plane.get_slice_index(pos_vec),
+                                             position)
+            if cached is not None:
+                initial_edges = cached[0].tolist()
+        chains = sweep.move_to(position, initial_edges)
+        if Intersector.show_timing_msgs:
+            seconds = time() - start
+            print("    Took %1.5f seconds" % seconds)
+
+        if Intersector.show_timing_msgs:
+            print("    Constructing contour")
+            start = time()
+        edge_rows = np.array([edge for edges, is_closed in chains
+                              for edge in edges], dtype=np.int64)
+        points = sweep.arrays.crossing_points(edge_rows, orientation, position)
+        if self.crossing_cache is not None:
+            self.crossing_cache.put(sweep.arrays, orientation,
+                                    plane.get_slice_index(pos_vec), position,
+                                    edge_rows, points)
+        points = iter(points.tolist())
+        ix_contours = []
+        for edges, is_closed in chains:
+            contour = [IntersectionPoint(sweep.arrays.edges[edge], None,
+                                         Vector(next(points)))
+                       for edge in edges]
+            if is_closed:
+                contour.append(contour[0])
+            ix_contours.append(contour)
+        if Intersector.show_timing_msgs:
+            seconds = time() - start
+            print("    Took %1.5f seconds" % seconds)
+
+        return ix_contours
+
+    def sweep_slices(self, arrays, orientation, positions):
+        """ Compute the contours of arrays on the orthogonal planes at every
+        one of positions along axis orientation, in a single sweep.
+
+        Edges are sorted along the axis once. The planes are then visited
+        in increasing position, adding the edges the sweep has reached and
+        dropping those it has passed, so the total work is proportional to
+        the number of edges plus the size of the output.
+
+        This is a generator, yielding (index into positions, Polylines)
+        for each plane as soon as it is done.
+        """
+        if not isinstance(arrays, QEMeshArrays):
+            raise TypeError("arrays must be of type QEMeshArrays!")
+
+        coords = arrays.vert_pos[arrays.edge_verts, orientation]
+        lo = coords.min(axis=1)
+        hi = coords.max(axis=1)
+        lo_order = np.argsort(lo, kind='mergesort')
+        sorted_lo = lo[lo_order]
+
+        active = np.zeros(0, dtype=np.int64)
+        num_entered = 0
+        for idx in np.argsort(positions, kind='mergesort').tolist():
+            position = positions[idx]
+            # Edges with lo < position have been reached by the sweep
+            entered = np.searchsorted(sorted_lo, position, 'left')
+            active = np.concatenate((active,
+                                     lo_order[num_entered:entered]))
+            num_entered = entered
+            # and cross the plane until it passes their hi
+            active = active[hi[active] >= position]
+
+            points = arrays.crossing_points(active, orientation, position)
+            yield idx, Polylines.from_chains(points, arrays.chain_edges(active))
+
+    def compute_intersection_with_analytic_plane(self, arrays, plane,
+                                                 tree=None):
+        """ Compute the intersection with a Plane of any orientation.
+        arrays is a QEMeshArrays, tree an optional FlatBVH or AABBTree over
+        it which narrows the search down to the faces whose boxes touch
+        the plane.
+
+        Returns a Polylines.
+        """
+        if not isinstance(arrays, QEMeshArrays):
+            raise TypeError("arrays must be of type QEMeshArrays!")
+        if not isinstance(plane, Plane):
+            raise TypeError("plane must be of type Plane!")
+        if tree is not None and not isinstance(tree, (FlatBVH, AABBTree)):
+            raise TypeError("tree must be of type FlatBVH or AABBTree!")
+
+        if Intersector.show_timing_msgs:
+            print("    Vectorized search for intersection (with analytic "
+                  "plane)")
+            start = time()
+        normal = plane.normal
+        offset = plane.offset
+        if tree is None:
+            edge_rows = None
+        else:
+            if isinstance(tree, FlatBVH):
+                face_rows = tree.crossing_oblique_plane_rows(normal, offset)
+            else:
+                face_rows = arrays.face_rows(
+                    self._collide_aabb_tree_with_plane(tree, normal, offset))
+            edge_rows = np.unique(arrays.face_edges[face_rows])
+        edge_rows = arrays.crossing_edges_oblique(normal, offset, edge_rows)
+        points = arrays.crossing_points_oblique(edge_rows, normal, offset)
+        if plane.axis is not None:
+            points[:, plane.axis] = plane.point[plane.axis]
+        polylines = Polylines.from_chains(points, arrays.chain_edges(edge_rows))
+        if Intersector.show_timing_msgs:
+            seconds = time() - start
+            print("    Took %1.5f seconds" % seconds)
+
+        return polylines
+
+    def _collide_aabb_tree_with_plane(self, tree, normal, offset):
+        """ Return the faces of an AABBTree whose boxes touch the plane
+        dot(normal, x) == offset, by the test of FlatBVH's oblique query.
+        """
+        n0, n1, n2 = [float(n) for n in normal]
+        a0, a1, a2 = abs(n0), abs(n1), abs(n2)
+        twice_offset = 2 * offset
+        faces = []
+        stack = [tree._tree]
+        while len(stack) != 0:
+            node = stack.pop()
+            lo = node.min_pt
+            hi = node.max_pt
+            distance = abs(n0 * (lo[0] + hi[0]) + n1 * (lo[1] + hi[1]) +
+                           n2 * (lo[2] + hi[2]) - twice_offset)
+            extent = (a0 * (hi[0] - lo[0]) + a1 * (hi[1] - lo[1]) +
+                      a2 * (hi[2] - lo[2]))
+            # Allow for rounding, see flat_bvh._boxes_touch_plane
+            slack = 1e-9 * (a0 * (abs(lo[0]) + abs(hi[0])) +
+                            a1 * (abs(lo[1]) + abs(hi[1])) +
+                            a2 * (abs(lo[2]) + abs(hi[2])) +
+                            abs(twice_offset))
+            if distance > extent + slack:
+                continue
+            if node.left_node is None:
+                faces.append(node.leaf)
+            else:
+                stack.append(node.right_node)
+                stack.append(node.left_node)
+        return faces
+
     def compute_intersection_contour(self, mesh1, mesh2, tree1, tree2):
         """ Compute the intersection contour of mesh1 and mesh2.
         mesh1, mesh2 must be of type QEMesh.
-        tree1, tree2 must be of type AABBTree.
+        tree1, tree2 must both be AABBTrees or both FlatBVHs.
         """
         self.clear_saved_results()
 
@@ -77,35 +343,90 @@ class Intersector (object):
             raise TypeError("mesh1 must be of type QEMesh!")
         if not isinstance(mesh2, QEMesh):
             raise TypeError("mesh2 must be of type QEMesh!")
-        if not isinstance(tree1, AABBTree):
-            raise TypeError("tree1 must be of type AABBTree!")
-        if not isinstance(tree2, AABBTree):
-            raise TypeError("tree2 must be of type AABBTree!")
+        if not isinstance(tree1, (AABBTree, FlatBVH)):
+            raise TypeError("tree1 must be of type AABBTree or FlatBVH!")
+        if type(tree2) is not type(tree1):
+            raise TypeError("tree2 must be of the same type as tree1!")
+
+        if Intersector.show_timing_msgs:
+            print("    AABB Tree collision and deep search for intersections")
+            start = time()
+        if isinstance(tree1, FlatBVH):
+            pairs = tree1.collides_with_tree(tree2)
+        else:
+            # Stream the pairs, they are only needed once
+            pairs = iter_colliding_pairs(tree1, tree2)
+        ix_points = []
+        for face1, face2 in pairs:
+            new_ixpoints = self._intersect_faces(face1, face2)
+            ix_points.extend(new_ixpoints)
+        if Intersector.show_timing_msgs:
+            seconds = time() - start
+            print("    Took %1.5f seconds" % seconds)
+
+        if Intersector.show_timing_msgs:
+            print("found %d ixpoints" % len(self._saved_results))
+            print("    Constructing contour")
+            start = time()
+        ix_contours = self._create_intersection_contours(ix_points)
+        if Intersector.show_timing_msgs:
+            seconds = time() - start
+            print("    Took %1.5f seconds" % seconds)
+
+        return ix_contours
+
+    def compute_intersection_contour_batched(self, arrays1, arrays2,
+                                             tree1, tree2):
+        """ Compute the intersection contour of two meshes, testing all
+        candidate face pairs in vectorized batches.
+        arrays1, arrays2 must be of type QEMeshArrays.
+        tree1, tree2 must both be AABBTrees or both FlatBVHs.
+
+        Returns the same contour structure as compute_intersection_contour.
+        """
+        self.clear_saved_results()
+
+        if not isinstance(arrays1, QEMeshArrays):
+            raise TypeError("arrays1 must be of type QEMeshArrays!")
+        if not isinstance(arrays2, QEMeshArrays):
+            raise TypeError("arrays2 must be of type QEMeshArrays!")
+        if not isinstance(tree1, (AABBTree, FlatBVH)):
+            raise TypeError("tree1 must be of type AABBTree or FlatBVH!")
+        if type(tree2) is not type(tree1):
+            raise TypeError("tree2 must be of the same type as tree1!")
 
         if Intersector.show_timing_msgs:
             print("    AABB Tree collision")
             start = time()
-        pairs = tree1.collides_with_tree(tree2)
+        if isinstance(tree1, FlatBVH):
+            face_rows1, face_rows2 = tree1.collide_rows(tree2)
+        else:
+            self._pair_collector.collect(tree1, tree2)
+            face_rows1, face_rows2 = self._pair_collector.rows(arrays1,
+                                                               arrays2)
+            self._pair_collector.clear()
         if Intersector.show_timing_msgs:
             seconds = time() - start
             print("    Took %1.5f seconds" % seconds)
 
         if Intersector.show_timing_msgs:
-            print("Searching %d pairs" % len(pairs))
+            print("Searching %d pairs" % len(face_rows1))
 
         if Intersector.show_timing_msgs:
-            print("    Deep search for intersections")
+            print("    Batched search for intersections")
             start = time()
-        ix_points = []
-        for pair in pairs:
-            new_ixpoints = self._intersect_faces(pair[0], pair[1])
-            ix_points.extend(new_ixpoints)
+        ix_points = self._intersect_edges_faces_batched(arrays1, arrays2,
+                                                        face_rows1,
+                                                        face_rows2)
+        ix_points.extend(self._intersect_edges_faces_batched(arrays2, arrays1,
+                                                             face_rows2,
+                                                             face_rows1))
         if Intersector.show_timing_msgs:
             seconds = time() - start
             print("    Took %1.5f seconds" % seconds)
 
         if Intersector.show_timing_msgs:
-            print("found %d ixpoints" % len(self._saved_results))
+            print("found %d ixpoints" % len(ix_points))
             print("    Constructing contour")
             start = time()
         ix_contours = self._create_intersection_contours(ix_points)
@@ -121,114 +442,79 @@ class Intersector (object):
 
         Closed contours will have the same start and end points.
         Open contours are also possible.
+
+        The neighbours of every IntersectionPoint are found first, then
+        each contour is walked once, so this is linear in len(ix_points).
         """
+        neighbours = self._get_ix_point_neighbours(ix_points)
+        visited = [False] * len(ix_points)
+
         contours = []
-        while len(ix_points) != 0:
-            contour = self._get_one_contour(ix_points)
-            contours.append(contour)
+        # Walk open contours from one of their ends, so that they
+        # come out in one piece
+        for idx in range(0, len(ix_points)):
+            if not visited[idx] and len(neighbours[idx]) < 2:
+                contours.append(self._get_one_contour(ix_points, neighbours,
+                                                      visited, idx))
+        # Everything left over lies on closed contours
+        for idx in range(0, len(ix_points)):
+            if not visited[idx]:
+                contours.append(self._get_one_contour(ix_points, neighbours,
+                                                      visited, idx))
 
         return contours
-            
-    def _get_one_contour(self, ix_points):
-        """ From a list of IntersectionPoints, construct a contour
-        by walking around. Removes IntersectionPoints from ix_points.
+
+    def _get_ix_point_neighbours(self, ix_points):
+        """ Return, for each IntersectionPoint, a list of the indices of
+        its neighbouring IntersectionPoints.
+
+        An IntersectionPoint on edge e and face F lies on the intersection
+        of F with each face T next to e (F is None when intersecting a
+        plane). The intersection of T and F is a segment, so the two
+        points it holds are neighbours.
+        """
+        neighbours = [[] for ixp in ix_points]
+        segments = {}
+        for idx, ixp in enumerate(ix_points):
+            for face in (ixp.edge.l_face, ixp.edge.r_face):
+                if face is None:
+                    continue
+                key = frozenset((face, ixp.face))
+                if key in segments:
+                    other = segments.pop(key)
+                    if other not in neighbours[idx]:
+                        neighbours[idx].append(other)
+                        neighbours[other].append(idx)
+                else:
+                    segments[key] = idx
+
+        return neighbours
+
+    def _get_one_contour(self, ix_points, neighbours, visited, first_idx):
+        """ Construct a contour by walking the neighbours of
+        ix_points[first_idx] until no unvisited neighbour is left.
+        Marks the walked IntersectionPoints as visited.
         Returns a list of IntersectionPoints representing the contour.
 
         A closed contour's first and last points are the same.
         """
-        if len(ix_points) == 0:
-            return None
-
-        # A break condition if contour isn't closed
-        contour_is_open = False
-        first_ixp = ixp = ix_points[0]
-        next_ixp = None
-        contour = [ixp]
-        prev_face = ixp.edge.r_face
-        while next_ixp is not contour[0]:
-            next_ixp = None
-            # First search this edge's-face's edges for intersection with ixp.face
-            if ixp.edge.r_face is prev_face:
-                this_edges_face = ixp.edge.l_face
-            else:
-                this_edges_face = ixp.edge.r_face
-
-            if this_edges_face is None:
-                # We seem to have found the edge of a mesh. Continue from first ixp in
-                # in opposite direction unless we already did once
-                if contour_is_open:
-                    # We already found one end of this open contour.
-                    # Now we've found the other so we're done
-                    break
-                next_ixp = first_ixp
-                contour.reverse()
-                prev_face = first_ixp.edge.l_face
-                ixp = next_ixp
-                ix_points.remove(ixp)
-                contour_is_open = True
-                continue
-
-            ### DEBUG
-            # if ixp.edge not in this_edges_face.edges:
-            #     print("type(ixp.edge): " + type(ixp.edge))
-            #     print("type(face_edges): " + type(this_edges_face.edges[0]))
-            #     raise ValueError("Edges aren't of same type")
-            ### /DEBUG
-            
-            for cand_edge in this_edges_face.edges:
-                if cand_edge is ixp.edge:
-                    continue
-                # if this candidate-edge crosses this intersection point's face,
-                # it's x-point is the next point
-                if (cand_edge, ixp.face) in self._saved_results:
-                    next_ixp = self._saved_results[(cand_edge, ixp.face)]
-                    if next_ixp is None:
-                        continue
-                    prev_face = this_edges_face
+        visited[first_idx] = True
+        contour = [ix_points[first_idx]]
+        idx = first_idx
+        while True:
+            next_idx = None
+            for neighbour in neighbours[idx]:
+                if not visited[neighbour]:
+                    next_idx = neighbour
                     break
-            ### DEBUG
-            # if next_ixp is not None:
-            #     print("Next ixp_found in this_edges_face.edges!")
-            ### /DEBUG
-                
-            if next_ixp is None:
-                # We didn't find it so the next xpoint must be on other face
-                for cand_edge in ixp.face.edges:
-                    if (cand_edge, this_edges_face) in self._saved_results:
-                        next_ixp = self._saved_results[(cand_edge, this_edges_face)]
-                        if next_ixp is None:
-                            continue
-                        prev_face = ixp.face
-                        break
-            ### DEBUG    
-            # if next_ixp is not None:
-            #     print("nextixp found in other face's edges!")
-            ### /DEBUG
-
-            if next_ixp is None:
-                print("ix_points.len: %d" % len(ix_points))
-                print("contour.len  : %d" % len(contour))
-                raise ValueError ("couldn't find next intersection point")
-            
-            ixp = next_ixp
-            contour.append(ixp)
-            try:
-                ix_points.remove(ixp)
-            except ValueError:
-                # Might this error have something to do with arithmetic precision?
-                if False:
-                    print("Couldn't remove ixp from ix_points!")
-                    print("len(ix_points): " + str(len(ix_points)))
-
-                    for an_ixp in ix_points:
-                        print(str(an_ixp))
-                    if ixp is not None:
-                        print("The point in question...")
-                        print(str(ixp))
-                print("Warning! Caught exception, aborting intersection code")
-                ix_points.clear()
+            if next_idx is None:
                 break
-                
+            visited[next_idx] = True
+            contour.append(ix_points[next_idx])
+            idx = next_idx
+
+        if len(contour) > 2 and first_idx in neighbours[idx]:
+            contour.append(contour[0])
 
         return contour
         
@@ -274,11 +560,10 @@ class Intersector (object):
         if (edge, None) in self._saved_results:
             return self._saved_results[(edge, None)]
 
-        if (edge.t_vert.pos[orientation] > position and
-            edge.b_vert.pos[orientation] > position):
-            point = None
-        elif (edge.t_vert.pos[orientation] < position and
-              edge.b_vert.pos[orientation] < position):
+        # A point exactly on the plane counts as being above it, so that
+        # each face is crossed by either zero or two edges.
+        if ((edge.t_vert.pos[orientation] >= position) ==
+            (edge.b_vert.pos[orientation] >= position)):
             point = None
         else:
             vec_t_vert = Vector((edge.t_vert.pos))
@@ -314,6 +599,81 @@ class Intersector (object):
 
         return ix_point
     
+    def _get_plane_crossings(self, arrays, plane, orientation, position,
+                             find_edges):
+        """ Return (edge_rows, points) for the edges of arrays crossing
+        plane, and where they cross it.
+
+        Uses the crossing cache if there is one. Otherwise, or on a cache
+        miss, find_edges() is called to get the crossing edges.
+        """
+        if self.crossing_cache is not None:
+            slice_index = plane.get_slice_index(plane.get_location())
+            cached = self.crossing_cache.get(arrays, orientation,
+                                             slice_index, position)
+            if cached is not None:
+                return cached
+
+        edge_rows = find_edges()
+        points = arrays.crossing_points(edge_rows, orientation, position)
+        if self.crossing_cache is not None:
+            self.crossing_cache.put(arrays, orientation, slice_index,
+                                    position, edge_rows, points)
+
+        return edge_rows, points
+
+    def _create_plane_intersection_points(self, arrays, edge_rows, points):
+        """ Wrap the rows of edges crossing a plane, and their points, as
+        IntersectionPoints. Saves them so contours can be walked.
+        Return a list of IntersectionPoints.
+        """
+        ix_points = []
+        for row, point in zip(edge_rows.tolist(), points.tolist()):
+            edge = arrays.edges[row]
+            ix_point = IntersectionPoint(edge, None, Vector(point))
+            ix_points.append(ix_point)
+            self._saved_results[(edge, None)] = ix_point
+
+        return ix_points
+
+    def _intersect_edges_faces_batched(self, edge_arrays, face_arrays,
+                                       edge_face_rows, face_rows):
+        """ Intersect the edges of the faces edge_face_rows of edge_arrays
+        with the faces face_rows of face_arrays, pair by pair.
+        Each (edge, face) combination is only tested once.
+        Return a list of IntersectionPoints.
+        """
+        num_faces = len(face_arrays.faces)
+        edges = edge_arrays.face_edges[edge_face_rows].ravel()
+        faces = np.repeat(face_rows, 3)
+        keys = np.unique(edges.astype(np.int64) * num_faces + faces)
+        edges = keys // num_faces
+        faces = keys % num_faces
+
+        ix_points = []
+        for start in range(0, len(keys), Intersector.batch_size):
+            batch_edges = edges[start:start + Intersector.batch_size]
+            batch_faces = faces[start:start + Intersector.batch_size]
+            edge_verts = edge_arrays.edge_verts[batch_edges]
+            face_verts = face_arrays.face_verts[batch_faces]
+            hits, points = intersect_segments_triangles(
+                edge_arrays.vert_pos[edge_verts[:, 0]],
+                edge_arrays.vert_pos[edge_verts[:, 1]],
+                face_arrays.vert_pos[face_verts[:, 0]],
+                face_arrays.vert_pos[face_verts[:, 1]],
+                face_arrays.vert_pos[face_verts[:, 2]])
+
+            for edge_row, face_row, point in zip(batch_edges[hits].tolist(),
+                                                 batch_faces[hits].tolist(),
+                                                 points.tolist()):
+                edge = edge_arrays.edges[edge_row]
+                face = face_arrays.faces[face_row]
+                ix_point = IntersectionPoint(edge, face, Vector(point))
+                ix_points.append(ix_point)
+                self._saved_results[(edge, face)] = ix_point
+
+        return ix_points
+
     def _intersect_edge_face(self, edge, face, ix_points):
         """ Compute intersection for one edge and one face.
         Returns None if no intersection occured, and a IntersectionPoint
@@ -361,6 +721,8 @@ class IntersectionPoint (object):
     Point is stored as a 3-list of floats.
     Point coordinates can also be accessed as with .x, .y, .z
     """
+    __slots__ = ('edge', 'face', 'point')
+
     def __init__(self, edge, face, point):
         self.edge = edge
         self.face = face
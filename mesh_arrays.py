@@ -0,0 +1,379 @@
+import numpy as np
+
+from .qe_views import VertexView, EdgeView, FaceView, ViewSequence
+
+class QEMeshArrays (object):
+    """ A flat, array based copy of a QEMesh.
+
+    Vertex positions and edge/face connectivity are stored in contiguous
+    numpy arrays so that whole-mesh queries (eg. which edges cross a plane)
+    can be answered in a single vectorized pass instead of walking
+    QEEdge/QEFace objects one at a time.
+
+    Rows are positions in self.verts, self.edges and self.faces, which hold
+    the original QE objects so results can be mapped back to them.
+
+    vert_pos   - (nverts, 3) float array of vertex positions
+    edge_verts - (nedges, 2) int array of (b_vert, t_vert) rows
+    edge_faces - (nedges, 2) int array of (l_face, r_face) rows, -1 if None
+    face_verts - (nfaces, 3) int array of vertex rows
+    face_edges - (nfaces, 3) int array of edge rows
+    edge_links - (nedges, 4) int array of (tl, bl, tr, br) edge rows,
+                 -1 if None. Only set by from_triangles.
+    """
+
+    def __init__(self, mesh):
+        """ Construct the arrays from a QEMesh.
+        Only vertices and edges referenced by a face are stored.
+        """
+        self.faces = sorted(mesh.faces.values(), key=lambda face: face.index)
+
+        vert_rows = {}
+        edge_rows = {}
+        self.verts = []
+        self.edges = []
+        for face in self.faces:
+            for vert in face.verts:
+                if vert.index not in vert_rows:
+                    vert_rows[vert.index] = len(self.verts)
+                    self.verts.append(vert)
+            for edge in face.edges:
+                if edge.index not in edge_rows:
+                    edge_rows[edge.index] = len(self.edges)
+                    self.edges.append(edge)
+        face_rows = dict((face.index, row)
+                         for row, face in enumerate(self.faces))
+        self.face_index = np.array([face.index for face in self.faces],
+                                   dtype=np.int64)
+
+        def face_row(face):
+            if face is None:
+                return -1
+            return face_rows[face.index]
+
+        self.vert_pos = np.zeros((len(self.verts), 3))
+        self.edge_verts = np.array(
+            [(vert_rows[edge.b_vert.index], vert_rows[edge.t_vert.index])
+             for edge in self.edges], dtype=np.int32).reshape(-1, 2)
+        self.edge_faces = np.array(
+            [(face_row(edge.l_face), face_row(edge.r_face))
+             for edge in self.edges], dtype=np.int32).reshape(-1, 2)
+        self.face_verts = np.array(
+            [[vert_rows[vert.index] for vert in face.verts]
+             for face in self.faces], dtype=np.int32).reshape(-1, 3)
+        self.face_edges = np.array(
+            [[edge_rows[edge.index] for edge in face.edges]
+             for face in self.faces], dtype=np.int32).reshape(-1, 3)
+        self.edge_links = None
+        self._init_state()
+        self.update_positions()
+
+    @classmethod
+    def from_rows(cls, verts, edges, faces, vert_pos, edge_verts,
+                  edge_faces, face_verts, face_edges):
+        """ Construct the arrays directly from the QE objects, their
+        positions and their connectivity given as rows, without walking
+        the objects. faces must be sorted by index. If verts, edges and
+        faces are None, views are used instead (see use_views).
+        """
+        arrays = cls.__new__(cls)
+        arrays.vert_pos = np.array(vert_pos, dtype=np.float64)
+        arrays.edge_verts = np.asarray(edge_verts, dtype=np.int32)
+        arrays.edge_faces = np.asarray(edge_faces, dtype=np.int32)
+        arrays.face_verts = np.asarray(face_verts, dtype=np.int32)
+        arrays.face_edges = np.asarray(face_edges, dtype=np.int32)
+        arrays.edge_links = None
+        if faces is None:
+            arrays.use_views()
+            arrays.face_index = np.arange(len(arrays.face_verts),
+                                          dtype=np.int64)
+        else:
+            arrays.verts = verts
+            arrays.edges = edges
+            arrays.faces = faces
+            arrays.face_index = np.array([face.index for face in faces],
+                                         dtype=np.int64)
+        arrays._init_state()
+        return arrays
+
+    @classmethod
+    def from_triangles(cls, vert_pos, tris):
+        """ Construct the arrays of a mesh with one vertex per row of
+        vert_pos and one face per row of the (n, 3) vertex index array
+        tris, without any QE objects. verts, edges and faces are
+        sequences of views (see qe_views), and rows equal indices.
+
+        Face i has edges (v0, v1), (v1, v2), (v2, v0). Edges are numbered in
+        order of first appearance; the face an edge first appears in is its
+        left face and holds b_vert -> t_vert, the second is its right face.
+        """
+        tris = np.asarray(tris, dtype=np.int64).reshape(-1, 3)
+
+        # Half edges, in face order: half edge h is side h % 3 of face h // 3
+        starts = tris.ravel()
+        ends = np.roll(tris, -1, axis=1).ravel()
+        keys = (np.minimum(starts, ends) * len(vert_pos) +
+                np.maximum(starts, ends))
+        unique_keys, first, inverse, counts = np.unique(
+            keys, return_index=True, return_inverse=True, return_counts=True)
+        if np.any(counts > 2):
+            raise ValueError("This edge already has two faces.")
+        # Number the edges by their first half edge
+        order = np.argsort(first, kind='mergesort')
+        edge_numbers = np.empty(len(order), dtype=np.int64)
+        edge_numbers[order] = np.arange(len(order))
+        half_edges = edge_numbers[inverse]
+        first = first[order]
+
+        is_left = np.zeros(len(half_edges), dtype=bool)
+        is_left[first] = True
+        right = np.flatnonzero(~is_left)
+        # Half edge of the same face after and before each half edge
+        face_base = np.arange(len(half_edges)) // 3 * 3
+        side = np.arange(len(half_edges)) % 3
+        next_edges = half_edges[face_base + (side + 1) % 3]
+        prev_edges = half_edges[face_base + (side + 2) % 3]
+
+        num_edges = len(first)
+        edge_faces = np.full((num_edges, 2), -1, dtype=np.int32)
+        edge_faces[:, 0] = first // 3
+        edge_faces[half_edges[right], 1] = right // 3
+        # tl/bl come from the left face, tr/br from the right face
+        edge_links = np.full((num_edges, 4), -1, dtype=np.int32)
+        edge_links[:, 0] = next_edges[first]
+        edge_links[:, 1] = next_edges[first]
+        edge_links[half_edges[right], 2] = prev_edges[right]
+        edge_links[half_edges[right], 3] = next_edges[right]
+
+        arrays = cls.from_rows(None, None, None, vert_pos,
+                               np.column_stack((starts[first], ends[first])),
+                               edge_faces, tris, half_edges.reshape(-1, 3))
+        arrays.edge_links = edge_links
+        return arrays
+
+    def use_views(self):
+        """ Make verts, edges and faces sequences of views over the arrays,
+        releasing any QE objects.
+        """
+        self.verts = ViewSequence(self, VertexView, len(self.vert_pos))
+        self.edges = ViewSequence(self, EdgeView, len(self.edge_verts))
+        self.faces = ViewSequence(self, FaceView, len(self.face_verts))
+
+    def _init_state(self):
+        # Per vertex version counters, see mark_dirty
+        self.version = 0
+        self.vert_version = np.zeros(len(self.verts), dtype=np.int64)
+        self._vert_edge_starts = None
+        self._vert_edges = None
+        self._vert_face_starts = None
+        self._vert_faces = None
+        self._face_bounds = None
+        self._face_bounds_version = None
+
+    def face_bounds(self):
+        """ Return (face_min, face_max), two (nfaces, 3) arrays of the face
+        bounding boxes. They are recomputed when the mesh version changed
+        since the last call, see mark_dirty.
+        """
+        if self._face_bounds_version != self.version:
+            corners = self.vert_pos[self.face_verts]
+            self._face_bounds = (corners.min(axis=1), corners.max(axis=1))
+            self._face_bounds_version = self.version
+        return self._face_bounds
+
+    def face_rows(self, faces):
+        """ Return an array of the rows of the given QEFaces.
+        """
+        indices = np.array([face.index for face in faces], dtype=np.int64)
+        return np.searchsorted(self.face_index, indices)
+
+    def update_positions(self):
+        """ Copy the current QEVertex positions into vert_pos.
+        """
+        if len(self.verts) == 0:
+            return
+        self.vert_pos[:] = [vert.pos for vert in self.verts]
+
+    def mark_dirty(self, vert_rows):
+        """ Record that the vertices vert_rows have moved.
+        Bumps the mesh version and stamps it on those vertices.
+        """
+        if len(vert_rows) == 0:
+            return
+        self.version += 1
+        self.vert_version[vert_rows] = self.version
+
+    def dirty_verts_since(self, version):
+        """ Return the rows of vertices that moved after mesh version
+        version.
+        """
+        return np.flatnonzero(self.vert_version > version)
+
+    def edges_of_verts(self, vert_rows):
+        """ Return the sorted, unique rows of the edges touching any of the
+        vertices vert_rows.
+        """
+        if self._vert_edges is None:
+            self._vert_edge_starts, self._vert_edges = \
+                self._group_by_vert(self.edge_verts)
+        return self._lookup(self._vert_edge_starts, self._vert_edges,
+                            vert_rows)
+
+    def faces_of_verts(self, vert_rows):
+        """ Return the sorted, unique rows of the faces touching any of the
+        vertices vert_rows.
+        """
+        if self._vert_faces is None:
+            self._vert_face_starts, self._vert_faces = \
+                self._group_by_vert(self.face_verts)
+        return self._lookup(self._vert_face_starts, self._vert_faces,
+                            vert_rows)
+
+    def _group_by_vert(self, item_verts):
+        """ Build a vertex -> items lookup from the (nitems, k) array of
+        vertex rows of each item. Returns (starts, items), where the items
+        of vertex v are items[starts[v]:starts[v + 1]].
+        """
+        flat_verts = item_verts.ravel()
+        order = np.argsort(flat_verts, kind='mergesort')
+        items = order // item_verts.shape[1]
+        counts = np.bincount(flat_verts, minlength=len(self.verts))
+        starts = np.concatenate(([0], np.cumsum(counts)))
+        return starts, items
+
+    def _lookup(self, vert_starts, vert_items, vert_rows):
+        vert_rows = np.asarray(vert_rows, dtype=np.int64)
+        starts = vert_starts[vert_rows]
+        counts = vert_starts[vert_rows + 1] - starts
+        # Positions starts[i] .. starts[i]+counts[i] for every i
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        positions = offsets + np.arange(counts.sum())
+        return np.unique(vert_items[positions])
+
+    def crossing_edges(self, orientation, position, edge_rows=None):
+        """ Return the rows of edges that cross the orthogonal plane
+        at position along axis orientation.
+
+        An edge crosses if its endpoints lie on different sides of the plane,
+        where a point exactly on the plane counts as being above it. This
+        means each triangle is crossed by either zero or two edges.
+
+        If edge_rows is given, only those edges are tested.
+        """
+        coord = self.vert_pos[:, orientation]
+        if edge_rows is None:
+            edge_verts = self.edge_verts
+        else:
+            edge_verts = self.edge_verts[edge_rows]
+        b_above = coord[edge_verts[:, 0]] >= position
+        t_above = coord[edge_verts[:, 1]] >= position
+        crossing = np.flatnonzero(b_above != t_above)
+        if edge_rows is None:
+            return crossing
+        return np.asarray(edge_rows)[crossing]
+
+    def crossing_points(self, edge_rows, orientation, position):
+        """ Return a (len(edge_rows), 3) array of the points where the given
+        edges cross the orthogonal plane at position along orientation.
+
+        The edges are assumed to actually cross the plane.
+        """
+        b_pos = self.vert_pos[self.edge_verts[edge_rows, 0]]
+        t_pos = self.vert_pos[self.edge_verts[edge_rows, 1]]
+        b_coord = b_pos[:, orientation]
+        t_coord = t_pos[:, orientation]
+        frac = (position - b_coord) / (t_coord - b_coord)
+        points = b_pos + frac[:, np.newaxis] * (t_pos - b_pos)
+        points[:, orientation] = position
+        return points
+
+    def crossing_edges_oblique(self, normal, offset, edge_rows=None):
+        """ Return the rows of edges that cross the plane of points x with
+        dot(normal, x) == offset, by the same rule as crossing_edges.
+
+        If edge_rows is given, only those edges (and their vertices) are
+        looked at.
+        """
+        if edge_rows is None:
+            height = self.vert_pos.dot(normal)
+            edge_heights = height[self.edge_verts]
+        else:
+            edge_rows = np.asarray(edge_rows, dtype=np.int64)
+            edge_heights = self.vert_pos[self.edge_verts[edge_rows]].dot(
+                normal)
+        above = edge_heights >= offset
+        crossing = np.flatnonzero(above[:, 0] != above[:, 1])
+        if edge_rows is None:
+            return crossing
+        return edge_rows[crossing]
+
+    def crossing_points_oblique(self, edge_rows, normal, offset):
+        """ Return a (len(edge_rows), 3) array of the points where the given
+        edges cross the plane dot(normal, x) == offset.
+
+        The edges are assumed to actually cross the plane.
+        """
+        b_pos = self.vert_pos[self.edge_verts[edge_rows, 0]]
+        t_pos = self.vert_pos[self.edge_verts[edge_rows, 1]]
+        b_height = b_pos.dot(normal)
+        t_height = t_pos.dot(normal)
+        frac = (offset - b_height) / (t_height - b_height)
+        return b_pos + frac[:, np.newaxis] * (t_pos - b_pos)
+
+    def chain_edges(self, edge_rows):
+        """ Order the edges edge_rows, which all cross some plane, into
+        chains. Two crossing edges of the same face are neighbours.
+
+        Returns a list of (positions, is_closed), where positions is an
+        array of positions in edge_rows. Open chains start at one end.
+        """
+        num = len(edge_rows)
+        faces = self.edge_faces[edge_rows].ravel()
+        owners = np.repeat(np.arange(num), 2)
+        on_face = faces != -1
+        faces = faces[on_face]
+        owners = owners[on_face]
+
+        # Crossing edges of the same face end up next to each other
+        order = np.argsort(faces, kind='mergesort')
+        faces = faces[order]
+        owners = owners[order]
+        pairs = np.flatnonzero(faces[1:] == faces[:-1])
+        src = np.concatenate((owners[pairs], owners[pairs + 1]))
+        dst = np.concatenate((owners[pairs + 1], owners[pairs]))
+
+        # Up to two neighbours per edge, -1 if missing
+        order = np.argsort(src, kind='mergesort')
+        src = src[order]
+        dst = dst[order]
+        slot = np.arange(len(src)) - np.searchsorted(src, src, 'left')
+        keep = slot < 2
+        neighbours = np.full((num, 2), -1, dtype=np.int64)
+        neighbours[src[keep], slot[keep]] = dst[keep]
+        neighbours = neighbours.tolist()
+
+        visited = [False] * num
+        chains = []
+        for first in range(0, num):
+            if not visited[first] and neighbours[first][1] == -1:
+                chains.append((self._walk_chain(first, neighbours, visited),
+                               False))
+        for first in range(0, num):
+            if not visited[first]:
+                chains.append((self._walk_chain(first, neighbours, visited),
+                               True))
+        return chains
+
+    def _walk_chain(self, first, neighbours, visited):
+        chain = [first]
+        visited[first] = True
+        current = first
+        while True:
+            for neighbour in neighbours[current]:
+                if neighbour != -1 and not visited[neighbour]:
+                    break
+            else:
+                return np.array(chain, dtype=np.int64)
+            chain.append(neighbour)
+            visited[neighbour] = True
+            current = neighbour
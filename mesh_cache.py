@@ -0,0 +1,181 @@
+import os
+import hashlib
+import shutil
+
+import numpy as np
+
+from .mesh_arrays import QEMeshArrays
+from .aabb_refit import aabb_tree_from_rows
+
+class MeshCache (object):
+    """ An on-disk cache of mesh connectivity and AABB tree structure,
+    keyed by a hash of the triangle index buffer.
+
+    Each entry is a directory of .npy files, loaded memory-mapped. Only
+    topology is stored, vertex positions always come from Blender, so an
+    entry stays valid however the mesh is sculpted.
+
+    At most max_entries entries are kept. Loading an entry marks it as
+    used, and saving one deletes the least recently used entries beyond
+    the limit.
+    """
+    CONNECTIVITY = ('face_verts', 'face_edges', 'edge_verts', 'edge_faces',
+                    'edge_links')
+    TREE = ('node_children', 'node_faces')
+
+    def __init__(self, directory, max_entries=8):
+        self.directory = directory
+        self.max_entries = max_entries
+
+    @classmethod
+    def default_directory(cls):
+        """ Return the cache directory next to the current .blend file,
+        or in Blender's temporary directory if the file was never saved.
+        """
+        import bpy
+        if bpy.data.filepath:
+            return os.path.join(os.path.dirname(bpy.data.filepath),
+                                "blendseg_cache")
+        return os.path.join(bpy.app.tempdir, "blendseg_cache")
+
+    @classmethod
+    def topology_key(cls, num_verts, tris):
+        """ Return the cache key of a mesh with num_verts vertices and
+        the (n, 3) triangle vertex indices tris.
+        """
+        tris = np.ascontiguousarray(tris, dtype=np.int64)
+        digest = hashlib.sha1(tris.tobytes())
+        digest.update(str(num_verts).encode('ascii'))
+        return digest.hexdigest()
+
+    def load_arrays(self, key, vert_pos, tris):
+        """ Return the QEMeshArrays stored under key with vert_pos as
+        positions, or None if there is no valid entry.
+        """
+        rows = self._load(key, self.CONNECTIVITY)
+        if rows is None:
+            return None
+        num_edges = len(rows['edge_verts'])
+        # Guard against hash collisions and damaged files
+        if (rows['face_verts'].shape != tris.shape or
+            not np.array_equal(rows['face_verts'], tris) or
+            rows['edge_faces'].shape != (num_edges, 2) or
+            rows['edge_links'].shape != (num_edges, 4) or
+            (num_edges != 0 and
+             rows['edge_verts'].max() >= len(vert_pos))):
+            return None
+        arrays = QEMeshArrays.from_rows(None, None, None, vert_pos,
+                                        rows['edge_verts'],
+                                        rows['edge_faces'],
+                                        rows['face_verts'],
+                                        rows['face_edges'])
+        arrays.edge_links = rows['edge_links']
+        return arrays
+
+    def save_arrays(self, key, arrays):
+        self._save(key, dict((name, getattr(arrays, name))
+                             for name in self.CONNECTIVITY))
+
+    def load_tree(self, key, arrays):
+        """ Return the AABBTree stored under key, built over the faces of
+        arrays, or None if there is no valid entry. Its boxes still have
+        to be updated.
+        """
+        rows = self._load(key, self.TREE)
+        if rows is None:
+            return None
+        node_faces = rows['node_faces']
+        if len(node_faces) != 2 * len(arrays.faces) - 1:
+            return None
+        face_min, face_max = arrays.face_bounds()
+        return aabb_tree_from_rows(rows['node_children'], node_faces,
+                                   arrays.faces, face_min, face_max)
+
+    def save_tree(self, key, tree, arrays):
+        """ Store the structure of tree, built over the faces of arrays.
+        """
+        children = []
+        leaf_faces = []
+        leaf_nodes = []
+        stack = [(tree._tree, -1, 0)]
+        while len(stack) != 0:
+            node, parent, side = stack.pop()
+            node_idx = len(children)
+            children.append([-1, -1])
+            if parent != -1:
+                children[parent][side] = node_idx
+            if node.is_leaf():
+                leaf_faces.append(node.leaf)
+                leaf_nodes.append(node_idx)
+            else:
+                stack.append((node.right_node, node_idx, 1))
+                stack.append((node.left_node, node_idx, 0))
+        node_faces = np.full(len(children), -1, dtype=np.int64)
+        node_faces[leaf_nodes] = arrays.face_rows(leaf_faces)
+        self.save_tree_rows(key, np.array(children, dtype=np.int64),
+                            node_faces)
+
+    def save_tree_rows(self, key, node_children, node_faces):
+        """ Store a tree structure given as rows, see
+        aabb_refit.aabb_tree_from_rows.
+        """
+        self._save(key, {'node_children': node_children,
+                         'node_faces': node_faces})
+
+    def clear(self):
+        """ Delete every entry.
+        """
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key)
+
+    def entries(self):
+        """ Return the keys of the stored entries, least recently used
+        first.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        keys = [key for key in os.listdir(self.directory)
+                if os.path.isdir(self._entry(key))]
+        return sorted(keys, key=lambda key: os.path.getmtime(
+            self._entry(key)))
+
+    def _load(self, key, names):
+        try:
+            rows = dict((name, np.load(os.path.join(self._entry(key),
+                                                    name + ".npy"),
+                                       mmap_mode='r'))
+                        for name in names)
+            os.utime(self._entry(key), None)
+            return rows
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _save(self, key, rows):
+        """ Write rows (name -> array) into the entry for key. Each file is
+        written under a temporary name and then moved over the entry's file
+        with os.replace, which overwrites atomically, so readers never
+        see a partial file.
+        """
+        entry = self._entry(key)
+        try:
+            if not os.path.isdir(entry):
+                os.makedirs(entry)
+            for name, array in rows.items():
+                path = os.path.join(entry, name + ".npy")
+                np.save(path + ".tmp.npy", np.asarray(array))
+                os.replace(path + ".tmp.npy", path)
+            os.utime(entry, None)
+            self._trim(key)
+        except (IOError, OSError) as e:
+            print("Couldn't write mesh cache %s: %s" % (entry, e))
+
+    def _trim(self, keep):
+        """ Delete the least recently used entries other than keep, until
+        at most max_entries are left.
+        """
+        keys = [key for key in self.entries() if key != keep]
+        for key in keys[:max(len(keys) + 1 - self.max_entries, 0)]:
+            shutil.rmtree(self._entry(key), ignore_errors=True)
@@ -0,0 +1,59 @@
+import numpy as np
+
+class Plane (object):
+    """ An infinite plane through point with the given normal, in any
+    orientation.
+
+    A point x is above the plane if dot(normal, x) >= offset, where
+    offset = dot(normal, point). The normal need not be of unit length.
+    """
+
+    def __init__(self, point, normal):
+        self.point = np.array(point, dtype=np.float64).reshape(3)
+        self.normal = np.array(normal, dtype=np.float64).reshape(3)
+        if not np.any(self.normal):
+            raise ValueError("normal must not be zero!")
+        self.offset = self.normal.dot(self.point)
+        # Index of the axis the plane is orthogonal to, None if oblique
+        nonzero = np.flatnonzero(self.normal)
+        self.axis = int(nonzero[0]) if len(nonzero) == 1 else None
+
+    @classmethod
+    def from_equation(cls, normal, offset):
+        """ Create the plane of points x with dot(normal, x) == offset.
+        """
+        normal = np.array(normal, dtype=np.float64).reshape(3)
+        plane = cls(normal * (offset / normal.dot(normal)), normal)
+        # Keep offset as given rather than rounded through point
+        plane.offset = float(offset)
+        return plane
+
+    @classmethod
+    def orthogonal(cls, orientation, position):
+        """ Create the plane at position along axis orientation (an
+        Orientation or an axis index).
+        """
+        point = np.zeros(3)
+        normal = np.zeros(3)
+        point[orientation] = position
+        normal[orientation] = 1.
+        return cls(point, normal)
+
+    def signed_distance(self, points):
+        """ Return dot(normal, x) - offset for each of the (n, 3) points,
+        the distance to the plane in units of the normal's length.
+        """
+        return np.asarray(points).dot(self.normal) - self.offset
+
+    def to_local(self, matrix_world):
+        """ Return this world space plane in the local space of an object
+        with the 4x4 matrix_world.
+
+        With world = A . local + t, dot(n, world) == d becomes
+        dot(A^T n, local) == d - dot(n, t). No inverse is needed, and a
+        point is above the plane in both spaces or in neither.
+        """
+        matrix = np.asarray(matrix_world, dtype=np.float64)
+        return Plane.from_equation(
+            matrix[:3, :3].T.dot(self.normal),
+            self.offset - self.normal.dot(matrix[:3, 3]))
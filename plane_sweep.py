@@ -0,0 +1,206 @@
+import numpy as np
+
+class PlaneSweep (object):
+    """ Keep the edges crossing one orthogonal plane, and the chains
+    (contours) they form, between moves of the plane.
+
+    When the plane moves from p0 to p1, only edges with an endpoint between
+    p0 and p1 can start or stop crossing it. Those are found by binary
+    search in the edge extents sorted along the axis, and only the chains
+    touching them are walked again. Dragging a plane by one slice therefore
+    costs work proportional to the change rather than to the mesh.
+
+    Crossing follows the rule of QEMeshArrays.crossing_edges, so every
+    face holds zero or two crossing edges. Two crossing edges sharing a
+    face are neighbours in a chain.
+    """
+    # Start over instead of sweeping if more edges than this multiple of
+    # the current crossing edges would have to be checked.
+    REINIT_FACTOR = 2
+
+    def __init__(self, arrays, orientation, index=None):
+        """ arrays is a QEMeshArrays, orientation the index of the axis
+        the plane moves along. index is an optional EdgeIntervalIndex used
+        to (re)initialize the sweep quickly.
+        """
+        self.arrays = arrays
+        self.orientation = orientation
+        self.index = index
+        self.update()
+
+    def update(self):
+        """ Must be called whenever the vertex positions change.
+        This resets the sweep.
+
+        The edge extents are sorted again only once the plane moves from
+        a known position, so the single move that follows each update
+        while sculpting never pays for the sort.
+        """
+        self._lo = None
+        self.reset()
+
+    def _sort(self):
+        """ Sort the edge extents from the current vertex positions.
+        """
+        coords = self.arrays.vert_pos[self.arrays.edge_verts,
+                                      self.orientation]
+        self._lo = coords.min(axis=1)
+        self._hi = coords.max(axis=1)
+        self._lo_order = np.argsort(self._lo, kind='mergesort')
+        self._sorted_lo = self._lo[self._lo_order]
+        self._hi_order = np.argsort(self._hi, kind='mergesort')
+        self._sorted_hi = self._hi[self._hi_order]
+
+    def reset(self):
+        """ Forget the current plane position, crossing edges and chains.
+        """
+        self.position = None
+        # crossing edge -> (l_face, r_face)
+        self._active = {}
+        # face -> crossing edges of that face
+        self._face_edges = {}
+        # chain id -> [edges, is_closed]
+        self._chains = {}
+        self._edge_chain = {}
+        self._next_chain_id = 0
+
+    def move_to(self, position, initial_edges=None):
+        """ Move the plane to position and return its chains as a list
+        of [edges, is_closed], where edges is an ordered list of edge rows.
+
+        initial_edges optionally lists the edges known to cross the plane
+        at position, used if the sweep has no position yet.
+        """
+        if self.position is None:
+            if initial_edges is None:
+                initial_edges = self._initial_edges(position)
+            on = initial_edges
+            off = []
+        else:
+            if self._lo is None:
+                self._sort()
+            changed = self._changed_edges(self.position, position)
+            if len(changed) > self.REINIT_FACTOR * len(self._active):
+                self.reset()
+                return self.move_to(position)
+            crossing = ((self._lo[changed] < position) &
+                        (position <= self._hi[changed]))
+            on = []
+            off = []
+            for edge, is_crossing in zip(changed.tolist(),
+                                         crossing.tolist()):
+                if is_crossing and edge not in self._active:
+                    on.append(edge)
+                elif not is_crossing and edge in self._active:
+                    off.append(edge)
+
+        dirty_chains = set()
+        for edge in off:
+            dirty_chains.add(self._edge_chain.pop(edge, None))
+            self._unlink(edge)
+        if len(on) != 0:
+            faces = self.arrays.edge_faces[on].tolist()
+            for edge, edge_faces in zip(on, faces):
+                for neighbour in self._link(edge, edge_faces):
+                    dirty_chains.add(self._edge_chain.get(neighbour))
+        dirty_chains.discard(None)
+
+        loose = set(on)
+        for chain_id in dirty_chains:
+            edges, is_closed = self._chains.pop(chain_id)
+            for edge in edges:
+                if edge in self._active:
+                    loose.add(edge)
+                    del self._edge_chain[edge]
+        self._create_chains(loose)
+
+        self.position = position
+        return list(self._chains.values())
+
+    def _initial_edges(self, position):
+        if self.index is not None:
+            edges = self.index.crossing_edges(self.orientation, position)
+        else:
+            edges = self.arrays.crossing_edges(self.orientation, position)
+        return edges.tolist()
+
+    def _changed_edges(self, p0, p1):
+        """ Return the rows of edges that have an endpoint between
+        p0 and p1 (inclusive), ie. those that may have changed state.
+        """
+        low = min(p0, p1)
+        high = max(p0, p1)
+        lo_start = np.searchsorted(self._sorted_lo, low, 'left')
+        lo_end = np.searchsorted(self._sorted_lo, high, 'right')
+        hi_start = np.searchsorted(self._sorted_hi, low, 'left')
+        hi_end = np.searchsorted(self._sorted_hi, high, 'right')
+        return np.union1d(self._lo_order[lo_start:lo_end],
+                          self._hi_order[hi_start:hi_end])
+
+    def _link(self, edge, edge_faces):
+        """ Add a crossing edge. Return the crossing edges it now
+        shares a face with.
+        """
+        self._active[edge] = edge_faces
+        neighbours = []
+        for face in edge_faces:
+            if face == -1:
+                continue
+            face_edges = self._face_edges.setdefault(face, [])
+            neighbours.extend(face_edges)
+            face_edges.append(edge)
+        return neighbours
+
+    def _unlink(self, edge):
+        """ Remove an edge that no longer crosses the plane.
+        """
+        for face in self._active.pop(edge):
+            if face == -1:
+                continue
+            face_edges = self._face_edges[face]
+            face_edges.remove(edge)
+            if len(face_edges) == 0:
+                del self._face_edges[face]
+
+    def _neighbours(self, edge):
+        neighbours = []
+        for face in self._active[edge]:
+            if face == -1:
+                continue
+            for other in self._face_edges[face]:
+                if other != edge:
+                    neighbours.append(other)
+        return neighbours
+
+    def _create_chains(self, loose):
+        """ Walk the loose edges into new chains.
+        Open chains are started from one of their ends.
+        """
+        for edge in list(loose):
+            if edge in loose and len(self._neighbours(edge)) < 2:
+                self._add_chain(self._walk(edge, loose), False)
+        while len(loose) != 0:
+            edge = next(iter(loose))
+            self._add_chain(self._walk(edge, loose), True)
+
+    def _walk(self, edge, loose):
+        chain = [edge]
+        loose.discard(edge)
+        while True:
+            next_edge = None
+            for neighbour in self._neighbours(edge):
+                if neighbour in loose:
+                    next_edge = neighbour
+                    break
+            if next_edge is None:
+                return chain
+            chain.append(next_edge)
+            loose.discard(next_edge)
+            edge = next_edge
+
+    def _add_chain(self, edges, is_closed):
+        chain_id = self._next_chain_id
+        self._next_chain_id += 1
+        self._chains[chain_id] = [edges, is_closed]
+        for edge in edges:
+            self._edge_chain[edge] = chain_id
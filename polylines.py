@@ -0,0 +1,165 @@
+import numpy as np
+
+class Polylines (object):
+    """ A compact set of polylines (contours) sharing one coordinate buffer.
+
+    coords - (npoints, 3) float32 array of all points, polyline by polyline
+    starts - (nlines,) index of each polyline's first point in coords
+    counts - (nlines,) number of points of each polyline
+    closed - (nlines,) whether each polyline is a closed loop. The first
+             point of a closed polyline is not repeated at its end.
+    """
+
+    def __init__(self, coords, starts, counts, closed):
+        self.coords = np.asarray(coords, dtype=np.float32).reshape(-1, 3)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.closed = np.asarray(closed, dtype=bool)
+
+    @classmethod
+    def from_contours(cls, contours):
+        """ Create Polylines from a list of contours of IntersectionPoints,
+        as returned by Intersector.
+        """
+        coords = []
+        counts = []
+        closed = []
+        for contour in contours:
+            is_closed = len(contour) > 1 and contour[0] is contour[-1]
+            if is_closed:
+                contour = contour[:-1]
+            coords.extend(tuple(ixp.point) for ixp in contour)
+            counts.append(len(contour))
+            closed.append(is_closed)
+        counts = np.array(counts, dtype=np.int64)
+        starts = np.cumsum(counts) - counts
+        return cls(coords, starts, counts, closed)
+
+    @classmethod
+    def from_chains(cls, points, chains):
+        """ Create Polylines from a (n, 3) array of points and a list of
+        (point rows, is_closed) chains, see QEMeshArrays.chain_edges.
+        """
+        if len(chains) == 0:
+            return cls(np.zeros((0, 3)), [], [], [])
+        rows = np.concatenate([chain for chain, is_closed in chains])
+        counts = np.array([len(chain) for chain, is_closed in chains],
+                          dtype=np.int64)
+        starts = np.cumsum(counts) - counts
+        closed = [is_closed for chain, is_closed in chains]
+        return cls(points[rows], starts, counts, closed)
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def num_points(self):
+        return len(self.coords)
+
+    @property
+    def nbytes(self):
+        return (self.coords.nbytes + self.starts.nbytes +
+                self.counts.nbytes + self.closed.nbytes)
+
+    def polyline(self, idx):
+        """ Return (coords, is_closed) of polyline idx.
+        """
+        start = self.starts[idx]
+        return (self.coords[start:start + self.counts[idx]],
+                bool(self.closed[idx]))
+
+    def edge_indices(self):
+        """ Return a (nedges, 2) int array of point index pairs joining
+        consecutive points, including the closing edge of closed polylines.
+        """
+        if len(self.counts) == 0:
+            return np.zeros((0, 2), dtype=np.int64)
+        first = np.arange(self.num_points, dtype=np.int64)
+        second = first + 1
+        ends = self.starts + self.counts - 1
+        # The last point of each polyline joins back to its first point.
+        # That edge is only kept for closed polylines.
+        second[ends] = self.starts
+        keep = np.ones(self.num_points, dtype=bool)
+        keep[ends[~self.closed]] = False
+        # Single point polylines have no edges
+        keep[ends[self.counts < 2]] = False
+        return np.column_stack((first[keep], second[keep]))
+
+class PolylineStack (object):
+    """ The contours of a mesh on a stack of slices along one axis, stored
+    in a handful of shared arrays rather than one object per slice.
+
+    Slices are appended one at a time, eg. while streaming them out of
+    Intersector.sweep_slices.
+    """
+
+    def __init__(self, orientation):
+        self.orientation = orientation
+        self._slice_indices = []
+        self._positions = []
+        # Offsets of each slice's first polyline and point
+        self._line_offsets = [0]
+        self._point_offsets = [0]
+        # Chunks of the shared arrays, joined by _pack
+        self._coords = [np.zeros((0, 3), dtype=np.float32)]
+        self._starts = [np.zeros(0, dtype=np.int64)]
+        self._counts = [np.zeros(0, dtype=np.int64)]
+        self._closed = [np.zeros(0, dtype=bool)]
+
+    def __len__(self):
+        return len(self._slice_indices)
+
+    def append(self, slice_index, position, polylines):
+        self._slice_indices.append(slice_index)
+        self._positions.append(position)
+        self._coords.append(polylines.coords)
+        self._starts.append(polylines.starts + self._point_offsets[-1])
+        self._counts.append(polylines.counts)
+        self._closed.append(polylines.closed)
+        self._line_offsets.append(self._line_offsets[-1] + len(polylines))
+        self._point_offsets.append(self._point_offsets[-1] +
+                                   polylines.num_points)
+
+    @property
+    def num_points(self):
+        return self._point_offsets[-1]
+
+    def get(self, idx):
+        """ Return (slice index, position, Polylines) of the idx'th slice
+        appended.
+        """
+        self._pack()
+        line_start = self._line_offsets[idx]
+        line_end = self._line_offsets[idx + 1]
+        point_start = self._point_offsets[idx]
+        point_end = self._point_offsets[idx + 1]
+        polylines = Polylines(self._coords[0][point_start:point_end],
+                              self._starts[0][line_start:line_end] -
+                              point_start,
+                              self._counts[0][line_start:line_end],
+                              self._closed[0][line_start:line_end])
+        return self._slice_indices[idx], self._positions[idx], polylines
+
+    def save(self, filepath):
+        """ Write the stack to filepath as a numpy .npz archive.
+        """
+        self._pack()
+        np.savez(filepath,
+                 orientation=self.orientation,
+                 slice_indices=np.array(self._slice_indices, dtype=np.int64),
+                 positions=np.array(self._positions, dtype=np.float64),
+                 line_offsets=np.array(self._line_offsets, dtype=np.int64),
+                 coords=self._coords[0],
+                 starts=self._starts[0],
+                 counts=self._counts[0],
+                 closed=self._closed[0])
+
+    def _pack(self):
+        """ Join the appended chunks into single arrays.
+        """
+        if len(self._coords) > 1:
+            self._coords = [np.concatenate(self._coords)]
+            self._starts = [np.concatenate(self._starts)]
+            self._counts = [np.concatenate(self._counts)]
+            self._closed = [np.concatenate(self._closed)]
@@ -0,0 +1,176 @@
+class QEView (object):
+    """ A lightweight handle on one row of a QEMeshArrays.
+
+    Views hold no geometry of their own; every attribute is read from the
+    arrays on access. They are created on demand, so a mesh stored as
+    arrays costs a few typed arrays instead of one Python object (and
+    instance dict) per vertex, edge and face. Two views of the same kind
+    and row of the same arrays compare equal.
+    """
+    __slots__ = ('arrays', 'index')
+
+    def __init__(self, arrays, index):
+        self.arrays = arrays
+        self.index = index
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and
+                self.index == other.index and
+                self.arrays is other.arrays)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((type(self).__name__, self.index))
+
+    def __repr__(self):
+        return "%s(%d)" % (type(self).__name__, self.index)
+
+class VertexView (QEView):
+    """ QEVertex-like view of a vertex row. """
+    __slots__ = ()
+
+    @property
+    def pos(self):
+        return self.arrays.vert_pos[self.index]
+
+class EdgeView (QEView):
+    """ QEEdge-like view of an edge row. """
+    __slots__ = ()
+
+    @property
+    def b_vert(self):
+        return self._vert(0)
+
+    @property
+    def t_vert(self):
+        return self._vert(1)
+
+    @property
+    def l_face(self):
+        return self._face(0)
+
+    @property
+    def r_face(self):
+        return self._face(1)
+
+    @property
+    def tl_edge(self):
+        return self._link(0)
+
+    @property
+    def bl_edge(self):
+        return self._link(1)
+
+    @property
+    def tr_edge(self):
+        return self._link(2)
+
+    @property
+    def br_edge(self):
+        return self._link(3)
+
+    def _vert(self, end):
+        return VertexView(self.arrays,
+                          int(self.arrays.edge_verts[self.index, end]))
+
+    def _face(self, side):
+        row = int(self.arrays.edge_faces[self.index, side])
+        if row == -1:
+            return None
+        return FaceView(self.arrays, row)
+
+    def _link(self, slot):
+        row = int(self.arrays.edge_links[self.index, slot])
+        if row == -1:
+            return None
+        return EdgeView(self.arrays, row)
+
+class FaceView (QEView):
+    """ QEFace-like view of a face row.
+    min and max follow the vertex positions (see
+    QEMeshArrays.face_bounds), so assigning to them has no effect.
+    """
+    __slots__ = ()
+
+    @property
+    def verts(self):
+        return [VertexView(self.arrays, row)
+                for row in self.arrays.face_verts[self.index].tolist()]
+
+    @property
+    def edges(self):
+        return [EdgeView(self.arrays, row)
+                for row in self.arrays.face_edges[self.index].tolist()]
+
+    @property
+    def min(self):
+        return self.arrays.face_bounds()[0][self.index].tolist()
+
+    @min.setter
+    def min(self, value):
+        pass
+
+    @property
+    def max(self):
+        return self.arrays.face_bounds()[1][self.index].tolist()
+
+    @max.setter
+    def max(self, value):
+        pass
+
+    def update_bounding_box(self):
+        pass
+
+class ViewSequence (object):
+    """ A read-only sequence of the views of every row of one kind.
+    """
+
+    def __init__(self, arrays, view_class, length):
+        self.arrays = arrays
+        self.view_class = view_class
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += self.length
+        if row < 0 or row >= self.length:
+            raise IndexError("row out of range")
+        return self.view_class(self.arrays, row)
+
+    def __iter__(self):
+        for row in range(0, self.length):
+            yield self.view_class(self.arrays, row)
+
+class FaceViewMap (object):
+    """ The dict-like QEMesh.faces (face index -> face) of an array
+    backed mesh. Face indices are rows.
+    """
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+
+    def __len__(self):
+        return len(self.arrays.face_verts)
+
+    def __getitem__(self, index):
+        return self.arrays.faces[index]
+
+    def __contains__(self, index):
+        return 0 <= index < len(self)
+
+    def __iter__(self):
+        return iter(range(0, len(self)))
+
+    def keys(self):
+        return range(0, len(self))
+
+    def values(self):
+        return self.arrays.faces
+
+    def items(self):
+        return zip(self.keys(), self.values())
@@ -4,6 +4,8 @@ import bpy
 from math import pi
 from mathutils import Vector
 
+from .plane import Plane
+
 from time import time
 
 #import object_intersection
@@ -97,6 +99,8 @@ class SlicePlane (object):
         self.loop_name = "loop" + str(self.orientation)[:3]
         self.plane_name = "plane"+str(self.orientation)[:3]
         self.is_updated = False
+        # Constrain the plane to the centres of image slices
+        self.snap_to_slices = False
             
         plane = self.create_plane(image_orientation)
         self.update_image(plane)
@@ -107,6 +111,9 @@ class SlicePlane (object):
         """
         newloc = Vector(self.plane_centre)
         newloc[self.orientation] = plane.location[self.orientation]
+        if self.snap_to_slices:
+            newloc[self.orientation] = self.get_slice_location(
+                self.get_slice_index(newloc))
 
         plane.location = newloc
 
@@ -129,12 +136,7 @@ class SlicePlane (object):
         if (len(self.img_names) == 0):
             return None
 
-        if self.reverse:
-            idx = int((self.origin[self.orientation] -
-                       loc[self.orientation])/self.spacing[self.orientation])
-        else:
-            idx = int((loc[self.orientation] -
-                       self.origin[self.orientation])/self.spacing[self.orientation])
+        idx = self.get_slice_index(loc)
 
         # left = self.origin[self.orientation] - (len(self.img_names) *
         #                                         self.spacing[self.orientation])/2
@@ -163,6 +165,28 @@ class SlicePlane (object):
             
         return img
 
+    def get_slice_index (self, loc):
+        """ Given a location, return the index of the image slice
+        it lies in.
+        """
+        if self.reverse:
+            return int((self.origin[self.orientation] -
+                        loc[self.orientation])/self.spacing[self.orientation])
+        else:
+            return int((loc[self.orientation] -
+                        self.origin[self.orientation])/self.spacing[self.orientation])
+
+    def get_slice_location (self, idx):
+        """ Return the position, along this plane's axis, of the centre
+        of image slice idx.
+        """
+        if self.reverse:
+            return (self.origin[self.orientation] -
+                    (idx + 0.5)*self.spacing[self.orientation])
+        else:
+            return (self.origin[self.orientation] +
+                    (idx + 0.5)*self.spacing[self.orientation])
+
     def get_location(self):
         """ Searches Blender scene for object and returns its position
         if found
@@ -175,6 +199,15 @@ class SlicePlane (object):
 
         return plane.location
 
+    def get_plane(self):
+        """ Return this plane at its current location as a Plane, or None
+        if it isn't in the scene.
+        """
+        location = self.get_location()
+        if location is None:
+            return None
+        return Plane.orthogonal(self.orientation, location[self.orientation])
+
     def move_callback(self, scene):
         """ Callback method which checks if my plane has moved,
         and if so, updates the image.
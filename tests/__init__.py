@@ -0,0 +1,14 @@
+""" Make the add-on importable as the package blendseg, whatever
+directory the tests are run from. Its top level module blendseg.py would
+otherwise shadow the package when run from inside the add-on directory.
+"""
+import os
+import sys
+import types
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if not hasattr(sys.modules.get('blendseg'), '__path__'):
+    _package = types.ModuleType('blendseg')
+    _package.__path__ = [_root]
+    _package.__file__ = os.path.join(_root, '__init__.py')
+    sys.modules['blendseg'] = _package
@@ -0,0 +1,43 @@
+""" Triangle meshes for the tests, as (vert_pos, tris) arrays. """
+import math
+
+import numpy as np
+
+def torus(major=1.0, minor=0.4, num_major=32, num_minor=16):
+    """ Return (vert_pos, tris) of a torus around the z axis. The ring of
+    vertices at minor angle 0 lies exactly in the plane z = 0.
+    """
+    verts = []
+    for i in range(0, num_major):
+        u = 2 * math.pi * i / num_major
+        for j in range(0, num_minor):
+            v = 2 * math.pi * j / num_minor
+            r = major + minor * math.cos(v)
+            verts.append((r * math.cos(u), r * math.sin(u),
+                          minor * math.sin(v)))
+    tris = []
+    for i in range(0, num_major):
+        for j in range(0, num_minor):
+            a = i * num_minor + j
+            b = ((i + 1) % num_major) * num_minor + j
+            c = ((i + 1) % num_major) * num_minor + (j + 1) % num_minor
+            d = i * num_minor + (j + 1) % num_minor
+            tris.append((a, b, c))
+            tris.append((a, c, d))
+    return np.array(verts), np.array(tris)
+
+def grid(num=10):
+    """ Return (vert_pos, tris) of an open, slightly bent num x num grid
+    of squares over the unit square, each split into two triangles.
+    Vertex (i, j) is at x = i / num, y = j / num.
+    """
+    verts = [(i / num, j / num, 0.1 * math.sin(i + j))
+             for i in range(0, num + 1) for j in range(0, num + 1)]
+    tris = []
+    for i in range(0, num):
+        for j in range(0, num):
+            a = i * (num + 1) + j
+            b = (i + 1) * (num + 1) + j
+            tris.append((a, b, b + 1))
+            tris.append((a, b + 1, a + 1))
+    return np.array(verts), np.array(tris)
@@ -0,0 +1,83 @@
+""" Tests for rebuilding the default AABBTree mesh tree. They need the
+quad_edge_mesh submodule.
+"""
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+try:
+    from blendseg.mesh_arrays import QEMeshArrays
+    from blendseg.quad_edge_mesh.aabb_tree import AABBTree
+    from blendseg.aabb_refit import AABBRefitter
+    from blendseg.bvh_rebuilder import AABBRebuilder
+    from blendseg.mesh_cache import MeshCache
+except ImportError as e:
+    raise unittest.SkipTest("needs quad_edge_mesh: %s" % e)
+
+from .meshes import torus
+
+class _Mesh (object):
+    """ Stands in for a QEMesh, which AABBTree takes its faces from. """
+    def __init__(self, arrays):
+        self.faces = dict(enumerate(arrays.faces))
+
+class AABBRebuilderTest (unittest.TestCase):
+
+    def setUp(self):
+        vert_pos, tris = torus()
+        self.arrays = QEMeshArrays.from_triangles(vert_pos, tris)
+        self.refitter = AABBRefitter(AABBTree(_Mesh(self.arrays)),
+                                     self.arrays)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _sculpt(self, rng):
+        """ Drag the vertices around a random point, as a sculpt stroke
+        does, and refit the tree around them.
+        """
+        vert_pos = self.arrays.vert_pos
+        centre = vert_pos[rng.randint(len(vert_pos))]
+        moved = np.flatnonzero(
+            np.linalg.norm(vert_pos - centre, axis=1) < 0.5)
+        vert_pos[moved] += rng.normal(scale=0.3, size=(len(moved), 3))
+        self.arrays.mark_dirty(moved)
+        self.refitter.refit_verts(moved)
+
+    def test_rebuild_swaps_in(self):
+        rebuilder = AABBRebuilder(threshold=1.5)
+        cache = MeshCache(self.directory)
+        rng = np.random.RandomState(0)
+        for stroke in range(0, 50):
+            self._sculpt(rng)
+            degradation = rebuilder.check(self.refitter, cache, 'key')
+            if rebuilder.is_running:
+                break
+        self.assertGreater(degradation, 1.5)
+        rebuilder._thread.join()
+
+        # Another stroke while the tree was rebuilt
+        self._sculpt(rng)
+        rebuilt = rebuilder.swap(self.refitter)
+        self.assertIsNot(rebuilt, self.refitter)
+        self.assertIsNot(rebuilt.tree, self.refitter.tree)
+        self.assertLess(rebuilt.bvh.degradation(), 1.01)
+        self.assertLess(rebuilt.bvh.cost(), self.refitter.bvh.cost())
+        # The rebuilt boxes hold the faces at their current positions
+        face_min, face_max = self.arrays.face_bounds()
+        leaves = np.flatnonzero(rebuilt.bvh.node_counts)
+        faces = rebuilt.bvh.face_order[rebuilt.bvh.node_starts[leaves]]
+        self.assertTrue(np.all(rebuilt.bvh.node_min[leaves] <=
+                               face_min[faces]))
+        self.assertTrue(np.all(rebuilt.bvh.node_max[leaves] >=
+                               face_max[faces]))
+        # and the cache holds the rebuilt structure
+        self.assertIsNotNone(cache.load_tree('key', self.arrays))
+
+        self.assertIs(rebuilder.swap(rebuilt), rebuilt)
+
+if __name__ == '__main__':
+    unittest.main()
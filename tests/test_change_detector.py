@@ -0,0 +1,72 @@
+import unittest
+
+import numpy as np
+
+from blendseg.change_detector import VertexChangeDetector
+
+class _Vertices (object):
+    """ Stands in for a Blender mesh's vertices collection. """
+    def __init__(self, co):
+        self.co = np.asarray(co, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.co)
+
+    def foreach_get(self, name, buffer):
+        buffer[:] = self.co.ravel()
+
+class _Mesh (object):
+    def __init__(self, co):
+        self.vertices = _Vertices(co)
+
+class VertexChangeDetectorTest (unittest.TestCase):
+
+    def setUp(self):
+        self.detector = VertexChangeDetector(chunk_size=4)
+        self.co = np.arange(30, dtype=np.float32).reshape(10, 3)
+
+    def test_baseline(self):
+        self.assertEqual(len(self.detector.check(_Mesh(self.co))), 0)
+        self.assertEqual(len(self.detector.check(_Mesh(self.co))), 0)
+
+    def test_moved_vertex(self):
+        self.detector.check(_Mesh(self.co))
+        self.co[5, 1] += 1.0
+        self.assertEqual(self.detector.check(_Mesh(self.co)).tolist(), [1])
+        self.assertEqual(self.detector.check(_Mesh(self.co)).tolist(), [])
+
+    def test_swapped_vertices(self):
+        """ Swapping two coordinates keeps their sum, but not the CRC. """
+        self.detector.check(_Mesh(self.co))
+        self.co[[4, 5]] = self.co[[5, 4]]
+        self.assertEqual(self.detector.check(_Mesh(self.co)).tolist(), [1])
+
+    def test_compensating_edits(self):
+        self.detector.check(_Mesh(self.co))
+        self.co[8, 0] += 1.0
+        self.co[9, 0] -= 1.0
+        self.assertEqual(self.detector.check(_Mesh(self.co)).tolist(), [2])
+
+    def test_whole_chunks(self):
+        """ A vertex count that divides into chunks has no empty
+        remainder chunk.
+        """
+        self.detector.check(_Mesh(self.co[:8]))
+        changed = self.detector.check(_Mesh(self.co))
+        self.assertEqual(changed.tolist(), [0, 1, 2])
+        changed = self.detector.check(_Mesh(self.co[:8]))
+        self.assertEqual(changed.tolist(), [0, 1])
+
+    def test_vertex_count_changed(self):
+        """ Adding or removing vertices changes every chunk. """
+        self.detector.check(_Mesh(self.co))
+        changed = self.detector.check(_Mesh(self.co[:7]))
+        self.assertEqual(changed.tolist(), [0, 1])
+        changed = self.detector.check(_Mesh(np.vstack((self.co,
+                                                       self.co))))
+        self.assertEqual(changed.tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(len(self.detector.check(
+            _Mesh(np.vstack((self.co, self.co))))), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+""" Tests for FlatBVH. They run without Blender. """
+import unittest
+
+import numpy as np
+
+from blendseg.mesh_arrays import QEMeshArrays
+from blendseg.flat_bvh import FlatBVH
+
+from .meshes import torus
+
+class RefitFacesTest (unittest.TestCase):
+
+    def setUp(self):
+        vert_pos, tris = torus()
+        self.arrays = QEMeshArrays.from_triangles(vert_pos, tris)
+
+    def _check_refit(self, leaf_size):
+        bvh = FlatBVH.build(self.arrays, leaf_size=leaf_size)
+        moved = np.arange(40, 60)
+        self.arrays.vert_pos[moved] += (0.2, -0.1, 0.3)
+        num_refitted = bvh.refit_faces(self.arrays.faces_of_verts(moved))
+        self.assertTrue(0 < num_refitted < len(bvh))
+
+        # Same tree, fully refitted on construction
+        full = FlatBVH(self.arrays, bvh.node_children, bvh.node_starts,
+                       bvh.node_counts, bvh.face_order)
+        # The full refit widens its boxes by a float32 step
+        np.testing.assert_allclose(bvh.node_min, full.node_min, atol=1e-6)
+        np.testing.assert_allclose(bvh.node_max, full.node_max, atol=1e-6)
+
+    def test_single_face_leaves(self):
+        self._check_refit(1)
+
+    def test_multi_face_leaves(self):
+        self._check_refit(4)
+
+    def test_nothing_moved(self):
+        bvh = FlatBVH.build(self.arrays)
+        self.assertEqual(bvh.refit_faces(np.zeros(0, dtype=np.int64)), 0)
+
+if __name__ == '__main__':
+    unittest.main()
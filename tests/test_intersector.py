@@ -0,0 +1,110 @@
+""" Tests for Intersector. They need Blender's bpy and mathutils and are
+skipped without them.
+"""
+import unittest
+
+import numpy as np
+
+try:
+    from blendseg.intersector import Intersector
+    from blendseg.slice_plane import SlicePlane
+    from blendseg.blender_quad_edge_mesh import (BlenderQEMesh,
+                                                 BlenderQEMeshBuilder)
+    from blendseg.quad_edge_mesh.aabb_tree import AABBTree
+    from blendseg.mesh_arrays import QEMeshArrays
+except ImportError as e:
+    raise unittest.SkipTest("needs Blender: %s" % e)
+
+from .meshes import torus, grid
+
+class _Object (object):
+    name = "Mesh"
+
+class _FixedPlane (SlicePlane):
+    """ A SlicePlane at a fixed position, without a Blender object. """
+    def __init__(self, orientation, position):
+        self.orientation = orientation
+        self.position = position
+
+    def get_location(self):
+        location = [0., 0., 0.]
+        location[self.orientation] = self.position
+        return location
+
+class IntersectorTest (unittest.TestCase):
+
+    def setUp(self):
+        vert_pos, tris = torus()
+        self.mesh = BlenderQEMesh(_Object())
+        BlenderQEMeshBuilder.construct_from_triangles(self.mesh, vert_pos,
+                                                      tris)
+        self.mesh.update_bounding_boxes()
+        self.tree = AABBTree(self.mesh)
+        self.tree.update_bbs()
+
+    def _contours(self, intersector, position):
+        return intersector.compute_intersection_with_plane(
+            self.mesh, self.tree, _FixedPlane('AXIAL', position))
+
+    def test_reused_across_planes(self):
+        """ Results of one plane must not leak into the next. """
+        intersector = Intersector()
+        for position in (0.0, 0.3, 0.0, 0.3):
+            reused = self._contours(intersector, position)
+            fresh = self._contours(Intersector(), position)
+            self.assertEqual(len(reused), 2)
+            self.assertEqual([len(contour) for contour in reused],
+                             [len(contour) for contour in fresh])
+            for contour in reused:
+                for ixp in contour:
+                    self.assertAlmostEqual(ixp.point[2], position)
+
+class ArraysEngineTest (unittest.TestCase):
+    """ compute_intersection_with_plane_arrays walks the contours with
+    _get_one_contour; they must match the chains of the crossing edges.
+    """
+
+    def _check(self, vert_pos, tris, orientation, position):
+        arrays = QEMeshArrays.from_triangles(vert_pos, tris)
+        plane = _FixedPlane(orientation, position)
+        contours = Intersector().compute_intersection_with_plane_arrays(
+            arrays, plane)
+        axis = plane.orientation.__index__()
+        chains = arrays.chain_edges(arrays.crossing_edges(axis, position))
+
+        shapes = []
+        for contour in contours:
+            is_closed = len(contour) > 1 and contour[0] is contour[-1]
+            if is_closed:
+                contour = contour[:-1]
+            shapes.append((len(contour), is_closed))
+            # Neighbouring points lie on a common face
+            for ixp, next_ixp in zip(contour, contour[1:]):
+                self.assertTrue(
+                    set((ixp.edge.l_face, ixp.edge.r_face)) &
+                    set((next_ixp.edge.l_face, next_ixp.edge.r_face)))
+            for ixp in contour:
+                self.assertEqual(ixp.point[axis], position)
+        self.assertEqual(sorted(shapes),
+                         sorted((len(positions), is_closed)
+                                for positions, is_closed in chains))
+        return shapes
+
+    def test_open_surface(self):
+        shapes = self._check(*grid(), orientation='SAGITTAL', position=0.35)
+        self.assertEqual(shapes, [(21, False)])
+
+    def test_torus(self):
+        shapes = self._check(*torus(), orientation='AXIAL', position=0.1)
+        self.assertEqual([is_closed for num, is_closed in shapes],
+                         [True, True])
+
+    def test_plane_through_vertices(self):
+        shapes = self._check(*torus(), orientation='AXIAL', position=0.0)
+        self.assertEqual([is_closed for num, is_closed in shapes],
+                         [True, True])
+        shapes = self._check(*grid(), orientation='SAGITTAL', position=0.3)
+        self.assertEqual([is_closed for num, is_closed in shapes], [False])
+
+if __name__ == '__main__':
+    unittest.main()
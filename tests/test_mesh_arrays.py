@@ -0,0 +1,73 @@
+""" Tests for the contours of the array based engines, which chain the
+crossing edges of QEMeshArrays. They run without Blender.
+"""
+import unittest
+
+import numpy as np
+
+from blendseg.mesh_arrays import QEMeshArrays
+
+from .meshes import torus, grid
+
+class CrossingChainsTest (unittest.TestCase):
+
+    def _chains(self, vert_pos, tris, orientation, position):
+        """ Return a list of (points, is_closed) of the mesh's contours on
+        the orthogonal plane at position along orientation.
+        """
+        arrays = QEMeshArrays.from_triangles(vert_pos, tris)
+        edge_rows = arrays.crossing_edges(orientation, position)
+        points = arrays.crossing_points(edge_rows, orientation, position)
+        chains = arrays.chain_edges(edge_rows)
+        self.assertEqual(sum(len(positions) for positions, is_closed
+                             in chains), len(edge_rows))
+        for positions, is_closed in chains:
+            self.assertTrue(np.all(points[positions, orientation] ==
+                                   position))
+        return [(points[positions], is_closed)
+                for positions, is_closed in chains]
+
+    def test_open_surface(self):
+        chains = self._chains(*grid(), orientation=0, position=0.35)
+        self.assertEqual(len(chains), 1)
+        points, is_closed = chains[0]
+        self.assertFalse(is_closed)
+        # 11 grid edges and 10 diagonals cross x = 0.35
+        self.assertEqual(len(points), 21)
+        self.assertEqual(sorted((points[0, 1], points[-1, 1])), [0.0, 1.0])
+
+    def test_open_surface_through_vertices(self):
+        """ A column of vertices lies on the plane. """
+        chains = self._chains(*grid(), orientation=0, position=0.3)
+        self.assertEqual(len(chains), 1)
+        points, is_closed = chains[0]
+        self.assertFalse(is_closed)
+        self.assertEqual(sorted((points[0, 1], points[-1, 1])), [0.0, 1.0])
+
+    def test_torus(self):
+        chains = self._chains(*torus(), orientation=2, position=0.1)
+        self.assertEqual(len(chains), 2)
+        radii = []
+        for points, is_closed in chains:
+            self.assertTrue(is_closed)
+            radii.append(np.hypot(points[:, 0], points[:, 1]))
+        inner, outer = sorted(radii, key=np.mean)
+        self.assertTrue(np.all(inner < 1.0))
+        self.assertTrue(np.all(outer > 1.0))
+
+    def test_torus_through_vertices(self):
+        """ The outer ring of vertices lies on the plane, the contours
+        must still close.
+        """
+        chains = self._chains(*torus(), orientation=2, position=0.0)
+        self.assertEqual(len(chains), 2)
+        radii = []
+        for points, is_closed in chains:
+            self.assertTrue(is_closed)
+            radii.append(np.hypot(points[:, 0], points[:, 1]))
+        inner, outer = sorted(radii, key=np.mean)
+        self.assertTrue(np.all(inner < 1.0))
+        np.testing.assert_allclose(outer, 1.4)
+
+if __name__ == '__main__':
+    unittest.main()
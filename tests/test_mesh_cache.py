@@ -0,0 +1,54 @@
+""" Tests for MeshCache. They need the quad_edge_mesh submodule. """
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from blendseg.mesh_cache import MeshCache
+    from blendseg.mesh_arrays import QEMeshArrays
+except ImportError as e:
+    raise unittest.SkipTest("needs quad_edge_mesh: %s" % e)
+
+from .meshes import grid
+
+class MeshCacheTrimTest (unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = MeshCache(self.directory, max_entries=2)
+        vert_pos, self.tris = grid(num=3)
+        self.arrays = QEMeshArrays.from_triangles(vert_pos, self.tris)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _save(self, key, mtime=None):
+        self.cache.save_arrays(key, self.arrays)
+        if mtime is not None:
+            os.utime(os.path.join(self.directory, key), (mtime, mtime))
+
+    def test_keeps_newest(self):
+        self._save('a', 100)
+        self._save('b', 200)
+        self._save('c')
+        self.assertEqual(self.cache.entries(), ['b', 'c'])
+
+    def test_load_marks_used(self):
+        self._save('a', 100)
+        self._save('b', 200)
+        self.assertIsNotNone(self.cache.load_arrays(
+            'a', self.arrays.vert_pos, self.tris))
+        self._save('c')
+        self.assertEqual(sorted(self.cache.entries()), ['a', 'c'])
+        self.assertIsNone(self.cache.load_arrays(
+            'b', self.arrays.vert_pos, self.tris))
+
+    def test_resave_keeps_entry(self):
+        self._save('a', 100)
+        self._save('b', 200)
+        self._save('a')
+        self.assertEqual(self.cache.entries(), ['b', 'a'])
+
+if __name__ == '__main__':
+    unittest.main()
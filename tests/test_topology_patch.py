@@ -0,0 +1,42 @@
+""" Tests for matching faces across topology changes. They need the
+quad_edge_mesh submodule.
+"""
+import unittest
+
+import numpy as np
+
+try:
+    from blendseg.topology_patch import match_faces
+    from blendseg.mesh_arrays import QEMeshArrays
+except ImportError as e:
+    raise unittest.SkipTest("needs quad_edge_mesh: %s" % e)
+
+from .meshes import grid
+
+class MatchFacesTest (unittest.TestCase):
+
+    def setUp(self):
+        self.vert_pos, self.tris = grid(num=4)
+        self.old = QEMeshArrays.from_triangles(self.vert_pos, self.tris)
+
+    def test_renumbered_vertices(self):
+        """ Vertices that kept their position are found by it. """
+        order = np.random.RandomState(0).permutation(len(self.vert_pos))
+        new_index = np.argsort(order)
+        new = QEMeshArrays.from_triangles(self.vert_pos[order],
+                                          new_index[self.tris[::-1]])
+        face_match = match_faces(self.old, new)
+        self.assertEqual(face_match.tolist(),
+                         list(range(len(self.tris) - 1, -1, -1)))
+
+    def test_moved_vertices(self):
+        """ Vertices that moved but kept their index are found by it. """
+        vert_pos = self.vert_pos.copy()
+        vert_pos[:7] += 0.01
+        new = QEMeshArrays.from_triangles(vert_pos, self.tris[1:])
+        face_match = match_faces(self.old, new)
+        self.assertEqual(face_match.tolist(),
+                         [-1] + list(range(0, len(self.tris) - 1)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import zlib
+
+import numpy as np
+
+from .quad_edge_mesh.aabb_tree import AABBNode
+
+class TopologyWatcher (object):
+    """ Notice when a Blender mesh's topology changes, eg. after sculpting
+    with dynamic topology or remeshing.
+
+    The element counts are compared first; if they are unchanged, a CRC of
+    the loop vertex indices catches changes that keep the counts.
+    """
+
+    def __init__(self, blender_mesh):
+        self._signature = self._get_signature(blender_mesh)
+
+    def has_changed(self, blender_mesh):
+        """ Return whether the topology changed since the last call (or
+        construction), and remember the current one.
+        """
+        signature = self._get_signature(blender_mesh)
+        changed = signature != self._signature
+        self._signature = signature
+        return changed
+
+    def _get_signature(self, blender_mesh):
+        loops = blender_mesh.loops
+        loop_verts = np.empty(len(loops), dtype=np.int32)
+        loops.foreach_get('vertex_index', loop_verts)
+        return (len(blender_mesh.vertices), len(blender_mesh.polygons),
+                len(loops), zlib.crc32(loop_verts.tobytes()))
+
+def match_rows(old_keys, new_keys):
+    """ Match the rows of two (n, k) arrays of keys. Returns, for every row
+    of old_keys, the row of new_keys holding the same key, or -1 if there
+    is none or the key is not unique on either side.
+    """
+    old_keys = np.ascontiguousarray(old_keys)
+    new_keys = np.ascontiguousarray(new_keys, dtype=old_keys.dtype)
+    row_type = np.dtype((np.void, old_keys.dtype.itemsize * old_keys.shape[1]))
+    keys = np.concatenate((old_keys, new_keys)).view(row_type).ravel()
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    old_inverse = inverse[:len(old_keys)]
+    new_inverse = inverse[len(old_keys):]
+    old_counts = np.bincount(old_inverse, minlength=len(unique_keys))
+    new_counts = np.bincount(new_inverse, minlength=len(unique_keys))
+    key_new_rows = np.full(len(unique_keys), -1, dtype=np.int64)
+    key_new_rows[new_inverse] = np.arange(len(new_keys))
+    key_new_rows[(old_counts != 1) | (new_counts != 1)] = -1
+    return key_new_rows[old_inverse]
+
+def match_faces(old_arrays, new_arrays):
+    """ Return, for every face row of old_arrays, the row of the same face
+    in new_arrays, or -1 if it is gone.
+
+    Vertex indices are not stable across topology changes, so vertices are
+    matched by their exact position first. A vertex that moved keeps its
+    index if no other vertex claimed it, which catches vertices moved by
+    the same stroke that changed the topology. Faces are then matched by
+    their (rotated to start at the lowest index) matched vertices.
+    """
+    vert_match = match_rows(old_arrays.vert_pos.view(np.int64),
+                            new_arrays.vert_pos.view(np.int64))
+    claimed = np.zeros(len(new_arrays.vert_pos), dtype=bool)
+    claimed[vert_match[vert_match != -1]] = True
+    num_verts = min(len(old_arrays.vert_pos), len(new_arrays.vert_pos))
+    by_index = np.flatnonzero(vert_match[:num_verts] == -1)
+    by_index = by_index[~claimed[by_index]]
+    vert_match[by_index] = by_index
+
+    old_faces = vert_match[old_arrays.face_verts]
+    lost = np.any(old_faces == -1, axis=1)
+    face_match = match_rows(_rotate_min_first(old_faces),
+                            _rotate_min_first(new_arrays.face_verts))
+    face_match[lost] = -1
+    return face_match
+
+def _rotate_min_first(face_verts):
+    """ Rotate each row of face_verts so it starts with its lowest index,
+    keeping the winding.
+    """
+    face_verts = np.asarray(face_verts, dtype=np.int64)
+    start = np.argmin(face_verts, axis=1)
+    columns = (start[:, np.newaxis] + np.arange(3)) % 3
+    return face_verts[np.arange(len(face_verts))[:, np.newaxis], columns]
+
+def patch_tree(tree, old_arrays, new_arrays, face_match=None):
+    """ Patch tree, an AABBTree over the faces of old_arrays, into a tree
+    over the faces of new_arrays.
+
+    Every subtree whose faces all survived is kept as it is, with its
+    leaves pointed at the new faces. The new faces get a tree of their
+    own, and the kept subtrees and that tree are joined under new top
+    nodes. The boxes are stale afterwards and must be updated.
+
+    face_match is the result of match_faces, if it is already known.
+    Returns (number of kept subtrees, number of new faces).
+    """
+    if face_match is None:
+        face_match = match_faces(old_arrays, new_arrays)
+
+    # Flatten the tree, parents before children
+    nodes = []
+    parents = []
+    stack = [(tree._tree, -1)]
+    while len(stack) != 0:
+        node, parent = stack.pop()
+        parents.append(parent)
+        nodes.append(node)
+        if not node.is_leaf():
+            stack.append((node.right_node, len(nodes) - 1))
+            stack.append((node.left_node, len(nodes) - 1))
+
+    # A node is kept if all of its faces survived
+    leaf_nodes = [idx for idx, node in enumerate(nodes) if node.is_leaf()]
+    leaf_rows = old_arrays.face_rows([nodes[idx].leaf for idx in leaf_nodes])
+    new_rows = face_match[leaf_rows]
+    kept = [True] * len(nodes)
+    for idx, new_row in zip(leaf_nodes, new_rows.tolist()):
+        if new_row == -1:
+            kept[idx] = False
+        else:
+            nodes[idx].leaf = new_arrays.faces[new_row]
+    for idx in range(len(nodes) - 1, 0, -1):
+        if not kept[idx]:
+            kept[parents[idx]] = False
+
+    items = [node for idx, node in enumerate(nodes)
+             if kept[idx] and (parents[idx] == -1 or not kept[parents[idx]])]
+    num_kept = len(items)
+
+    covered = np.zeros(len(new_arrays.faces), dtype=bool)
+    covered[new_rows[new_rows != -1]] = True
+    new_faces = [new_arrays.faces[row]
+                 for row in np.flatnonzero(~covered).tolist()]
+    if len(new_faces) != 0:
+        items.append(AABBNode(new_faces))
+
+    tree._tree = _join(items)
+    return num_kept, len(new_faces)
+
+def _join(items):
+    """ Join a list of AABBNodes under new nodes, splitting at the median
+    box centre along the axis the centres spread most.
+    """
+    if len(items) == 1:
+        return items[0]
+    centres = np.array([[(item.min_pt[i] + item.max_pt[i]) / 2.0
+                         for i in range(0, 3)] for item in items])
+    axis = np.argmax(centres.max(axis=0) - centres.min(axis=0))
+    order = np.argsort(centres[:, axis], kind='mergesort').tolist()
+    half = len(items) // 2
+
+    node = AABBNode.__new__(AABBNode)
+    node.left_node = _join([items[idx] for idx in order[:half]])
+    node.right_node = _join([items[idx] for idx in order[half:]])
+    left = node.left_node
+    right = node.right_node
+    node.min_pt = [min(left.min_pt[i], right.min_pt[i]) for i in range(0, 3)]
+    node.max_pt = [max(left.max_pt[i], right.max_pt[i]) for i in range(0, 3)]
+    return node
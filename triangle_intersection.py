@@ -0,0 +1,38 @@
+import numpy as np
+
+def intersect_segments_triangles(seg_b, seg_t, tri_0, tri_1, tri_2,
+                                 epsilon=1e-12):
+    """ Intersect n segments with n triangles, pairwise and vectorized.
+
+    seg_b, seg_t are (n, 3) arrays of segment end points, tri_0, tri_1 and
+    tri_2 are (n, 3) arrays of triangle corners. Segment i is only tested
+    against triangle i.
+
+    This is the Moller-Trumbore ray/triangle test, restricted to the part
+    of the ray between seg_b and seg_t. Segments (nearly) parallel to their
+    triangle never intersect.
+
+    Returns (hits, points): a boolean mask of the segments that intersect
+    their triangle, and a (hits.sum(), 3) array of intersection points.
+    """
+    direction = seg_t - seg_b
+    edge1 = tri_1 - tri_0
+    edge2 = tri_2 - tri_0
+
+    pvec = np.cross(direction, edge2)
+    det = np.einsum('ij,ij->i', edge1, pvec)
+    not_parallel = np.abs(det) > epsilon
+    inv_det = np.zeros_like(det)
+    inv_det[not_parallel] = 1.0 / det[not_parallel]
+
+    tvec = seg_b - tri_0
+    u = np.einsum('ij,ij->i', tvec, pvec) * inv_det
+    qvec = np.cross(tvec, edge1)
+    v = np.einsum('ij,ij->i', direction, qvec) * inv_det
+    t = np.einsum('ij,ij->i', edge2, qvec) * inv_det
+
+    hits = (not_parallel &
+            (u >= 0) & (v >= 0) & (u + v <= 1) &
+            (t >= 0) & (t <= 1))
+    points = seg_b[hits] + t[hits, np.newaxis] * direction[hits]
+    return hits, points